@@ -0,0 +1,374 @@
+import sys
+import mmap
+import time
+import argparse
+from functools import cached_property
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+import numpy as np
+from colorama import Fore, Style, init
+
+# Ensure local modules can be imported when running as a script
+current_dir = Path(__file__).resolve().parent
+if str(current_dir) not in sys.path:
+    sys.path.append(str(current_dir))
+
+try:
+    import ace_index
+    import ace_storage
+except ImportError:
+    from gennjoy import ace_index, ace_storage
+
+# Initialize colorama
+init(autoreset=True)
+
+
+# --- Configuration ---
+class Config:
+    BASE_DIR = Path(__file__).resolve().parent
+    ACE_DIR = BASE_DIR / "data" / "incident_neutron_ace"
+    BENCHMARK_TABLES = ["H1", "H2", "H3"]
+    BENCHMARK_REPEAT = 3
+
+
+# --- Logging Helper ---
+class Logger:
+    @staticmethod
+    def info(msg):
+        print(f"{Fore.GREEN}[INFO] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def debug(msg):
+        print(f"{Fore.CYAN}[DEBUG] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def warn(msg):
+        print(f"{Fore.YELLOW}[WARN] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def error(msg):
+        print(f"{Fore.RED}[ERROR] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def header(msg):
+        print(f"\n{Fore.MAGENTA}{'='*60}")
+        print(f"{Fore.BLUE}{Style.BRIGHT}{msg.center(60)}")
+        print(f"{Fore.MAGENTA}{'='*60}{Style.RESET_ALL}")
+
+
+# Type-1 XSS lines: four 20-character fields and a line end. NJOY writes
+# reals as 1pe20.11 ("  -1.23456789012E-05"), integers as i20.
+FIELD_WIDTH = 20
+LINE_WIDTH = ace_index.XSS_PER_LINE * FIELD_WIDTH + 1
+MANTISSA_COLUMNS = np.array([3] + list(range(5, 16)))
+MANTISSA_WEIGHTS = 10.0 ** np.arange(11, -1, -1)
+POWERS_OF_TEN = 10.0 ** np.arange(23)  # Exact doubles
+
+
+def _skip_lines(data, pos: int, count: int) -> int:
+    """Offset of the line `count` lines after the one starting at pos."""
+    for _ in range(count):
+        end = data.find(b"\n", pos)
+        pos = len(data) if end < 0 else end + 1
+    return pos
+
+
+def _parse_fields(fields: np.ndarray) -> np.ndarray:
+    """
+    Values of (n, 20) byte fields. Fields in the 1pe20.11 layout are decoded
+    with array arithmetic: the 12 mantissa digits make an exact integer,
+    scaled by one exact power of ten, which rounds exactly as float() does.
+    Other fields (integers, exponents beyond +-22 after scaling) go through
+    NumPy's string conversion.
+    """
+    digits = fields[:, MANTISSA_COLUMNS] - np.uint8(ord("0"))
+    exponent = (fields[:, 18].astype(np.int64) - ord("0")) * 10 + fields[:, 19] - ord("0")
+    sign = fields[:, 17]
+    scale = np.where(sign == ord("-"), -exponent, exponent) - 11
+    exponent_digits = (fields[:, 18:20] >= ord("0")) & (fields[:, 18:20] <= ord("9"))
+    fast = ((digits <= 9).all(axis=1) & exponent_digits.all(axis=1)
+            & (fields[:, 4] == ord(".")) & (fields[:, 16] == ord("E")) & ((sign == ord("-")) | (sign == ord("+")))
+            & (fields[:, 0] == ord(" ")) & (fields[:, 1] == ord(" "))
+            & ((fields[:, 2] == ord(" ")) | (fields[:, 2] == ord("-"))) & (np.abs(scale) <= 22))
+    mantissa = digits.astype(np.float64) @ MANTISSA_WEIGHTS
+    power = POWERS_OF_TEN[np.minimum(np.abs(scale), 22)]
+    values = np.where(scale >= 0, mantissa * power, mantissa / power)
+    np.negative(values, out=values, where=fields[:, 2] == ord("-"))
+    slow = ~fast
+    if slow.any():
+        values[slow] = np.ascontiguousarray(fields[slow]).view(f"S{FIELD_WIDTH}").ravel().astype(np.float64)
+    return values
+
+
+def _parse_floats(data, start: int, end: int, count: int) -> np.ndarray:
+    """
+    The `count` numbers of type-1 XSS lines data[start:end]. Lines in NJOY's
+    fixed layout are cut into 20-byte fields without splitting them;
+    anything else falls back to whitespace splitting.
+    """
+    raw = np.frombuffer(data, dtype=np.uint8, count=end - start, offset=start)
+    full, rest = divmod(count, ace_index.XSS_PER_LINE)
+    size = full * LINE_WIDTH + (rest * FIELD_WIDTH + 1 if rest else 0)
+    if len(raw) in (size, size - 1) and (raw[LINE_WIDTH - 1:full * LINE_WIDTH:LINE_WIDTH] == ord("\n")).all():
+        lines = raw[:full * LINE_WIDTH].reshape(full, LINE_WIDTH)[:, :-1].reshape(-1, FIELD_WIDTH)
+        tail = raw[full * LINE_WIDTH:full * LINE_WIDTH + rest * FIELD_WIDTH].reshape(-1, FIELD_WIDTH)
+        return _parse_fields(np.concatenate((lines, tail)))
+    values = np.array(bytes(data[start:end]).split()[:count]).astype(np.float64)
+    if len(values) != count:
+        raise ValueError(f"Expected {count} XSS values, found {len(values)}.")
+    return values
+
+
+class Table:
+    """
+    One ACE table of an ACEFile. NXS, JXS and XSS are parsed on first use;
+    the XSS of a binary (type 2) table is a read-only view of the mapped file.
+    Energies are in MeV, cross sections in barns.
+    """
+
+    def __init__(self, data, entry: ace_index.ACETable):
+        self.data = data
+        self.entry = entry
+        self.zaid = entry.zaid
+        self.awr = entry.awr
+        self.temperature = entry.temperature  # kT (MeV)
+
+    def __repr__(self) -> str:
+        return f"<ACE table {self.zaid}, kT {self.temperature:.4e} MeV>"
+
+    @cached_property
+    def _arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        entry = self.entry
+        if entry.filetype == 2:
+            fields = ace_index.BINARY_HEADER.unpack_from(self.data, entry.offset)
+            nxs = np.array(fields[38:54], dtype=np.int64)
+            jxs = np.array(fields[54:86], dtype=np.int64)
+            xss = np.frombuffer(self.data, dtype=np.float64, count=entry.length,
+                                offset=entry.offset + ace_index.RECORD_LENGTH)
+            return nxs, jxs, xss
+
+        data = self.data
+        first = data[entry.offset:_skip_lines(data, entry.offset, 1)].split()
+        if first[0].startswith(b"2.0."):
+            second_start = _skip_lines(data, entry.offset, 1)
+            comments = int(data[second_start:_skip_lines(data, second_start, 1)].split()[3])
+            pos = _skip_lines(data, entry.offset, 2 + comments + ace_index.IZAW_LINES)
+        else:
+            pos = _skip_lines(data, entry.offset, 2 + ace_index.IZAW_LINES)
+        xss_start = _skip_lines(data, pos, ace_index.NXS_LINES + ace_index.JXS_LINES)
+        header = np.array(bytes(data[pos:xss_start]).split(), dtype=np.int64)
+        nxs, jxs = header[:16], header[16:48]
+        xss = _parse_floats(data, xss_start, entry.offset + entry.nbytes, entry.length)
+        return nxs, jxs, xss
+
+    @property
+    def nxs(self) -> np.ndarray:
+        """NXS(1..16), at index 0..15."""
+        return self._arrays[0]
+
+    @property
+    def jxs(self) -> np.ndarray:
+        """JXS(1..32), at index 0..31: 1-based XSS locators."""
+        return self._arrays[1]
+
+    @property
+    def xss(self) -> np.ndarray:
+        return self._arrays[2]
+
+    def _block(self, locator: int, count: int) -> np.ndarray:
+        """XSS(locator .. locator + count - 1), locator 1-based as in JXS."""
+        return self.xss[locator - 1:locator - 1 + count]
+
+    def _check_neutron(self):
+        if not self.zaid.endswith("c"):
+            raise ValueError(f"{self.zaid} is not a continuous-energy neutron table.")
+
+    @cached_property
+    def energy(self) -> np.ndarray:
+        """Energy grid (ESZ block) of a continuous-energy neutron table."""
+        self._check_neutron()
+        return self._block(int(self.jxs[0]), int(self.nxs[2]))
+
+    @cached_property
+    def reactions(self) -> List[int]:
+        """MT numbers of the reactions other than elastic (MTR block)."""
+        self._check_neutron()
+        return [int(mt) for mt in self._block(int(self.jxs[2]), int(self.nxs[3]))]
+
+    def cross_section(self, mt: int) -> np.ndarray:
+        """
+        Cross section of reaction `mt` on the energy grid, zero below its
+        threshold. MT 1 (total), 2 (elastic) and 101 (absorption) come from
+        the ESZ block, the others from SIG.
+        """
+        nes = int(self.nxs[2])
+        if mt in self.reactions:
+            i = self.reactions.index(mt)
+            sig = int(self.jxs[6])
+            loca = int(self._block(int(self.jxs[5]) + i, 1)[0])
+            first, count = (int(v) for v in self._block(sig + loca - 1, 2))
+            values = np.zeros(nes)
+            values[first - 1:first - 1 + count] = self._block(sig + loca + 1, count)
+            return values
+        esz_position = {1: 1, 101: 2, 2: 3}
+        if mt not in esz_position:
+            raise KeyError(f"{self.zaid} has no reaction MT {mt}.")
+        return self._block(int(self.jxs[0]) + esz_position[mt] * nes, nes)
+
+
+class ACEFile:
+    """
+    The tables of an ACE file (type 1 or 2) over a read-only memory map;
+    compressed files (ace_storage) are decompressed into memory instead.
+    Tables are found in one pass (ace_index) and parsed when first used.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = None
+        if ace_storage.file_codec(self.path) is not None:
+            self.data = ace_storage.read_bytes(self.path)
+        elif self.path.stat().st_size == 0:
+            self.data = b""
+        else:
+            self._file = open(self.path, "rb")
+            self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.tables: Dict[str, Table] = {entry.zaid: Table(self.data, entry) for entry in ace_index.scan(self.data)}
+
+    def __getitem__(self, zaid: str) -> Table:
+        return self.tables[zaid]
+
+    def __iter__(self) -> Iterator[Table]:
+        return iter(self.tables.values())
+
+    def __len__(self) -> int:
+        return len(self.tables)
+
+    def close(self):
+        """Release the map; kept alive while arrays of binary tables still view it."""
+        if isinstance(self.data, mmap.mmap):
+            try:
+                self.data.close()
+            except BufferError:
+                pass
+        if self._file is not None:
+            self._file.close()
+
+    def __enter__(self) -> "ACEFile":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_lines(path) -> Dict[str, Tuple[List[int], List[int], List[float]]]:
+    """
+    {ZAID: (NXS, JXS, XSS)} of a type-1 ACE file, parsed one line and one
+    float() at a time. The reference the benchmark measures ACEFile against.
+    """
+    tables = {}
+    with open(path, "r") as f:
+        lines = iter(f)
+        for line in lines:
+            first = line.split()
+            if not first:
+                continue
+            if first[0].startswith("2.0."):
+                zaid = first[1]
+                for _ in range(int(next(lines).split()[3]) + ace_index.IZAW_LINES):
+                    next(lines)
+            else:
+                zaid = first[0]
+                for _ in range(1 + ace_index.IZAW_LINES):
+                    next(lines)
+            nxs = [int(v) for _ in range(ace_index.NXS_LINES) for v in next(lines).split()]
+            jxs = [int(v) for _ in range(ace_index.JXS_LINES) for v in next(lines).split()]
+            xss = []
+            while len(xss) < nxs[0]:
+                xss.extend(float(v) for v in next(lines).split())
+            tables[zaid] = (nxs, jxs, xss)
+    return tables
+
+
+# --- Benchmark ---
+def _best_time(func, *args, repeat: int = Config.BENCHMARK_REPEAT) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _read_all(path):
+    with ACEFile(path) as ace_file:
+        for table in ace_file:
+            table.xss  # Parses NXS, JXS and XSS
+        return ace_file
+
+
+def benchmark(ace_dir: Path, names: List[str]) -> Dict[str, Tuple[float, float]]:
+    """
+    Parse the ASCII ACE files `names` of ace_dir line by line and with
+    ACEFile, checking both give the same arrays. Returns {name: (MB/s line
+    by line, MB/s ACEFile)} (best of Config.BENCHMARK_REPEAT runs).
+    """
+    Logger.header("ACE READER BENCHMARK")
+    results = {}
+    for name in names:
+        path = ace_dir / name
+        if not path.is_file():
+            Logger.warn(f"{path} not found, skipped.")
+            continue
+        if ace_storage.file_codec(path) is not None or ace_index.file_type(path) != 1:
+            Logger.warn(f"{name} is not an uncompressed ASCII ACE file, skipped.")
+            continue
+        reference = read_lines(path)
+        with ACEFile(path) as ace_file:
+            same = set(reference) == set(ace_file.tables) and all(
+                reference[zaid][0] == ace_file[zaid].nxs.tolist() and reference[zaid][1] == ace_file[zaid].jxs.tolist()
+                and np.array_equal(np.array(reference[zaid][2]), ace_file[zaid].xss) for zaid in reference)
+        if not same:
+            Logger.error(f"{name}: ACEFile arrays differ from the line-by-line parse.")
+            continue
+        mb = path.stat().st_size / 1e6
+        results[name] = (mb / _best_time(read_lines, path), mb / _best_time(_read_all, path))
+        Logger.info(f"{name}: {len(reference)} tables, {mb:.2f} MB, arrays identical.")
+
+    if results:
+        print(f"\n{'Table':<8}{'Line by line (MB/s)':>21}{'ACEFile (MB/s)':>16}{'Speedup':>9}")
+        for name, (lines_rate, array_rate) in results.items():
+            print(f"{name:<8}{lines_rate:>21.1f}{array_rate:>16.1f}{array_rate / lines_rate:>8.1f}x")
+    return results
+
+
+def show(path: Path):
+    """Print the tables of an ACE file: energy grid and reactions of neutron tables."""
+    with ACEFile(path) as ace_file:
+        Logger.info(f"{path}: {len(ace_file)} tables.")
+        for table in ace_file:
+            line = f"  {table.zaid:<12} AWR {table.awr:<10.6g} kT {table.temperature:.4e} MeV  XSS {len(table.xss)}"
+            if table.zaid.endswith("c"):
+                energy = table.energy
+                line += (f"  {len(energy)} energies {energy[0]:.3e}-{energy[-1]:.3e} MeV"
+                         f"  MT {', '.join(str(mt) for mt in table.reactions)}")
+            print(line)
+
+
+# --- Entry Point ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Read ACE files into NumPy arrays and benchmark the reader.")
+    sub = parser.add_subparsers(dest="action", required=True)
+    show_parser = sub.add_parser("show", help="List the tables of an ACE file")
+    show_parser.add_argument("ace_file", type=Path)
+    bench_parser = sub.add_parser("benchmark", help="Throughput (MB/s) against line-by-line parsing")
+    bench_parser.add_argument("tables", nargs="*", default=Config.BENCHMARK_TABLES,
+                              help=f"ACE files of --ace-dir (Default: {' '.join(Config.BENCHMARK_TABLES)})")
+    bench_parser.add_argument("--ace-dir", type=Path, default=Config.ACE_DIR,
+                              help="Directory of the ASCII ACE files (Default: data/incident_neutron_ace)")
+    args = parser.parse_args()
+
+    if args.action == "show":
+        show(args.ace_file)
+    elif not benchmark(args.ace_dir, args.tables):
+        sys.exit(1)
@@ -0,0 +1,246 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from colorama import Fore, Style, init
+
+# Ensure local modules can be imported when running as a script
+current_dir = Path(__file__).resolve().parent
+if str(current_dir) not in sys.path:
+    sys.path.append(str(current_dir))
+
+try:
+    import ace_index
+    import ace_storage
+except ImportError:
+    from gennjoy import ace_index, ace_storage
+
+# Initialize colorama
+init(autoreset=True)
+
+
+# --- Configuration ---
+class Config:
+    BASE_DIR = Path(__file__).resolve().parent
+    ACE_DIR = BASE_DIR / "data" / "incident_neutron_ace"
+    BENCHMARK_TABLES = ["H1", "H2", "H3"]
+    CONVERTER = "openmc-ace-to-hdf5"
+
+
+# --- Logging Helper ---
+class Logger:
+    @staticmethod
+    def info(msg):
+        print(f"{Fore.GREEN}[INFO] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def debug(msg):
+        print(f"{Fore.CYAN}[DEBUG] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def warn(msg):
+        print(f"{Fore.YELLOW}[WARN] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def error(msg):
+        print(f"{Fore.RED}[ERROR] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def header(msg):
+        print(f"\n{Fore.MAGENTA}{'='*60}")
+        print(f"{Fore.BLUE}{Style.BRIGHT}{msg.center(60)}")
+        print(f"{Fore.MAGENTA}{'='*60}{Style.RESET_ALL}")
+
+
+# --- Type-1 tables ---
+def _parse_ascii(text: str) -> Tuple[tuple, List[str]]:
+    """Header fields (as BINARY_HEADER packs them) and XSS words of one type-1 table."""
+    lines = text.splitlines()
+    first = lines[0].split()
+    if first[0].startswith("2.0."):
+        # 2.0.x header: version and ZAID, then AWR/kT/date/comment count, then the comments
+        second = lines[1].split()
+        count = int(second[3])
+        hz, awr, kt, hd = first[1], float(second[0]), float(second[1]), second[2]
+        hk, hm = (lines[2][:70] if count else ""), ""
+        body = lines[2 + count:]
+    else:
+        hz, awr, kt = lines[0][:10], float(first[1]), float(first[2])
+        hd = first[3] if len(first) > 3 else ""
+        hk, hm = lines[1][:70], lines[1][70:80]
+        body = lines[2:]
+
+    izaw = " ".join(body[:ace_index.IZAW_LINES]).split()
+    pairs = []
+    for iz, aw in zip(izaw[0::2], izaw[1::2]):
+        pairs += [int(iz), float(aw)]
+    start = ace_index.IZAW_LINES
+    nxs = [int(v) for v in " ".join(body[start:start + ace_index.NXS_LINES]).split()]
+    start += ace_index.NXS_LINES
+    jxs = [int(v) for v in " ".join(body[start:start + ace_index.JXS_LINES]).split()]
+    start += ace_index.JXS_LINES
+    xss = " ".join(body[start:start + -(-nxs[0] // ace_index.XSS_PER_LINE)]).split()
+
+    fields = (hz.encode().ljust(10)[:10], awr, kt, hd.encode().ljust(10)[:10],
+              hk.encode().ljust(70)[:70], hm.encode().ljust(10)[:10], *pairs, *nxs, *jxs)
+    return fields, xss
+
+
+def _padding(nbytes: int) -> bytes:
+    return b"\0" * (-nbytes % ace_index.RECORD_LENGTH)
+
+
+def ascii_to_binary(src, dst) -> List[ace_index.ACETable]:
+    """
+    Write the tables of a type-1 ACE file as a type-2 file (atomically).
+    Returns the index of the new file, whose addresses are record numbers.
+    """
+    data = ace_storage.read_bytes(src)
+    dst = Path(dst)
+    tmp = dst.with_name(f".{dst.name}.tmp")
+    with open(tmp, "wb") as out:
+        for table in ace_index.scan(data):
+            fields, xss = _parse_ascii(data[table.offset:table.offset + table.nbytes].decode())
+            header = ace_index.BINARY_HEADER.pack(*fields)
+            out.write(header + _padding(len(header)))
+            words = array("d", map(float, xss)).tobytes()
+            out.write(words + _padding(len(words)))
+    os.replace(tmp, dst)
+    return ace_index.index_tables(dst)
+
+
+# --- Type-2 tables ---
+def renumber(data: bytes, first_index: int, table_type: str) -> Tuple[bytes, List[str]]:
+    """
+    Rename the tables of type-2 contents .{first_index}, .{first_index + 1}, ...
+    (with table_type "c" or "t"). Returns the contents and the new table names.
+    """
+    out = bytearray(data)
+    names = []
+    for i, table in enumerate(ace_index.scan_binary(data), first_index):
+        name = table.zaid.rsplit(".", 1)[0] + f".{i:02}{table_type}"
+        field = bytes(out[table.offset:table.offset + 10]).decode()
+        out[table.offset:table.offset + 10] = field.replace(table.zaid, name, 1).encode().ljust(10)[:10]
+        names.append(name)
+    return bytes(out), names
+
+
+def read_xss(path) -> Dict[str, array]:
+    """{ZAID: XSS} of every table of an ACE file of either type."""
+    data = ace_storage.read_bytes(path)
+    tables = {}
+    for table in ace_index.scan(data):
+        if table.filetype == 2:
+            start = table.offset + ace_index.RECORD_LENGTH
+            xss = array("d")
+            xss.frombytes(data[start:start + 8 * table.length])
+        else:
+            _, words = _parse_ascii(data[table.offset:table.offset + table.nbytes].decode())
+            xss = array("d", map(float, words))
+        tables[table.zaid] = xss
+    return tables
+
+
+# --- Benchmark ---
+def _timed(func, *args) -> float:
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def _convert_hdf5(tool: str, ace_file: Path, out_dir: Path) -> float:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    env = os.environ.copy()
+    env["PYTHONWARNINGS"] = "ignore"
+    start = time.perf_counter()
+    subprocess.run([tool, "-d", str(out_dir), str(ace_file)], check=True, env=env,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    return time.perf_counter() - start
+
+
+def benchmark(ace_dir: Path, names: List[str], tool: Optional[str] = Config.CONVERTER) -> Dict[str, Dict]:
+    """
+    Compare the ASCII tables `names` of ace_dir with their binary form:
+    file size, indexing, reading XSS and (when `tool` is in PATH) the HDF5
+    conversion. Returns {name: {metric: (ascii, binary)}}.
+    """
+    Logger.header("ACE FORMAT BENCHMARK")
+    tool = tool if tool and shutil.which(tool) else None
+    if tool is None:
+        Logger.warn(f"{Config.CONVERTER} not found in PATH: HDF5 conversion times are skipped.")
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="gennjoy-ace-bench-") as tmp:
+        tmp = Path(tmp)
+        for name in names:
+            src = ace_dir / name
+            if not src.is_file():
+                Logger.warn(f"{src} not found, skipped.")
+                continue
+            if ace_index.file_type(src) != 1:
+                Logger.warn(f"{name} is not an ASCII ACE file, skipped.")
+                continue
+            binary = tmp / f"{name}.bin"
+            to_binary = _timed(ascii_to_binary, src, binary)
+            if read_xss(src) != read_xss(binary):
+                Logger.error(f"{name}: binary XSS differs from the ASCII tables.")
+                continue
+            metrics = {
+                "size_mb": (src.stat().st_size / 1e6, binary.stat().st_size / 1e6),
+                "index_s": (_timed(ace_index.index_tables, src), _timed(ace_index.index_tables, binary)),
+                "read_xss_s": (_timed(read_xss, src), _timed(read_xss, binary)),
+            }
+            if tool is not None:
+                metrics["hdf5_s"] = (_convert_hdf5(tool, src, tmp / f"{name}-ascii"),
+                                     _convert_hdf5(tool, binary, tmp / f"{name}-binary"))
+            results[name] = metrics
+            Logger.info(f"{name}: {len(ace_index.index_tables(src))} tables, "
+                        f"converted to binary in {to_binary:.3f} s.")
+
+    if not results:
+        return results
+    labels = {"size_mb": "Size (MB)", "index_s": "Index (s)", "read_xss_s": "Read XSS (s)",
+              "hdf5_s": "HDF5 conversion (s)"}
+    print(f"\n{'Table':<8}{'Metric':<22}{'ASCII':>12}{'Binary':>12}{'Ratio':>9}")
+    totals: Dict[str, List[float]] = {}
+    for name, metrics in results.items():
+        for metric, (ascii_value, binary_value) in metrics.items():
+            total = totals.setdefault(metric, [0.0, 0.0])
+            total[0] += ascii_value
+            total[1] += binary_value
+            ratio = ascii_value / binary_value if binary_value else 0.0
+            print(f"{name:<8}{labels[metric]:<22}{ascii_value:>12.4f}{binary_value:>12.4f}{ratio:>8.1f}x")
+    for metric, (ascii_value, binary_value) in totals.items():
+        ratio = ascii_value / binary_value if binary_value else 0.0
+        print(f"{'Total':<8}{labels[metric]:<22}{ascii_value:>12.4f}{binary_value:>12.4f}{ratio:>8.1f}x")
+    return results
+
+
+# --- Entry Point ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert ASCII ACE files to binary (type 2) and benchmark both formats.")
+    sub = parser.add_subparsers(dest="action", required=True)
+    convert_parser = sub.add_parser("convert", help="Write an ASCII ACE file as a binary one")
+    convert_parser.add_argument("source")
+    convert_parser.add_argument("destination")
+    bench_parser = sub.add_parser("benchmark", help="Compare disk footprint and conversion time of both formats")
+    bench_parser.add_argument("tables", nargs="*", default=Config.BENCHMARK_TABLES,
+                              help=f"ACE files of --ace-dir (Default: {' '.join(Config.BENCHMARK_TABLES)})")
+    bench_parser.add_argument("--ace-dir", type=Path, default=Config.ACE_DIR,
+                              help="Directory of the ASCII ACE files (Default: data/incident_neutron_ace)")
+    bench_parser.add_argument("--no-hdf5", action="store_true", help=f"Do not time {Config.CONVERTER}")
+    args = parser.parse_args()
+
+    if args.action == "convert":
+        tables = ascii_to_binary(args.source, args.destination)
+        Logger.info(f"{args.destination}: {len(tables)} tables "
+                    f"({', '.join(f'{t.zaid} at record {t.address}' for t in tables)}).")
+    else:
+        if not benchmark(args.ace_dir, args.tables, None if args.no_hdf5 else Config.CONVERTER):
+            sys.exit(1)
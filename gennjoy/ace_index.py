@@ -0,0 +1,157 @@
+import mmap
+import struct
+from pathlib import Path
+from typing import Dict, List, NamedTuple
+
+try:
+    import ace_storage
+except ImportError:
+    from gennjoy import ace_storage
+
+# Type-1 (ASCII) ACE table: a header, then XSS in lines of four words.
+# Legacy header: ZAID/AWR/kT line, comment line, 4 lines of IZ/AW pairs,
+# 2 lines of NXS (16 integers) and 4 lines of JXS (32 integers).
+# A 2.0.x header replaces the first two lines by a version line, an
+# AWR/kT/count line and that many comment lines.
+IZAW_LINES = 4
+NXS_LINES = 2
+JXS_LINES = 4
+XSS_PER_LINE = 4
+
+# Type-2 (binary) ACE table: direct-access records of RECORD_LENGTH bytes.
+# The first record holds the header (HZ, AW, TZ, HD, HK, HM, IZ/AW pairs,
+# NXS, JXS) padded with NUL bytes, then XSS fills ENTRIES_PER_RECORD words
+# per record, in native byte order (as NJOY writes and openmc.data reads it).
+RECORD_LENGTH = 4096
+ENTRIES_PER_RECORD = 512
+BINARY_HEADER = struct.Struct("=10sdd10s70s10s" + "id" * 16 + "16i32i")
+
+
+class ACETable(NamedTuple):
+    zaid: str           # e.g. 1001.01c
+    awr: float
+    temperature: float  # kT (MeV)
+    address: int        # xsdir address: 1-based line (type 1) or record (type 2) of the header
+    offset: int         # Byte offset of the header
+    length: int         # NXS(1), words of XSS: the xsdir table length
+    nbytes: int         # Bytes the table spans in the file (header included)
+    filetype: int = 1   # xsdir file type: 1 ASCII, 2 binary
+
+    @property
+    def suffix(self) -> str:
+        """Table identifier after the dot (01c, 02t, ...)."""
+        return self.zaid.rsplit(".", 1)[-1]
+
+
+class _Lines:
+    """Line cursor over a mapped file; skips runs of fixed-width lines without reading them."""
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+        self.line = 1
+
+    def at_end(self) -> bool:
+        return self.pos >= len(self.data)
+
+    def _end_of_line(self, pos: int) -> int:
+        end = self.data.find(b"\n", pos)
+        return len(self.data) if end < 0 else end + 1
+
+    def read(self) -> bytes:
+        end = self._end_of_line(self.pos)
+        text = self.data[self.pos:end]
+        self.pos = end
+        self.line += 1
+        return text
+
+    def skip(self, count: int):
+        if count <= 0:
+            return
+        # XSS lines are written with one format: jump over all but the last one,
+        # and check the jump landed on the same number of line ends
+        width = self._end_of_line(self.pos) - self.pos
+        target = self.pos + (count - 1) * width
+        if count > 1 and target <= len(self.data) and self.data[target - 1:target] == b"\n" \
+                and self.data[self.pos:target].count(b"\n") == count - 1:
+            self.pos = self._end_of_line(target)
+        else:
+            for _ in range(count):
+                self.pos = self._end_of_line(self.pos)
+        self.line += count
+
+
+def _read_ints(lines: _Lines, count: int) -> List[int]:
+    return [int(value) for _ in range(count) for value in lines.read().split()]
+
+
+def is_binary(data) -> bool:
+    """Type-2 contents: the header record is padded with NUL bytes, which ASCII ACE never holds."""
+    return b"\0" in data[:RECORD_LENGTH]
+
+
+def file_type(path) -> int:
+    """xsdir file type of an ACE file: 1 (ASCII) or 2 (binary), compressed or not."""
+    with ace_storage.open_ace(path) as f:
+        return 2 if is_binary(f.read(RECORD_LENGTH)) else 1
+
+
+def scan_binary(data) -> List[ACETable]:
+    """Index the tables of type-2 ACE contents: one header read per table, XSS records are skipped."""
+    tables = []
+    offset, record = 0, 1
+    while offset + BINARY_HEADER.size <= len(data):
+        fields = BINARY_HEADER.unpack_from(data, offset)
+        # NXS(1) follows the six header fields and the 16 IZ/AW pairs
+        length = fields[6 + 32]
+        records = 1 + -(-length // ENTRIES_PER_RECORD)
+        tables.append(ACETable(fields[0].decode().strip(), fields[1], fields[2], record, offset, length,
+                               records * RECORD_LENGTH, 2))
+        offset += records * RECORD_LENGTH
+        record += records
+    return tables
+
+
+def scan(data) -> List[ACETable]:
+    """Index the tables of ACE contents (bytes or mmap), type 1 or 2."""
+    if is_binary(data):
+        return scan_binary(data)
+    lines = _Lines(data)
+    tables = []
+    while not lines.at_end():
+        offset, line = lines.pos, lines.line
+        first = lines.read().split()
+        if not first:
+            continue  # Blank line between or after tables
+        if first[0].startswith(b"2.0."):
+            zaid = first[1]
+            second = lines.read().split()
+            awr, temperature, comments = float(second[0]), float(second[1]), int(second[3])
+            lines.skip(comments)
+        else:
+            zaid, awr, temperature = first[0], float(first[1]), float(first[2])
+            lines.skip(1)
+        lines.skip(IZAW_LINES)
+        nxs = _read_ints(lines, NXS_LINES)
+        lines.skip(JXS_LINES)
+        length = nxs[0]
+        lines.skip(-(-length // XSS_PER_LINE))
+        tables.append(ACETable(zaid.decode(), awr, temperature, line, offset, length, lines.pos - offset))
+    return tables
+
+
+def index_tables(path) -> List[ACETable]:
+    """Every table of an ACE file, in file order, from one pass over a memory map."""
+    with open(path, "rb") as f:
+        if Path(path).stat().st_size == 0:
+            return []
+        if ace_storage.codec_of(f.read(4)) is not None:
+            # Compressed storage: addresses are those of the decompressed contents
+            return scan(ace_storage.read_bytes(path))
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return scan(data)
+
+
+def tables_by_suffix(path) -> Dict[str, ACETable]:
+    """{suffix (01c, 02t, ...): table} of an ACE file."""
+    return {table.suffix: table for table in index_tables(path)}
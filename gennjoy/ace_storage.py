@@ -0,0 +1,372 @@
+import io
+import os
+import sys
+import gzip
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Optional
+from colorama import Fore, Style, init
+
+# Ensure local modules can be imported when running as a script
+current_dir = Path(__file__).resolve().parent
+if str(current_dir) not in sys.path:
+    sys.path.append(str(current_dir))
+
+try:
+    import scratch_space
+except ImportError:
+    from gennjoy import scratch_space
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None  # Only needed for zstd storage
+
+# Initialize colorama
+init(autoreset=True)
+
+
+# --- Configuration ---
+class Config:
+    BASE_DIR = Path(__file__).resolve().parent
+    # Codec of the ACE files GenNJOY stores, chosen per deployment: none, gzip or zstd
+    CODEC = os.environ.get("GENNJOY_ACE_COMPRESSION", "none").lower()
+    # 0: the codec's default level (DEFAULT_LEVELS)
+    LEVEL = int(os.environ.get("GENNJOY_ACE_COMPRESSION_LEVEL", "0"))
+    DEFAULT_LEVELS = {"gzip": 6, "zstd": 3}
+    CHUNK_SIZE = 1 << 20
+
+    ACE_DIR = BASE_DIR / "data" / "incident_neutron_ace"
+    BENCHMARK_TABLES = ["H1", "H2", "H3"]
+    BENCHMARK_LEVELS = [("gzip", 1), ("gzip", 6), ("gzip", 9), ("zstd", 3), ("zstd", 19)]
+
+
+# --- Logging Helper ---
+class Logger:
+    @staticmethod
+    def info(msg):
+        print(f"{Fore.GREEN}[INFO] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def debug(msg):
+        print(f"{Fore.CYAN}[DEBUG] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def warn(msg):
+        print(f"{Fore.YELLOW}[WARN] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def error(msg):
+        print(f"{Fore.RED}[ERROR] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def header(msg):
+        print(f"\n{Fore.MAGENTA}{'='*60}")
+        print(f"{Fore.BLUE}{Style.BRIGHT}{msg.center(60)}")
+        print(f"{Fore.MAGENTA}{'='*60}{Style.RESET_ALL}")
+
+
+# Compressed files keep their names; the codec is told by the leading bytes
+CODECS = ("none", "gzip", "zstd")
+MAGIC = {"gzip": b"\x1f\x8b", "zstd": b"\x28\xb5\x2f\xfd"}
+
+
+def check_codec(codec: Optional[str]) -> Optional[str]:
+    """Validated codec name (None: uncompressed storage). Raises ValueError."""
+    codec = (codec or "none").lower()
+    if codec not in CODECS:
+        raise ValueError(f"Unknown ACE compression '{codec}' (expected one of {', '.join(CODECS)}).")
+    if codec == "zstd" and zstandard is None:
+        raise ValueError("zstd ACE compression needs the 'zstandard' package (pip install zstandard).")
+    return None if codec == "none" else codec
+
+
+def codec_of(head: bytes) -> Optional[str]:
+    """Codec of contents starting with `head` (None: uncompressed)."""
+    for codec, magic in MAGIC.items():
+        if head.startswith(magic):
+            return codec
+    return None
+
+
+def file_codec(path) -> Optional[str]:
+    with open(path, "rb") as f:
+        return codec_of(f.read(4))
+
+
+def _level(codec: str, level: Optional[int] = None) -> int:
+    return level or Config.LEVEL or Config.DEFAULT_LEVELS[codec]
+
+
+def open_ace(path) -> BinaryIO:
+    """Readable stream of an ACE file's contents, decompressed when stored compressed."""
+    codec = file_codec(path)
+    if codec == "gzip":
+        return gzip.open(path, "rb")
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError(f"{path} is zstd-compressed: install the 'zstandard' package to read it.")
+        # Appended tables are further frames (append_temperature_tables); buffered for readline
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(
+            open(path, "rb"), read_across_frames=True, closefd=True))
+    return open(path, "rb")
+
+
+def read_bytes(path) -> bytes:
+    """Contents of an ACE file, decompressed when stored compressed."""
+    with open_ace(path) as f:
+        return f.read()
+
+
+# --- Reports ---
+class StorageReport:
+    """ACE bytes stored compressed, the space saved and the CPU time it cost (thread-safe)."""
+
+    def __init__(self, codec: Optional[str] = None):
+        self.codec = codec
+        self.lock = threading.Lock()
+        self.files = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+        self.compress_seconds = 0.0
+        self.decompressed_files = 0
+        self.decompressed_bytes = 0
+        self.decompress_seconds = 0.0
+
+    def compressed(self, raw_bytes: int, stored_bytes: int, seconds: float):
+        with self.lock:
+            self.files += 1
+            self.raw_bytes += raw_bytes
+            self.stored_bytes += stored_bytes
+            self.compress_seconds += seconds
+
+    def decompressed(self, raw_bytes: int, seconds: float):
+        with self.lock:
+            self.decompressed_files += 1
+            self.decompressed_bytes += raw_bytes
+            self.decompress_seconds += seconds
+
+    def summary(self) -> str:
+        parts = []
+        if self.files:
+            saved = self.raw_bytes - self.stored_bytes
+            rate = saved / 1e6 / self.compress_seconds if self.compress_seconds > 0 else 0.0
+            parts.append(
+                f"{self.files} ACE files, {self.raw_bytes / 1e6:.1f} MB stored as {self.stored_bytes / 1e6:.1f} MB "
+                f"({100 * saved / max(self.raw_bytes, 1):.0f}% saved) for {self.compress_seconds:.2f} s of CPU time "
+                f"({rate:.0f} MB saved per CPU second)"
+            )
+        if self.decompressed_files:
+            parts.append(f"{self.decompressed_files} files ({self.decompressed_bytes / 1e6:.1f} MB) decompressed "
+                         f"in {self.decompress_seconds:.2f} s of CPU time")
+        label = f"ACE storage ({self.codec})" if self.codec else "ACE storage"
+        return f"{label}: {'; '.join(parts) or 'nothing compressed'}."
+
+
+# --- Writing ---
+class _Sink:
+    """Write end of a compressed file that counts the uncompressed bytes given to it."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.raw_bytes = 0
+
+    def write(self, data) -> int:
+        self.raw_bytes += len(data)
+        return self.stream.write(data)
+
+
+def _compressor(codec: str, level: int, out: BinaryIO):
+    if codec == "gzip":
+        # No name or time stamp in the header: equal tables give equal files (checksums, caches)
+        return gzip.GzipFile(filename="", mode="wb", fileobj=out, compresslevel=level, mtime=0)
+    return zstandard.ZstdCompressor(level=level).stream_writer(out, closefd=False)
+
+
+@contextmanager
+def writer(path, codec: Optional[str], mode: str = "wb", report: Optional[StorageReport] = None,
+           level: Optional[int] = None) -> Iterator:
+    """
+    Binary stream that writes `path`, compressed with `codec` (plain when
+    None). Mode "ab" adds a gzip member or zstd frame, which readers join.
+    """
+    with open(path, mode) as out:
+        if codec is None:
+            yield out
+            return
+        before = out.tell()
+        start = time.thread_time()
+        with _compressor(codec, _level(codec, level), out) as stream:
+            sink = _Sink(stream)
+            yield sink
+        out.flush()
+        if report is not None:
+            report.compressed(sink.raw_bytes, out.tell() - before, time.thread_time() - start)
+
+
+def publish(src: Path, dst: Path, codec: Optional[str], report: Optional[StorageReport] = None) -> int:
+    """
+    Move a finished ACE file out of NJOY scratch, compressing it on the way
+    when `codec` is set: it is streamed into a hidden file next to dst that
+    is then renamed, so readers never see a partial file. Without a codec
+    this is scratch_space.publish. Returns the bytes written to dst's filesystem.
+    """
+    if codec is None:
+        return scratch_space.publish(src, dst)
+    src, dst = Path(src), Path(dst)
+    tmp = dst.with_name(f".{dst.name}.partial")
+    with open(src, "rb") as f, writer(tmp, codec, report=report) as out:
+        shutil.copyfileobj(f, out, Config.CHUNK_SIZE)
+    os.replace(tmp, dst)
+    src.unlink()
+    return dst.stat().st_size
+
+
+# --- Reading for tools that need a plain file ---
+def plain_file(path, directory: Path, report: Optional[StorageReport] = None) -> Path:
+    """
+    Path of an uncompressed form of `path`: the file itself when it is stored
+    uncompressed, else a copy decompressed into `directory` (e.g. for
+    openmc-ace-to-hdf5, which only reads plain ACE files).
+    """
+    path = Path(path)
+    if file_codec(path) is None:
+        return path
+    plain = Path(directory) / path.name
+    start = time.thread_time()
+    with open_ace(path) as f, open(plain, "wb") as out:
+        shutil.copyfileobj(f, out, Config.CHUNK_SIZE)
+    if report is not None:
+        report.decompressed(plain.stat().st_size, time.thread_time() - start)
+    return plain
+
+
+@contextmanager
+def decompressed(path, report: Optional[StorageReport] = None) -> Iterator[Path]:
+    """plain_file in a scratch directory that is removed afterwards."""
+    if file_codec(path) is None:
+        yield Path(path)
+        return
+    directory = Path(tempfile.mkdtemp(prefix="gennjoy-ace-", dir=scratch_space.scratch_root()))
+    try:
+        yield plain_file(path, directory, report)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def recompress(path, codec: Optional[str], report: Optional[StorageReport] = None) -> bool:
+    """Store an existing ACE file with `codec` (None: uncompressed), atomically. False if it already is."""
+    path = Path(path)
+    if file_codec(path) == codec:
+        return False
+    tmp = path.with_name(f".{path.name}.partial")
+    start = time.thread_time()
+    with open_ace(path) as f, writer(tmp, codec, report=report) as out:
+        shutil.copyfileobj(f, out, Config.CHUNK_SIZE)
+    if codec is None and report is not None:
+        report.decompressed(tmp.stat().st_size, time.thread_time() - start)
+    os.replace(tmp, path)
+    return True
+
+
+# --- Benchmark ---
+def benchmark(ace_dir: Path, names: List[str]) -> Dict[str, Dict[str, float]]:
+    """
+    Compress the ACE files `names` of ace_dir with each codec and level of
+    Config.BENCHMARK_LEVELS. Returns {"codec level": {size, CPU time, ...}}.
+    """
+    Logger.header("ACE COMPRESSION BENCHMARK")
+    files = [ace_dir / name for name in names if (ace_dir / name).is_file()]
+    if not files:
+        Logger.error(f"None of {', '.join(names)} found in {ace_dir}.")
+        return {}
+    contents = [read_bytes(f) for f in files]
+    raw = sum(len(data) for data in contents)
+    Logger.info(f"{len(files)} ACE files, {raw / 1e6:.2f} MB: {', '.join(f.name for f in files)}")
+
+    results = {}
+    for codec, level in Config.BENCHMARK_LEVELS:
+        if codec == "zstd" and zstandard is None:
+            Logger.warn("zstandard not installed: zstd levels skipped.")
+            continue
+        if codec == "gzip":
+            compress = lambda data: gzip.compress(data, compresslevel=level, mtime=0)
+            decompress = gzip.decompress
+        else:
+            compress = zstandard.ZstdCompressor(level=level).compress
+            decompress = zstandard.ZstdDecompressor().decompress
+        start = time.thread_time()
+        packed = [compress(data) for data in contents]
+        compress_seconds = time.thread_time() - start
+        start = time.thread_time()
+        if [decompress(data) for data in packed] != contents:
+            Logger.error(f"{codec} {level}: round trip changed the contents.")
+            continue
+        decompress_seconds = time.thread_time() - start
+        stored = sum(len(data) for data in packed)
+        results[f"{codec} {level}"] = {
+            "stored_mb": stored / 1e6,
+            "saved_percent": 100 * (raw - stored) / raw,
+            "compress_s": compress_seconds,
+            "decompress_s": decompress_seconds,
+            "saved_mb_per_cpu_s": (raw - stored) / 1e6 / max(compress_seconds, 1e-9),
+        }
+
+    print(f"\n{'Codec':<10}{'Stored (MB)':>12}{'Saved':>8}{'Compress (s)':>14}{'Decompress (s)':>16}{'MB saved/CPU s':>16}")
+    print(f"{'none':<10}{raw / 1e6:>12.2f}{'0%':>8}{0.0:>14.3f}{0.0:>16.3f}{'-':>16}")
+    for label, r in results.items():
+        print(f"{label:<10}{r['stored_mb']:>12.2f}{r['saved_percent']:>7.0f}%{r['compress_s']:>14.3f}"
+              f"{r['decompress_s']:>16.3f}{r['saved_mb_per_cpu_s']:>16.0f}")
+    return results
+
+
+def _ace_files(paths: List[Path]) -> List[Path]:
+    """ACE files named on the command line; directories stand for the ACE files in them."""
+    files = []
+    for path in paths:
+        if path.is_dir():
+            files.extend(f for f in sorted(path.iterdir()) if f.is_file() and not f.name.startswith(".")
+                         and f.name != "xsdir" and f.suffix != ".xsdir")
+        elif path.is_file():
+            files.append(path)
+        else:
+            Logger.warn(f"{path} not found, skipped.")
+    return files
+
+
+# --- Entry Point ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compress, decompress and benchmark stored ACE files.")
+    sub = parser.add_subparsers(dest="action", required=True)
+    compress_parser = sub.add_parser("compress", help="Compress ACE files in place (file names are kept)")
+    compress_parser.add_argument("paths", nargs="+", type=Path, help="ACE files or directories of ACE files")
+    compress_parser.add_argument("--codec", choices=["gzip", "zstd"], default=None,
+                                 help="Default: GENNJOY_ACE_COMPRESSION, else gzip")
+    decompress_parser = sub.add_parser("decompress", help="Store ACE files uncompressed again (e.g. for MCNP)")
+    decompress_parser.add_argument("paths", nargs="+", type=Path, help="ACE files or directories of ACE files")
+    bench_parser = sub.add_parser("benchmark", help="Size saved against CPU time for each codec and level")
+    bench_parser.add_argument("tables", nargs="*", default=Config.BENCHMARK_TABLES,
+                              help=f"ACE files of --ace-dir (Default: {' '.join(Config.BENCHMARK_TABLES)})")
+    bench_parser.add_argument("--ace-dir", type=Path, default=Config.ACE_DIR,
+                              help="Directory of the ACE files (Default: data/incident_neutron_ace)")
+    args = parser.parse_args()
+
+    if args.action == "benchmark":
+        if not benchmark(args.ace_dir, args.tables):
+            sys.exit(1)
+        sys.exit(0)
+
+    try:
+        codec = check_codec(args.codec or (Config.CODEC if Config.CODEC != "none" else "gzip")) \
+            if args.action == "compress" else None
+    except ValueError as e:
+        Logger.error(str(e))
+        sys.exit(1)
+    report = StorageReport(codec)
+    changed = sum(recompress(path, codec, report) for path in _ace_files(args.paths))
+    Logger.info(f"{changed} files {'compressed' if codec else 'decompressed'}. {report.summary()}")
@@ -0,0 +1,608 @@
+import os
+import json
+import time
+import shutil
+import socket
+import hashlib
+import asyncio
+import argparse
+import subprocess
+import tempfile
+import collections
+import re
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from colorama import Fore, Style, init
+
+# Initialize colorama
+init(autoreset=True)
+
+
+class Config:
+    BASE_DIR = Path(__file__).resolve().parent
+
+    CACHE_ROOT = Path(os.environ.get("GENNJOY_CACHE_DIR", BASE_DIR / "data" / "artifact_cache"))
+    MAX_SIZE_GB = float(os.environ.get("GENNJOY_CACHE_MAX_GB", "20"))
+
+    # Cache shared by several build hosts: a directory (e.g. on NFS) or an
+    # http(s):// URL of an object store such as `gennjoy cache serve`
+    SHARED_CACHE = os.environ.get("GENNJOY_SHARED_CACHE", "")
+    # A writer's lock file older than this is considered abandoned
+    LOCK_TIMEOUT = float(os.environ.get("GENNJOY_CACHE_LOCK_TIMEOUT", "600"))
+    HTTP_TIMEOUT = 60
+    SERVE_PORT = 7435
+
+
+# --- Fingerprinting ---
+def file_digest(file_path, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of a file's contents."""
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_key(fields: Dict) -> str:
+    """Stable key for a dict of job inputs (file digests, temperatures, settings...)."""
+    payload = json.dumps(fields, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+_NJOY_VERSIONS: Dict[str, str] = {}
+
+
+def njoy_version(njoy_exec: str) -> str:
+    """
+    Version string printed by NJOY (e.g. '2016.76'). Falls back to a hash of
+    the executable so that rebuilding NJOY still invalidates cached results.
+    """
+    if njoy_exec in _NJOY_VERSIONS:
+        return _NJOY_VERSIONS[njoy_exec]
+
+    version = None
+    try:
+        # NJOY writes an 'output' file in its cwd, so run it somewhere disposable
+        with tempfile.TemporaryDirectory() as tmp:
+            result = subprocess.run(
+                [njoy_exec], input="stop\n", capture_output=True, text=True, cwd=tmp, timeout=30
+            )
+        match = re.search(r"njoy\s*(?:version)?\s*(\d{4}\.\d+)", result.stdout, re.IGNORECASE)
+        if match:
+            version = match.group(1)
+    except (OSError, subprocess.SubprocessError):
+        pass
+
+    if version is None:
+        exe = shutil.which(njoy_exec) or njoy_exec
+        version = f"sha256:{file_digest(exe)}" if Path(exe).is_file() else "unknown"
+
+    _NJOY_VERSIONS[njoy_exec] = version
+    return version
+
+
+# --- Shared Backends ---
+# A shared entry has the same layout as a local one: objects/<kk>/<key>/ with the
+# artifact files and meta.json. meta.json lists the files and is written last,
+# so an entry without it is incomplete (still being uploaded) and is ignored.
+
+class DirectoryBackend:
+    """
+    Shared cache directory, e.g. on NFS, written by many hosts at once.
+
+    An entry is staged in a hidden directory next to its final place and
+    published with an atomic rename; a lock file created with O_EXCL keeps
+    two hosts from uploading the same entry, and a lock older than
+    Config.LOCK_TIMEOUT (a writer that died) is broken.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.objects = self.root / "objects"
+        self.label = str(self.root)
+
+    def _entry(self, key: str) -> Path:
+        return self.objects / key[:2] / key
+
+    def fetch(self, key: str, dest: Path) -> bool:
+        """Copy a complete entry into the (empty) directory dest."""
+        entry = self._entry(key)
+        meta_file = entry / ArtifactCache.META_FILE
+        if not meta_file.exists():
+            return False
+        try:
+            for name in entry_files(meta_file, entry):
+                shutil.copyfile(entry / name, dest / name)
+            shutil.copyfile(meta_file, dest / ArtifactCache.META_FILE)
+        except OSError:
+            # Evicted while we read it
+            return False
+        return True
+
+    def _lock(self, key: str) -> Optional[Path]:
+        lock = self._entry(key).with_name(f"{key}.lock")
+        lock.parent.mkdir(parents=True, exist_ok=True)
+        for _ in range(2):
+            try:
+                fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    if time.time() - lock.stat().st_mtime < Config.LOCK_TIMEOUT:
+                        return None
+                    lock.unlink()
+                except FileNotFoundError:
+                    pass
+                continue
+            with os.fdopen(fd, "w") as f:
+                f.write(f"{socket.gethostname()} {os.getpid()}\n")
+            return lock
+        return None
+
+    def store(self, key: str, src: Path):
+        """Publish the local entry directory src (another host may be doing the same)."""
+        entry = self._entry(key)
+        if (entry / ArtifactCache.META_FILE).exists():
+            return
+        lock = self._lock(key)
+        if lock is None:
+            return
+        staging = None
+        try:
+            staging = Path(tempfile.mkdtemp(prefix=f".{key[:8]}-", dir=entry.parent))
+            for f in src.iterdir():
+                if f.is_file() and f.name != ArtifactCache.META_FILE:
+                    shutil.copyfile(f, staging / f.name)
+            shutil.copyfile(src / ArtifactCache.META_FILE, staging / ArtifactCache.META_FILE)
+            os.replace(staging, entry)
+        except OSError:
+            if staging is not None:
+                shutil.rmtree(staging, ignore_errors=True)
+        finally:
+            lock.unlink(missing_ok=True)
+
+
+class HTTPBackend:
+    """
+    Shared cache behind a plain HTTP object store: GET/PUT <url>/objects/<key>/<file>.
+    Artifacts are uploaded first and meta.json last, as the commit marker.
+    """
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.label = self.url
+
+    def _object(self, key: str, name: str) -> str:
+        return f"{self.url}/objects/{key}/{name}"
+
+    def _get(self, key: str, name: str, dest: Path) -> bool:
+        try:
+            with urllib.request.urlopen(self._object(key, name), timeout=Config.HTTP_TIMEOUT) as response, \
+                    open(dest, "wb") as f:
+                shutil.copyfileobj(response, f, 1 << 20)
+            return True
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return False
+            raise
+
+    def fetch(self, key: str, dest: Path) -> bool:
+        meta_file = dest / ArtifactCache.META_FILE
+        if not self._get(key, ArtifactCache.META_FILE, meta_file):
+            return False
+        for name in entry_files(meta_file, None):
+            if not self._get(key, name, dest / name):
+                meta_file.unlink()
+                return False
+        return True
+
+    def _put(self, key: str, name: str, src: Path):
+        with open(src, "rb") as f:
+            request = urllib.request.Request(
+                self._object(key, name), data=f, method="PUT",
+                headers={"Content-Length": str(src.stat().st_size), "Content-Type": "application/octet-stream"},
+            )
+            urllib.request.urlopen(request, timeout=Config.HTTP_TIMEOUT).close()
+
+    def _exists(self, key: str) -> bool:
+        request = urllib.request.Request(self._object(key, ArtifactCache.META_FILE), method="HEAD")
+        try:
+            urllib.request.urlopen(request, timeout=Config.HTTP_TIMEOUT).close()
+            return True
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return False
+            raise
+
+    def store(self, key: str, src: Path):
+        if self._exists(key):
+            return
+        for f in src.iterdir():
+            if f.is_file() and f.name != ArtifactCache.META_FILE:
+                self._put(key, f.name, f)
+        self._put(key, ArtifactCache.META_FILE, src / ArtifactCache.META_FILE)
+
+
+class ObjectStoreHandler(BaseHTTPRequestHandler):
+    """GET/HEAD/PUT /objects/<key>/<file> on a directory laid out like DirectoryBackend."""
+    root: Path = Config.CACHE_ROOT
+    KEY = re.compile(r"^[0-9a-f]{64}$")
+    NAME = re.compile(r"^[A-Za-z0-9_][A-Za-z0-9_.+-]*$")
+
+    def _target(self) -> Optional[Path]:
+        parts = self.path.split("?")[0].strip("/").split("/")
+        if len(parts) != 3 or parts[0] != "objects" or not self.KEY.match(parts[1]) or not self.NAME.match(parts[2]):
+            self.send_error(400, "Expected /objects/<sha256 key>/<file>")
+            return None
+        return self.root / "objects" / parts[1][:2] / parts[1] / parts[2]
+
+    def _send_file(self, with_body: bool):
+        target = self._target()
+        if target is None:
+            return
+        if not target.is_file():
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(target.stat().st_size))
+        self.end_headers()
+        if with_body:
+            with open(target, "rb") as f:
+                shutil.copyfileobj(f, self.wfile, 1 << 20)
+
+    def do_GET(self):
+        self._send_file(True)
+
+    def do_HEAD(self):
+        self._send_file(False)
+
+    def do_PUT(self):
+        target = self._target()
+        if target is None:
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=f".{target.name}-", dir=target.parent)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while length > 0:
+                    chunk = self.rfile.read(min(length, 1 << 20))
+                    if not chunk:
+                        raise OSError("upload cut short")
+                    f.write(chunk)
+                    length -= len(chunk)
+            # Each object appears atomically; meta.json, uploaded last, completes the entry
+            os.replace(tmp, target)
+        except OSError:
+            Path(tmp).unlink(missing_ok=True)
+            self.send_error(500)
+            return
+        self.send_response(201)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_object_store(root: Path, host: str, port: int):
+    """Minimal HTTP object store for HTTPBackend (a stand-in for S3-like storage)."""
+    handler = type("Handler", (ObjectStoreHandler,), {"root": Path(root)})
+    (Path(root) / "objects").mkdir(parents=True, exist_ok=True)
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"{Fore.GREEN}[INFO] Serving cache {root} on http://{host}:{port} "
+          f"(GENNJOY_SHARED_CACHE=http://{host}:{port}){Style.RESET_ALL}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def entry_files(meta_file: Path, entry: Optional[Path]) -> List[str]:
+    """Artifact files of an entry, from its meta.json (older entries: the directory listing)."""
+    with open(meta_file, "r") as f:
+        files = json.load(f).get("files")
+    if files is None and entry is not None:
+        files = [p.name for p in entry.iterdir() if p.is_file() and p.name != ArtifactCache.META_FILE]
+    return files or []
+
+
+def shared_backend(spec: str):
+    """Backend for a GENNJOY_SHARED_CACHE value (None if unset)."""
+    if not spec:
+        return None
+    if spec.startswith(("http://", "https://")):
+        return HTTPBackend(spec)
+    return DirectoryBackend(Path(spec).expanduser())
+
+
+# --- Cache Store ---
+class ArtifactCache:
+    """
+    Content-addressed store for NJOY artifacts (ACE file, xsdir fragment, ...).
+
+    Each entry is a directory objects/<kk>/<key>/ holding the artifact files and
+    a meta.json. Entries are published with an atomic rename, their mtime is
+    bumped on every hit, and evict() drops least-recently-used entries until
+    the store fits in max_bytes. Hits, misses, stores and evictions are
+    appended to stats.log.
+
+    With a shared backend (Config.SHARED_CACHE), a local miss reads through
+    to the shared cache and the entry is kept locally; stores are written
+    through to it, so one host's NJOY run serves the whole fleet. Errors of
+    the shared cache never fail a build: it is then used as a miss.
+    """
+    META_FILE = "meta.json"
+
+    def __init__(self, root: Optional[Path] = None, max_bytes: Optional[int] = None, shared: Optional[str] = None):
+        self.root = Path(root) if root else Config.CACHE_ROOT
+        self.max_bytes = max_bytes if max_bytes is not None else int(Config.MAX_SIZE_GB * 1e9)
+        self.objects = self.root / "objects"
+        self.stats_log = self.root / "stats.log"
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.shared = shared_backend(Config.SHARED_CACHE if shared is None else shared)
+        # This run's lookups; shared hits by the host that built the entry
+        self.hits = 0
+        self.misses = 0
+        self.shared_hosts = collections.Counter()
+        self.shared_errors = 0
+        self.pulled: Dict[str, str] = {}
+
+    def _entry(self, key: str) -> Path:
+        return self.objects / key[:2] / key
+
+    def _log(self, event: str, key: str, size: int = 0):
+        # One short append per event: safe with concurrent workers
+        with open(self.stats_log, "a") as f:
+            f.write(f"{time.time():.0f} {event} {key} {size}\n")
+
+    def _shared_error(self, action: str, error: Exception):
+        # One warning, then the rest of the run does without the shared cache
+        # (an unreachable server would otherwise cost a timeout per lookup)
+        self.shared_errors += 1
+        if self.shared_errors == 1:
+            print(f"{Fore.YELLOW}[WARN] Shared cache {self.shared.label}: {action} failed ({error}); "
+                  f"continuing with the local cache.{Style.RESET_ALL}")
+
+    def _pull(self, key: str) -> Optional[str]:
+        """
+        Copy a shared entry into the local cache (noted in self.pulled until it
+        is fetched). Returns the host that built it, None on a miss.
+        """
+        entry = self._entry(key)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=f".{key[:8]}-", dir=entry.parent))
+        try:
+            if not self.shared.fetch(key, staging):
+                return None
+            with open(staging / self.META_FILE, "r") as f:
+                host = json.load(f).get("host", "unknown")
+            os.replace(staging, entry)
+            self.pulled[key] = host
+            return host
+        except (OSError, ValueError) as e:
+            if not entry.exists():
+                self._shared_error("read", e)
+                return None
+            # Another local process pulled it first
+            return "unknown"
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def fetch(self, key: str, files: Dict[str, Path]) -> bool:
+        """
+        Restore artifacts of `key` to the given destinations
+        ({artifact name: destination path}). Returns False on a miss.
+        """
+        entry = self._entry(key)
+        if not all((entry / name).exists() for name in files) and self.shared is not None and not self.shared_errors:
+            self._pull(key)
+        if not all((entry / name).exists() for name in files):
+            self.misses += 1
+            self._log("miss", key)
+            return False
+        host = self.pulled.pop(key, None)
+        event = "hit" if host is None else "shared-hit"
+
+        size = 0
+        for name, dest in files.items():
+            Path(dest).parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(entry / name, dest)
+            size += (entry / name).stat().st_size
+        os.utime(entry)
+        if host is None:
+            self.hits += 1
+        else:
+            self.shared_hosts[host] += 1
+        self._log(event, key, size)
+        return True
+
+    def meta(self, key: str) -> Optional[Dict]:
+        """meta.json of an entry (read through to the shared cache), None on a miss."""
+        meta_file = self._entry(key) / self.META_FILE
+        if not meta_file.exists() and self.shared is not None and not self.shared_errors:
+            self._pull(key)
+        try:
+            with open(meta_file, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def store(self, key: str, files: Dict[str, Path], meta: Optional[Dict] = None):
+        """Copy artifacts ({artifact name: source path}) into the cache under `key`."""
+        entry = self._entry(key)
+        if entry.exists():
+            return
+        entry.parent.mkdir(parents=True, exist_ok=True)
+
+        staging = Path(tempfile.mkdtemp(prefix=f".{key[:8]}-", dir=entry.parent))
+        try:
+            size = 0
+            for name, src in files.items():
+                shutil.copyfile(src, staging / name)
+                size += (staging / name).stat().st_size
+            with open(staging / self.META_FILE, "w") as f:
+                json.dump({"created": time.time(), "size": size, "files": sorted(files),
+                           "host": socket.gethostname(), **(meta or {})}, f, indent=2)
+            os.replace(staging, entry)
+            self._log("store", key, size)
+        except OSError:
+            # Lost a race with another writer (or the disk is full): keep what is there
+            shutil.rmtree(staging, ignore_errors=True)
+            return
+        if self.shared is not None and not self.shared_errors:
+            try:
+                self.shared.store(key, entry)
+            except OSError as e:
+                self._shared_error("write", e)
+
+    def summary(self) -> str:
+        """This run's lookups, with the hosts that built the shared hits."""
+        shared = sum(self.shared_hosts.values())
+        line = f"Artifact cache: {self.hits} local hits, {self.misses} misses"
+        if self.shared is None:
+            return line + "."
+        hosts = ", ".join(f"{host} x{count}" for host, count in self.shared_hosts.most_common())
+        return f"{line}, {shared} fleet hits from {self.shared.label}" + (f" (built on {hosts})." if hosts else ".")
+
+    def _entries(self):
+        for bucket in self.objects.iterdir():
+            if not bucket.is_dir():
+                continue
+            for entry in bucket.iterdir():
+                if entry.is_dir() and not entry.name.startswith("."):
+                    size = sum(f.stat().st_size for f in entry.iterdir() if f.is_file())
+                    yield entry, size, entry.stat().st_mtime
+
+    def evict(self) -> int:
+        """Remove least-recently-used entries until the cache fits. Returns bytes freed."""
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        freed = 0
+        for entry, size, _ in entries:
+            if total - freed <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            freed += size
+            self._log("evict", entry.name, size)
+        return freed
+
+    def clear(self):
+        shutil.rmtree(self.objects, ignore_errors=True)
+        self.objects.mkdir(parents=True, exist_ok=True)
+
+    def stats(self) -> Dict:
+        counts = {"hit": 0, "shared-hit": 0, "miss": 0, "store": 0, "evict": 0}
+        bytes_restored = 0
+        if self.stats_log.exists():
+            with open(self.stats_log, "r") as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) < 4 or parts[1] not in counts:
+                        continue
+                    counts[parts[1]] += 1
+                    if parts[1] in ("hit", "shared-hit"):
+                        bytes_restored += int(parts[3])
+
+        entries = list(self._entries())
+        hits = counts["hit"] + counts["shared-hit"]
+        lookups = hits + counts["miss"]
+        return {
+            **counts,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "bytes_restored": bytes_restored,
+            "entries": len(entries),
+            "size": sum(size for _, size, _ in entries),
+            "max_size": self.max_bytes,
+        }
+
+
+# --- Intermediate NJOY Tapes ---
+class TapeCache:
+    """
+    Reconstructed (reconr, 0 K) and Doppler-broadened (broadr) PENDF tapes,
+    stored in an ArtifactCache so they share its size bound and LRU eviction.
+
+    Keys cover the incident neutron ENDF contents, the reconstruction
+    tolerance, the broadening temperatures and the NJOY version, so a tape is
+    reused by any later neutron or TSL run of the same nuclide with the same
+    settings. lock(key) serialises concurrent producers of one tape inside
+    an event loop: the first run builds it, the others wait and restore it.
+    """
+
+    def __init__(self, cache: ArtifactCache):
+        self.cache = cache
+        self.locks = {}
+        self.skipped = {"reconr": 0, "broadr": 0}
+
+    def keys(self, endf_file, error: float, temperatures, njoy_exec: str) -> Tuple[str, str]:
+        """(reconr, broadr) tape keys of a run; the ENDF file is hashed once for both."""
+        fields = {"endf": file_digest(endf_file), "error": error, "njoy": njoy_version(njoy_exec)}
+        return (
+            cache_key(dict(fields, kind="pendf")),
+            cache_key(dict(fields, kind="broadr", temperatures=list(temperatures))),
+        )
+
+    def lock(self, key: str) -> asyncio.Lock:
+        if key not in self.locks:
+            self.locks[key] = asyncio.Lock()
+        return self.locks[key]
+
+    def fetch(self, key: str, dest: Path, module: str) -> bool:
+        if self.cache.fetch(key, {"tape": dest}):
+            self.skipped[module] += 1
+            return True
+        return False
+
+    def store(self, key: str, src: Path, module: str, endf_file):
+        self.cache.store(key, {"tape": src}, meta={"kind": module, "endf": Path(endf_file).name})
+
+    def summary(self) -> str:
+        return f"Tape cache: {self.skipped['reconr']} reconr / {self.skipped['broadr']} broadr runs skipped."
+
+
+# --- Entry Point ---
+def print_stats(cache: ArtifactCache):
+    s = cache.stats()
+    print(f"\n{Fore.CYAN}{'='*60}")
+    print(f"{Fore.BLUE}{Style.BRIGHT}{'ARTIFACT CACHE'.center(60)}")
+    print(f"{Fore.CYAN}{'='*60}{Style.RESET_ALL}")
+    print(f"Location : {cache.root}")
+    if cache.shared is not None:
+        print(f"Shared   : {cache.shared.label}")
+    print(f"Entries  : {s['entries']}")
+    print(f"Size     : {s['size'] / 1e9:.2f} GB / {s['max_size'] / 1e9:.2f} GB")
+    print(f"Hits     : {s['hit']} local + {s['shared-hit']} shared   Misses: {s['miss']}   Hit rate: {s['hit_rate']:.1%}")
+    print(f"Restored : {s['bytes_restored'] / 1e9:.2f} GB")
+    print(f"Stores   : {s['store']}   Evictions: {s['evict']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or maintain the NJOY artifact cache.")
+    parser.add_argument("action", nargs="?", default="stats", choices=["stats", "evict", "clear", "serve"])
+    parser.add_argument("--dir", default=None, help=f"Cache directory (Default: {Config.CACHE_ROOT})")
+    parser.add_argument("--max-gb", type=float, default=None, help="Size bound used by 'evict'")
+    parser.add_argument("--host", default="127.0.0.1", help="'serve': address to listen on (Default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=Config.SERVE_PORT,
+                        help=f"'serve': port to listen on (Default: {Config.SERVE_PORT})")
+    args = parser.parse_args()
+
+    if args.action == "serve":
+        serve_object_store(Path(args.dir) if args.dir else Config.CACHE_ROOT, args.host, args.port)
+        raise SystemExit(0)
+
+    max_bytes = int(args.max_gb * 1e9) if args.max_gb is not None else None
+    cache = ArtifactCache(Path(args.dir) if args.dir else None, max_bytes)
+
+    if args.action == "evict":
+        freed = cache.evict()
+        print(f"{Fore.GREEN}[INFO] Evicted {freed / 1e9:.2f} GB.{Style.RESET_ALL}")
+    elif args.action == "clear":
+        cache.clear()
+        print(f"{Fore.GREEN}[INFO] Cache cleared: {cache.root}{Style.RESET_ALL}")
+    print_stats(cache)
@@ -0,0 +1,154 @@
+import os
+import json
+import time
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    from artifact_cache import file_digest
+    import xsdir
+except ImportError:
+    from gennjoy.artifact_cache import file_digest
+    from gennjoy import xsdir
+
+
+class BuildJournal:
+    """
+    Append-only, fsynced record of the ACE tables held in an output directory.
+
+    One JSON object per line:
+      {"op": "start", "name": ..., "run": ..., "key": ..., "scratch": ...}
+                                                    an NJOY run was launched
+      {"op": "done", "name": ..., "key": ..., "temperatures": [...],
+       "ace": ..., "sha256": ..., "xsdir": [...]}  a table was completed
+      {"op": "remove", "name": ...}                 a table was dropped
+
+    Replaying the file gives the completed tables (used by --incremental and
+    --resume) and the runs that were still in flight when a batch died. A line
+    cut short by a crash is ignored.
+    """
+    FILE_NAME = ".journal.jsonl"
+
+    def __init__(self, output_dir: Path):
+        self.output_dir = Path(output_dir)
+        self.path = self.output_dir / self.FILE_NAME
+        self.entries: Dict[str, Dict] = {}
+        self.in_flight: Dict[str, Dict] = {}
+        # Tables are completed in executor threads while the event loop journals run starts
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        self.entries = {}
+        self.in_flight = {}
+        if not self.path.exists():
+            return
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                op = rec.get("op")
+                if op == "start":
+                    self.in_flight[rec["run"]] = rec
+                elif op == "done":
+                    self.entries[rec["name"]] = rec
+                    for run in [r for r, s in self.in_flight.items() if s.get("name") == rec["name"]]:
+                        del self.in_flight[run]
+                elif op == "remove":
+                    self.entries.pop(rec["name"], None)
+
+    def _append(self, rec: Dict):
+        rec["time"] = time.time()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.lock, open(self.path, "a") as f:
+            f.write(json.dumps(rec, sort_keys=True) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def compact(self):
+        """Rewrite the journal with only the completed tables (atomic)."""
+        self.load()
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w") as f:
+            for rec in self.entries.values():
+                f.write(json.dumps(rec, sort_keys=True) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self.in_flight = {}
+
+    def reset(self):
+        self.entries = {}
+        self.in_flight = {}
+        if self.path.exists():
+            self.path.unlink()
+
+    def names(self) -> List[str]:
+        return list(self.entries)
+
+    def get(self, name: str) -> Optional[Dict]:
+        return self.entries.get(name)
+
+    def is_current(self, name: str, key: Optional[str], verify: bool = False) -> bool:
+        """
+        True if `name` was completed from the same inputs and its ACE file is
+        still there (and, with verify, still matches the journaled checksum).
+        """
+        entry = self.entries.get(name)
+        if not entry or key is None or entry.get("key") != key:
+            return False
+        ace_file = self.output_dir / entry.get("ace", name)
+        if not ace_file.exists():
+            return False
+        return not verify or file_digest(ace_file) == entry.get("sha256")
+
+    def start(self, name: str, run: str, scratch: Path, key: Optional[str] = None):
+        """Journal the launch of an NJOY run (`run` is `name` or one temperature slice of it)."""
+        self._append({
+            "op": "start", "name": name, "run": run, "key": key,
+            "scratch": str(scratch), "pid": os.getpid(),
+        })
+
+    def record(self, name: str, key: Optional[str], temperatures: List[float], xsdir_lines: List[str]):
+        """Journal a completed table (thread-safe; the ACE file is hashed outside the lock)."""
+        ace_file = self.output_dir / name
+        rec = {
+            "op": "done",
+            "name": name,
+            "key": key,
+            "temperatures": temperatures,
+            "ace": name,
+            "sha256": file_digest(ace_file),
+            "xsdir": xsdir_lines,
+        }
+        self._append(rec)
+        self.entries[name] = rec
+
+    def remove(self, name: str):
+        if name in self.entries:
+            self._append({"op": "remove", "name": name})
+            del self.entries[name]
+
+    def clean_in_flight(self) -> Dict[str, Dict]:
+        """
+        Delete the scratch directories of runs whose table never completed.
+        Returns their start records ({run: record}).
+        """
+        self.load()
+        for rec in self.in_flight.values():
+            scratch = rec.get("scratch")
+            if scratch and Path(scratch).is_dir():
+                shutil.rmtree(scratch, ignore_errors=True)
+        return dict(self.in_flight)
+
+    def write_xsdir(self, template: Path, master_xsdir: Path) -> List[str]:
+        """
+        Rebuild the master xsdir from the template and the journaled entries,
+        sorted by ZAID and written atomically (xsdir.write_master). Returns
+        the ZAIDs that more than one table provides.
+        """
+        return xsdir.write_master(template, (rec.get("xsdir", []) for rec in self.entries.values()), master_xsdir)
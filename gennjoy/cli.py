@@ -1,6 +1,7 @@
 import sys
 import subprocess
 import shutil
+import shlex
 import os
 from pathlib import Path
 from typing import List, Optional
@@ -108,6 +109,12 @@ def get_validated_input_file(prompt_text: str, default_filename: str) -> str:
             
     return str(file_path)
 
+def get_processing_options() -> List[str]:
+    """Prompt for optional flags passed through to the NJOY runners."""
+    print(Fore.YELLOW + "   > Optional processing flags (e.g. --incremental --split-temperatures):")
+    user_input = input("     (Press Enter for none): ").strip()
+    return shlex.split(user_input)
+
 def display_menu():
     """Display the operation menu."""
     print(Fore.WHITE + Style.BRIGHT + "MAIN MENU: Select an Operation")
@@ -121,6 +128,43 @@ def display_menu():
     print(f" {Fore.RED}7.{Style.RESET_ALL} Exit")
     print("." * 42 + "\n")
 
+# --- Subcommands (non-interactive) ---
+
+# Command name -> (module script, description)
+COMMANDS = {
+    "estimate": ("cost_model.py", "Predict NJOY runtime/makespan for a batch file"),
+    "cache": ("artifact_cache.py", "Show artifact cache statistics (stats | evict | clear)"),
+    "worker": ("distributed.py", "Run NJOY jobs for a coordinator (--connect HOST:PORT)"),
+    "all": ("run_all_processing.py", "Run the neutron and TSL batches in one NJOY job pool"),
+    "libraries": ("run_multi_library.py", "Build several ENDF releases side by side in one NJOY job pool"),
+    "pipeline": ("pipeline.py", "Fetch, generate, run NJOY and convert to HDF5, streaming per isotope"),
+    "watch": ("watch.py", "Rebuild the affected tables whenever ENDF files or batch files change"),
+    "serve": ("service.py", "Serve NJOY jobs over a JSON HTTP API (warm pool, priorities)"),
+    "xsdir": ("xsdir.py", "Merge or inspect MCNP xsdir files (merge | show)"),
+    "ace-binary": ("ace_binary.py", "Convert ASCII ACE files to binary (type 2) and benchmark both formats"),
+    "ace-storage": ("ace_storage.py", "Compress, decompress and benchmark stored ACE files (gzip / zstd)"),
+    "ace": ("ace.py", "Read ACE files into NumPy arrays (show | benchmark)"),
+}
+
+def display_commands():
+    """List the non-interactive subcommands."""
+    print("Usage: gennjoy [command] [options]")
+    print("       (no command starts the interactive menu)\n")
+    print("Commands:")
+    for name, (_, description) in COMMANDS.items():
+        print(f"  {name.ljust(12)} {description}")
+
+def run_command(command: str, args: List[str]):
+    """Dispatch a subcommand to its module script."""
+    if command in ("-h", "--help", "help"):
+        display_commands()
+        return
+    if command not in COMMANDS:
+        print(Fore.RED + f"[!] Unknown command: {command}\n")
+        display_commands()
+        sys.exit(2)
+    run_script(COMMANDS[command][0], args)
+
 # --- Core Logic ---
 
 def process_choice(choice: str) -> bool:
@@ -146,7 +190,7 @@ def process_choice(choice: str) -> bool:
                 "neutron_process_batch.i"
             )
             if input_file:
-                run_script("run_neutron_processing.py", [input_file])
+                run_script("run_neutron_processing.py", [input_file] + get_processing_options())
     
     elif choice == "5":
         print("\n--- Executing NJOY (Thermal Scattering Processing) ---")
@@ -156,7 +200,7 @@ def process_choice(choice: str) -> bool:
                 "tsl_process_batch.i"
             )
             if input_file:
-                run_script("run_tsl_processing.py", [input_file])
+                run_script("run_tsl_processing.py", [input_file] + get_processing_options())
     
     elif choice == "6":
         print("\n--- Converting ACE to HDF5 ---")
@@ -174,6 +218,10 @@ def process_choice(choice: str) -> bool:
 # --- Entry Point ---
 
 def main():
+    if len(sys.argv) > 1:
+        run_command(sys.argv[1], sys.argv[2:])
+        return
+
     try:
         display_header()
         
@@ -3,9 +3,20 @@ import sys
 import subprocess
 import shutil
 import warnings
+from contextlib import ExitStack
 from pathlib import Path
 from colorama import Fore, Style, init
 
+# Ensure local modules can be imported when running as a script
+current_dir = Path(__file__).resolve().parent
+if str(current_dir) not in sys.path:
+    sys.path.append(str(current_dir))
+
+try:
+    import ace_storage
+except ImportError:
+    from gennjoy import ace_storage
+
 # Suppress warnings for the current process
 warnings.filterwarnings("ignore")
 
@@ -118,16 +129,21 @@ class LibraryCompilationManager:
         Log.info(f"Identified {len(ace_files)} ACE files. Initiating conversion...")
         
         # 2. Execution Phase
-        # Command Structure: openmc-ace-to-hdf5 -d <OUTPUT_DIR> <FILE_1> <FILE_2> ...
-        cmd = [AppConfig.BINARY_TOOL_NAME, "-d", str(AppConfig.LIBRARY_OUTPUT_PATH)] + ace_files
-        
         # Environment configuration to suppress subprocess warnings
         env = os.environ.copy()
         env["PYTHONWARNINGS"] = "ignore"
         
+        storage = ace_storage.StorageReport()
         try:
-            subprocess.run(cmd, check=True, env=env)
+            # Compressed ACE files are handed to the converter as decompressed scratch copies
+            with ExitStack() as stack:
+                plain_files = [str(stack.enter_context(ace_storage.decompressed(f, storage))) for f in ace_files]
+                # Command Structure: openmc-ace-to-hdf5 -d <OUTPUT_DIR> <FILE_1> <FILE_2> ...
+                cmd = [AppConfig.BINARY_TOOL_NAME, "-d", str(AppConfig.LIBRARY_OUTPUT_PATH)] + plain_files
+                subprocess.run(cmd, check=True, env=env)
             Log.info(f"Successfully compiled {len(ace_files)} files for {dataset_label}.")
+            if storage.decompressed_files:
+                Log.info(storage.summary())
             
         except subprocess.CalledProcessError as e:
             Log.error(f"Compilation failed with exit code: {e.returncode}")
@@ -168,6 +184,34 @@ class LibraryCompilationManager:
         except Exception as e:
             Log.error(f"Indexing failed: {e}")
 
+def add_temperatures(ace_file, table_names, library_dir=None):
+    """
+    Add the ACE tables `table_names` of ace_file (new temperatures of one
+    nuclide) to the nuclide's existing HDF5 file, which is rewritten atomically.
+    Returns the HDF5 path, or None if the nuclide is not in the library yet.
+    """
+    library_dir = Path(library_dir) if library_dir else AppConfig.LIBRARY_OUTPUT_PATH
+    with ace_storage.decompressed(ace_file) as plain_file:
+        tables = [openmc.data.ace.get_table(str(plain_file), name) for name in table_names]
+    if not tables:
+        return None
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        name = openmc.data.IncidentNeutron.from_ace(tables[0]).name
+        h5_file = library_dir / f"{name}.h5"
+        if not h5_file.exists():
+            return None
+
+        nuclide = openmc.data.IncidentNeutron.from_hdf5(h5_file)
+        for table in tables:
+            nuclide.add_temperature_from_ace(table)
+
+        tmp = h5_file.with_name(f".{h5_file.name}.tmp")
+        nuclide.export_to_hdf5(tmp, "w")
+        os.replace(tmp, h5_file)
+    return h5_file
+
 # --- Main Execution Entry Point ---
 if __name__ == "__main__":
     Log.banner("OPENMC HDF5 LIBRARY COMPILER")
@@ -0,0 +1,257 @@
+import sys
+import json
+import math
+import time
+import argparse
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from colorama import Fore, Style, init
+
+# Ensure local modules can be imported when running as a script
+current_dir = Path(__file__).resolve().parent
+if str(current_dir) not in sys.path:
+    sys.path.append(str(current_dir))
+
+try:
+    import endf_reader
+    import job_scheduler
+except ImportError:
+    # Fallback if running from parent directory
+    from gennjoy import endf_reader
+    from gennjoy import job_scheduler
+
+# Initialize colorama
+init(autoreset=True)
+
+
+class Config:
+    BASE_DIR = Path(__file__).resolve().parent
+
+    # Append-only record of past NJOY runs (one JSON object per line)
+    HISTORY_FILE = BASE_DIR / "data" / "njoy_runtime_history.jsonl"
+
+    NEUTRON_ENDF_DIR = BASE_DIR / "data" / "incident_neutron_endf"
+    THERMAL_ENDF_DIR = BASE_DIR / "data" / "thermal_scattering_endf"
+
+
+def job_features(endf_files: Sequence[Path], num_temperatures: int) -> Dict[str, float]:
+    """
+    Features known before NJOY runs: total ENDF size, resonance counts of the
+    incident-neutron evaluation (first file) and the temperature count.
+    """
+    size = 0
+    for endf_file in endf_files:
+        path = Path(endf_file)
+        if path.exists():
+            size += path.stat().st_size
+
+    counts = {"resolved": 0, "unresolved": 0}
+    if endf_files:
+        counts = endf_reader.read_resonance_counts(endf_files[0])
+
+    return {
+        "size_mb": size / 1e6,
+        "resolved": float(counts["resolved"]),
+        "unresolved": float(counts["unresolved"]),
+        "temperatures": float(max(1, num_temperatures)),
+    }
+
+
+def _design_row(features: Dict[str, float]) -> List[float]:
+    return [
+        1.0,
+        math.log1p(features["size_mb"]),
+        math.log1p(features["resolved"]),
+        math.log1p(features["unresolved"]),
+        math.log(features["temperatures"]),
+    ]
+
+
+class CostModel:
+    """
+    Predicts NJOY wall time (s) and peak memory (MB) per job.
+
+    Until enough runs have been recorded the prediction is a size x temperature
+    prior, rescaled by the observed/predicted ratio of the runs we do have.
+    With MIN_SAMPLES runs of a kind, a log-linear least-squares fit on the
+    features replaces the prior.
+    """
+    MIN_SAMPLES = 8
+
+    PRIOR_SECONDS = 2.0
+    PRIOR_SECONDS_PER_MB = 1.5
+    PRIOR_RESONANCE_SCALE = 2000.0
+    PRIOR_MEMORY_MB = 60.0
+    PRIOR_MEMORY_PER_MB = 6.0
+
+    def __init__(self, history_file: Optional[Path] = None):
+        self.history_file = Path(history_file) if history_file else Config.HISTORY_FILE
+        self.time_fit: Dict[str, object] = {}
+        self.memory_fit: Dict[str, object] = {}
+        self._fit(self.load_history())
+
+    # --- History ---
+    def load_history(self) -> List[Dict]:
+        records = []
+        if not self.history_file.exists():
+            return records
+        with open(self.history_file, "r") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+        return records
+
+    def record(self, kind: str, name: str, features: Dict[str, float],
+               wall_time: float, peak_rss_mb: Optional[float] = None):
+        """Append one finished run to the history file."""
+        entry = {
+            "kind": kind,
+            "name": name,
+            "features": features,
+            "wall_time": round(wall_time, 3),
+            "peak_rss_mb": round(peak_rss_mb, 1) if peak_rss_mb else None,
+            "timestamp": time.time(),
+        }
+        self.history_file.parent.mkdir(parents=True, exist_ok=True)
+        # Single short append per job: safe with concurrent workers
+        with open(self.history_file, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    # --- Fitting ---
+    def _prior(self, features: Dict[str, float]) -> Tuple[float, float]:
+        resonance_factor = 1.0 + (features["resolved"] + features["unresolved"]) / self.PRIOR_RESONANCE_SCALE
+        seconds = self.PRIOR_SECONDS + (
+            self.PRIOR_SECONDS_PER_MB * features["size_mb"] * features["temperatures"] * resonance_factor
+        )
+        memory = self.PRIOR_MEMORY_MB + self.PRIOR_MEMORY_PER_MB * features["size_mb"] * resonance_factor
+        return seconds, memory
+
+    def _fit_one(self, rows: List[Tuple[Dict, float]], prior_index: int):
+        """Least-squares coefficients, or a scalar correction of the prior."""
+        if not rows:
+            return None
+        if len(rows) >= self.MIN_SAMPLES:
+            X = np.array([_design_row(f) for f, _ in rows])
+            y = np.log([v for _, v in rows])
+            coef, *_ = np.linalg.lstsq(X, y, rcond=None)
+            return coef
+        ratios = [math.log(v / self._prior(f)[prior_index]) for f, v in rows]
+        return math.exp(sum(ratios) / len(ratios))
+
+    def _fit(self, records: List[Dict]):
+        by_kind: Dict[str, Dict[str, List]] = {}
+        for rec in records:
+            features = rec.get("features")
+            if not features:
+                continue
+            kind = by_kind.setdefault(rec.get("kind", "neutron"), {"time": [], "memory": []})
+            if rec.get("wall_time"):
+                kind["time"].append((features, float(rec["wall_time"])))
+            if rec.get("peak_rss_mb"):
+                kind["memory"].append((features, float(rec["peak_rss_mb"])))
+
+        for kind, rows in by_kind.items():
+            self.time_fit[kind] = self._fit_one(rows["time"], 0)
+            self.memory_fit[kind] = self._fit_one(rows["memory"], 1)
+
+    def _apply(self, fit, features: Dict[str, float], prior: float) -> float:
+        if fit is None:
+            return prior
+        if isinstance(fit, float):
+            return prior * fit
+        return float(math.exp(np.dot(fit, _design_row(features))))
+
+    def predict(self, kind: str, features: Dict[str, float]) -> Tuple[float, float]:
+        """Return (wall_time_seconds, peak_memory_mb) for one job."""
+        prior_time, prior_memory = self._prior(features)
+        seconds = self._apply(self.time_fit.get(kind), features, prior_time)
+        memory = self._apply(self.memory_fit.get(kind), features, prior_memory)
+        return seconds, memory
+
+
+# --- Batch estimation ---
+def _batch_jobs(batch_file: Path, neutron_dir: Path, thermal_dir: Path) -> List[Tuple[str, str, List[Path], int]]:
+    """Parse a neutron or TSL batch file into (kind, name, endf_files, num_temperatures)."""
+    try:
+        import njoy_execution_engine
+    except ImportError:
+        from gennjoy import njoy_execution_engine
+
+    gen = njoy_execution_engine.ACEGenerator(str(batch_file))
+    lines_n = [line for _, line in gen.search_string_in_file(batch_file, "element_n")]
+    lines_t = [line for _, line in gen.search_string_in_file(batch_file, "element_t")]
+
+    jobs = []
+    if lines_t:
+        for line_n, line_t in zip(lines_n, lines_t):
+            element_n = gen.gen_parametre_njoy(line_n)[0]
+            element_t, name, temps = gen.gen_parametre_njoy(line_t)
+            if element_n and element_t and name:
+                jobs.append(("tsl", name, [neutron_dir / element_n, thermal_dir / element_t], len(temps)))
+    else:
+        for _, line in gen.search_string_in_file(batch_file, "element"):
+            element, name, temps = gen.gen_parametre_njoy(line)
+            if element and name:
+                jobs.append(("neutron", name, [neutron_dir / element], len(temps)))
+    return jobs
+
+
+def format_duration(seconds: float) -> str:
+    """HHh:MMm:SSs with hours past 24 kept (multi-day batches)."""
+    minutes, secs = divmod(int(seconds), 60)
+    return f"{minutes // 60:02}h:{minutes % 60:02}m:{secs:02}s"
+
+
+def estimate_batch(batch_file: Path, cpu_counts: Sequence[int], neutron_dir: Path, thermal_dir: Path, top: int = 10):
+    """Print predicted per-job cost and the batch makespan for each CPU count."""
+    jobs = _batch_jobs(batch_file, neutron_dir, thermal_dir)
+    if not jobs:
+        print(f"{Fore.RED}[ERROR] No jobs found in {batch_file}{Style.RESET_ALL}")
+        return
+
+    model = CostModel()
+    predictions = []
+    for kind, name, endf_files, num_temps in jobs:
+        seconds, memory = model.predict(kind, job_features(endf_files, num_temps))
+        predictions.append((seconds, memory, name))
+    predictions.sort(reverse=True)
+
+    print(f"\n{Fore.CYAN}{'='*60}")
+    print(f"{Fore.BLUE}{Style.BRIGHT}{'NJOY BATCH ESTIMATE'.center(60)}")
+    print(f"{Fore.CYAN}{'='*60}{Style.RESET_ALL}")
+    print(f"Batch file : {batch_file}")
+    print(f"Jobs       : {len(jobs)}")
+    print(f"History    : {len(model.load_history())} recorded runs")
+
+    print(f"\n{Fore.YELLOW}Heaviest jobs:{Style.RESET_ALL}")
+    for seconds, memory, name in predictions[:top]:
+        print(f"   {name.ljust(10)} {format_duration(seconds)}   ~{memory:,.0f} MB")
+
+    durations = [p[0] for p in predictions]
+    print(f"\nTotal CPU time : {format_duration(sum(durations))} ({sum(durations) / 3600:.2f} core-hours)")
+    print(f"Peak job memory: ~{max(p[1] for p in predictions):,.0f} MB")
+
+    print(f"\n{Fore.YELLOW}Predicted makespan:{Style.RESET_ALL}")
+    for cpus in cpu_counts:
+        makespan = job_scheduler.simulate_makespan(durations, cpus)
+        print(f"   {str(cpus).rjust(4)} CPUs -> {format_duration(makespan)}")
+
+
+# --- Entry Point ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Predict NJOY runtime and makespan for a batch file.")
+    parser.add_argument("batch", help="Neutron or TSL batch file (e.g. inputs/neutron_process_batch.i)")
+    parser.add_argument("--cpus", type=int, nargs="+", default=[1, 8, 32, 64, 128],
+                        help="CPU counts to report the makespan for")
+    parser.add_argument("--neutron-dir", default=str(Config.NEUTRON_ENDF_DIR),
+                        help="Incident neutron ENDF directory")
+    parser.add_argument("--thermal-dir", default=str(Config.THERMAL_ENDF_DIR),
+                        help="Thermal scattering ENDF directory")
+    args = parser.parse_args()
+
+    estimate_batch(Path(args.batch).resolve(), args.cpus,
+                   Path(args.neutron_dir).resolve(), Path(args.thermal_dir).resolve())
@@ -0,0 +1,103 @@
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+
+MODES = ("core", "numa")
+
+
+def parse_cpulist(text: str) -> List[int]:
+    """CPUs of a sysfs cpulist such as '0-15,64-79'."""
+    cpus = []
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-")
+            cpus.extend(range(int(first), int(last) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def allowed_cpus() -> Set[int]:
+    """CPUs this process may run on (cgroup/taskset restrictions included)."""
+    try:
+        return set(os.sched_getaffinity(0))
+    except AttributeError:
+        return set(range(os.cpu_count() or 1))
+
+
+def numa_nodes(sysfs: Path = Path("/sys/devices/system/node")) -> Dict[int, List[int]]:
+    """
+    {NUMA node: allowed CPUs} from sysfs. Machines without NUMA information
+    (or non-Linux) are reported as a single node 0 holding every allowed CPU.
+    """
+    allowed = allowed_cpus()
+    nodes = {}
+    try:
+        for entry in sysfs.glob("node[0-9]*"):
+            cpus = [c for c in parse_cpulist((entry / "cpulist").read_text()) if c in allowed]
+            if cpus:
+                nodes[int(entry.name[4:])] = cpus
+    except OSError:
+        nodes = {}
+    return nodes or {0: sorted(allowed)}
+
+
+class Slot:
+    """CPUs and NUMA node given to one NJOY run."""
+
+    def __init__(self, cpus: List[int], node: int, key):
+        self.cpus = cpus
+        self.node = node
+        self.key = key
+
+
+class CPUPlacement:
+    """
+    Pins NJOY runs to CPUs of one NUMA node so their arrays stay in local memory.
+
+    mode "core" gives each run the least-loaded core, preferring the node with
+    the fewest runs; mode "numa" gives each run all cores of the least-loaded
+    node and lets the kernel balance runs within that socket. With first-touch
+    allocation, a pinned NJOY process gets its memory, and the tmpfs pages of
+    its tapes, from its own node. More runs than cores (an overcommitting
+    governor) share the least-loaded cores.
+    """
+
+    def __init__(self, mode: str, nodes: Optional[Dict[int, List[int]]] = None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown placement mode '{mode}' (expected one of {', '.join(MODES)})")
+        self.mode = mode
+        self.nodes = nodes or numa_nodes()
+        self.node_runs = {node: 0 for node in self.nodes}
+        self.core_runs = {cpu: 0 for cpus in self.nodes.values() for cpu in cpus}
+        self.placed = 0
+
+    def acquire(self) -> Slot:
+        node = min(self.nodes, key=lambda n: (self.node_runs[n] / len(self.nodes[n]), n))
+        self.node_runs[node] += 1
+        self.placed += 1
+        if self.mode == "numa":
+            return Slot(list(self.nodes[node]), node, None)
+        core = min(self.nodes[node], key=lambda c: (self.core_runs[c], c))
+        self.core_runs[core] += 1
+        return Slot([core], node, core)
+
+    def release(self, slot: Slot):
+        self.node_runs[slot.node] -= 1
+        if slot.key is not None:
+            self.core_runs[slot.key] -= 1
+
+    def summary(self) -> str:
+        sizes = ", ".join(f"node {n}: {len(c)} CPUs" for n, c in sorted(self.nodes.items()))
+        return f"Placement: {self.placed} NJOY runs pinned per {self.mode} ({sizes})."
+
+
+def pin(pid: int, cpus: List[int]):
+    """Restrict a process to the given CPUs (no-op where unsupported)."""
+    try:
+        os.sched_setaffinity(pid, cpus)
+    except (AttributeError, OSError):
+        pass
@@ -0,0 +1,540 @@
+import os
+import sys
+import json
+import time
+import socket
+import ipaddress
+import shutil
+import asyncio
+import argparse
+import tempfile
+import collections
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+from colorama import Fore, Style, init
+
+# Ensure local modules can be imported when running as a script
+current_dir = Path(__file__).resolve().parent
+if str(current_dir) not in sys.path:
+    sys.path.append(str(current_dir))
+
+try:
+    import njoy_execution_engine
+    import artifact_cache
+    import scratch_space
+    import cpu_placement
+    import ace_storage
+except ImportError:
+    from gennjoy import njoy_execution_engine
+    from gennjoy import artifact_cache
+    from gennjoy import scratch_space
+    from gennjoy import cpu_placement
+    from gennjoy import ace_storage
+
+init(autoreset=True)
+
+# --- Configuration ---
+class Config:
+    BASE_DIR = Path(__file__).resolve().parent
+    DEFAULT_PORT = 7433
+
+    # Workers send a heartbeat every HEARTBEAT_INTERVAL seconds; a worker silent
+    # for HEARTBEAT_TIMEOUT seconds is dropped and its jobs are requeued
+    HEARTBEAT_INTERVAL = float(os.environ.get("GENNJOY_HEARTBEAT_INTERVAL", 10))
+    HEARTBEAT_TIMEOUT = float(os.environ.get("GENNJOY_HEARTBEAT_TIMEOUT", 60))
+
+    # Shared secret a worker must present to join (unset: any worker may join)
+    TOKEN = os.environ.get("GENNJOY_CLUSTER_TOKEN", "")
+
+# --- Logging Helper ---
+class Logger:
+    @staticmethod
+    def info(msg):
+        print(f"{Fore.GREEN}[INFO] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def debug(msg):
+        print(f"{Fore.CYAN}[DEBUG] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def warn(msg):
+        print(f"{Fore.YELLOW}[WARN] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def error(msg):
+        print(f"{Fore.RED}[ERROR] {msg}{Style.RESET_ALL}")
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    """'host:port', 'host' or ':port' (this machine) -> (host, port)."""
+    host, _, port = address.rpartition(":") if ":" in address else (address, "", "")
+    return host or "127.0.0.1", int(port) if port else Config.DEFAULT_PORT
+
+
+def is_loopback(host: str) -> bool:
+    """Whether host only accepts connections from this machine."""
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+    except (OSError, ValueError):
+        return False
+
+# --- Wire Protocol ---
+# Every message is one JSON line; "files": [[name, size], ...] announces that
+# the listed files follow the line as raw bytes, in order.
+
+async def send_message(writer, lock: asyncio.Lock, header: Dict, files: Optional[Dict[str, Path]] = None):
+    """Send one message, with the given files ({name: path}) as its payload."""
+    files = files or {}
+    header = dict(header, files=[[name, Path(path).stat().st_size] for name, path in files.items()])
+    async with lock:
+        writer.write(json.dumps(header).encode() + b"\n")
+        for path in files.values():
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    writer.write(block)
+                    await writer.drain()
+        await writer.drain()
+
+
+async def read_message(reader, destinations: Optional[Callable[[Dict], Dict[str, Path]]] = None) -> Dict:
+    """
+    Read one message. Its files are written to the paths given by
+    `destinations(header)` (a callable returning {name: path}) through a
+    hidden temporary file and a rename, in the order they were sent;
+    files without a destination are discarded.
+    """
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("connection closed")
+    header = json.loads(line)
+    targets = destinations(header) if (destinations and header.get("files")) else {}
+    for name, size in header.get("files", []):
+        dest = targets.get(name)
+        tmp = dest.with_name(f".{dest.name}.partial") if dest else None
+        out = open(tmp, "wb") if tmp else None
+        try:
+            remaining = size
+            while remaining:
+                block = await reader.readexactly(min(remaining, 1 << 20))
+                remaining -= len(block)
+                if out:
+                    out.write(block)
+        finally:
+            if out:
+                out.close()
+        if tmp:
+            os.replace(tmp, dest)
+    return header
+
+# --- Coordinator ---
+class RemoteJob:
+    def __init__(self, job_id: int, spec: Dict, output_dir: Path, future: asyncio.Future):
+        self.job_id = job_id
+        self.spec = spec
+        self.output_dir = output_dir
+        self.future = future
+
+    def outputs(self) -> Dict[str, Path]:
+        """Where the worker's ACE file and xsdir fragment go (as a local run names them)."""
+        return {
+            "ace": self.output_dir / self.spec["ace"],
+            "xsdir": self.output_dir / f"{self.spec['name']}.xsdir",
+        }
+
+
+class WorkerConnection:
+    def __init__(self, writer, name: str, slots: int):
+        self.writer = writer
+        self.name = name
+        self.slots = slots
+        self.lock = asyncio.Lock()
+        self.jobs: Dict[int, RemoteJob] = {}
+        self.assigners = set()
+        self.last_seen = time.monotonic()
+
+
+class Coordinator:
+    """
+    Serves NJOY jobs to `gennjoy worker` agents over TCP.
+
+    Used as an async context manager around a batch (job_scheduler.run_async_queue
+    enters it in its event loop); run() queues one job and waits until a worker
+    has sent back its ACE file and xsdir fragment. Workers pull one job per
+    free slot, so jobs start in the order they were queued. A worker that
+    disconnects or misses heartbeats is dropped and its jobs go back to the
+    front of the queue for the next worker.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = Config.DEFAULT_PORT, token: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.token = Config.TOKEN if token is None else token
+        # Workers fetch ENDF files and upload ACE files into the library: other hosts need the token
+        if not self.token and not is_loopback(host):
+            raise ValueError(f"Listening on {host} needs GENNJOY_CLUSTER_TOKEN (set the same token on the workers), "
+                             f"or listen on 127.0.0.1.")
+        self.pending = collections.deque()
+        self.available = None
+        self.workers = set()
+        self.handlers = set()
+        self.endf_files: Dict[str, Path] = {}
+        self.digests: Dict[Path, Tuple[Tuple[int, int], str]] = {}  # ENDF path -> ((mtime, size), sha256)
+        self.server = None
+        self.watchdog = None
+        self.next_id = 0
+        self.requeued = 0
+
+    async def __aenter__(self):
+        self.available = asyncio.Condition()
+        self.server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.watchdog = asyncio.ensure_future(self._watchdog())
+        Logger.info(f"Coordinator listening on {self.host}:{self.port} (start workers with: gennjoy worker --connect HOST:{self.port})")
+        return self
+
+    async def __aexit__(self, *exc):
+        self.watchdog.cancel()
+        self.server.close()
+        for conn in list(self.workers):
+            try:
+                await send_message(conn.writer, conn.lock, {"op": "done"})
+            except (ConnectionError, OSError):
+                pass
+            conn.writer.close()
+        # Let the connection handlers see the close before the event loop ends
+        if self.handlers:
+            await asyncio.wait(list(self.handlers), timeout=5)
+        if self.requeued:
+            Logger.warn(f"Coordinator: {self.requeued} jobs were requeued after losing their worker.")
+
+    async def run(self, spec: Dict, endf_file: Path, output_dir: Path) -> Dict:
+        """
+        Queue one NJOY run (spec: name, temperatures, ace, input) of endf_file and
+        wait for it. The outputs are written to output_dir as a local run writes
+        them. Returns the worker's report (worker, elapsed, peak_rss_mb).
+        """
+        digest = await self._endf_digest(Path(endf_file))
+        self.endf_files[digest] = Path(endf_file)
+        self.next_id += 1
+        job = RemoteJob(
+            self.next_id, dict(spec, endf=Path(endf_file).name, sha256=digest),
+            Path(output_dir), asyncio.get_running_loop().create_future(),
+        )
+        job.output_dir.mkdir(parents=True, exist_ok=True)
+        await self._enqueue(job)
+        try:
+            return await job.future
+        except asyncio.CancelledError:
+            if job in self.pending:
+                self.pending.remove(job)
+            for conn in list(self.workers):
+                if conn.jobs.pop(job.job_id, None):
+                    try:
+                        await send_message(conn.writer, conn.lock, {"op": "cancel", "id": job.job_id})
+                    except (ConnectionError, OSError):
+                        pass
+            raise
+
+    async def _endf_digest(self, path: Path) -> str:
+        """Checksum of an ENDF file, hashed in a thread (heartbeats keep flowing) and kept per mtime and size."""
+        stat = path.stat()
+        version = (stat.st_mtime_ns, stat.st_size)
+        cached = self.digests.get(path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        digest = await asyncio.get_running_loop().run_in_executor(None, artifact_cache.file_digest, path)
+        self.digests[path] = (version, digest)
+        return digest
+
+    async def _enqueue(self, job: RemoteJob, front: bool = False):
+        async with self.available:
+            if front:
+                self.pending.appendleft(job)
+            else:
+                self.pending.append(job)
+            self.available.notify()
+
+    async def _assign(self, conn: WorkerConnection):
+        """Hand the next queued job to a free slot of conn."""
+        async with self.available:
+            await self.available.wait_for(lambda: self.pending)
+            job = self.pending.popleft()
+            conn.jobs[job.job_id] = job
+        try:
+            await send_message(conn.writer, conn.lock, {"op": "job", "id": job.job_id, "spec": job.spec})
+        except (ConnectionError, OSError):
+            await self._drop(conn)
+
+    async def _serve(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        conn = None
+        handler = asyncio.current_task()
+        self.handlers.add(handler)
+        try:
+            hello = await asyncio.wait_for(read_message(reader), Config.HEARTBEAT_TIMEOUT)
+            if hello.get("op") != "hello" or hello.get("token", "") != self.token:
+                Logger.warn(f"Rejected connection from {peer}.")
+                return
+            conn = WorkerConnection(writer, hello.get("name") or str(peer), int(hello.get("slots", 1)))
+            self.workers.add(conn)
+            Logger.info(f"Worker joined: {conn.name} ({conn.slots} slots)")
+
+            while True:
+                header = await read_message(reader, lambda h: self._destinations(conn, h))
+                conn.last_seen = time.monotonic()
+                op = header.get("op")
+                if op == "ready":
+                    task = asyncio.ensure_future(self._assign(conn))
+                    conn.assigners.add(task)
+                    task.add_done_callback(conn.assigners.discard)
+                elif op == "fetch":
+                    path = self.endf_files.get(header.get("sha256"))
+                    await send_message(writer, conn.lock, {"op": "endf", "sha256": header.get("sha256")},
+                                       {"endf": path} if path else None)
+                elif op == "result":
+                    job = conn.jobs.pop(header.get("id"), None)
+                    if job and not job.future.done():
+                        job.future.set_result(dict(header.get("report", {}), worker=conn.name))
+                elif op == "failed":
+                    job = conn.jobs.pop(header.get("id"), None)
+                    if job and not job.future.done():
+                        message = f"{header.get('error')} (on worker {conn.name})"
+                        reason = header.get("reason", "error")
+                        job.future.set_exception(
+                            RuntimeError(message) if reason == "error"
+                            else njoy_execution_engine.NJOYTimeout(message, reason)
+                        )
+        except (ConnectionError, OSError, ValueError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        finally:
+            if conn is not None:
+                await self._drop(conn)
+            writer.close()
+            self.handlers.discard(handler)
+
+    def _destinations(self, conn: WorkerConnection, header: Dict) -> Dict[str, Path]:
+        """Result files go straight to the job's output paths (ACE first, then xsdir)."""
+        job = conn.jobs.get(header.get("id"))
+        if header.get("op") != "result" or job is None:
+            return {}
+        return job.outputs()
+
+    async def _drop(self, conn: WorkerConnection):
+        """Forget a worker and requeue, at the front, the jobs it was running."""
+        if conn not in self.workers:
+            return
+        self.workers.discard(conn)
+        for task in list(conn.assigners):
+            task.cancel()
+        lost = [job for job in conn.jobs.values() if not job.future.done()]
+        conn.jobs.clear()
+        for job in reversed(lost):
+            await self._enqueue(job, front=True)
+        self.requeued += len(lost)
+        if lost:
+            Logger.warn(f"Worker lost: {conn.name}; requeued {', '.join(j.spec['name'] for j in lost)}.")
+        else:
+            Logger.debug(f"Worker left: {conn.name}")
+        conn.writer.transport.abort()
+
+    async def _watchdog(self):
+        while True:
+            await asyncio.sleep(min(Config.HEARTBEAT_INTERVAL, Config.HEARTBEAT_TIMEOUT / 2))
+            now = time.monotonic()
+            for conn in list(self.workers):
+                if now - conn.last_seen > Config.HEARTBEAT_TIMEOUT:
+                    Logger.warn(f"Worker {conn.name}: no heartbeat for {now - conn.last_seen:.0f} s.")
+                    await self._drop(conn)
+
+# --- Worker Agent ---
+class Worker:
+    """
+    Pulls NJOY jobs from a coordinator, runs them in local scratch directories
+    (with a node-local tape cache) and sends back the ACE file and xsdir
+    fragment. ENDF files are fetched once per node and kept by SHA-256.
+    """
+
+    def __init__(self, host: str, port: int, slots: int, njoy_exec: str, scratch_dir: Optional[Path] = None,
+                 use_cache: bool = True, token: Optional[str] = None, name: Optional[str] = None,
+                 placement: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.slots = max(1, slots)
+        self.njoy_exec = njoy_exec
+        self.scratch_dir = scratch_dir
+        self.scratch_root = scratch_space.scratch_root(scratch_dir)
+        self.placement = cpu_placement.CPUPlacement(placement) if placement else None
+        self.endf_store = self.scratch_root / "gennjoy-worker-endf"
+        self.token = Config.TOKEN if token is None else token
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.tape_cache = artifact_cache.TapeCache(artifact_cache.ArtifactCache()) if use_cache else None
+        self.writer = None
+        self.lock = None
+        self.running: Dict[int, asyncio.Task] = {}
+        self.fetches: Dict[str, asyncio.Future] = {}
+        self.completed = 0
+
+    async def _connect(self, retry_seconds: float):
+        deadline = time.monotonic() + retry_seconds
+        while True:
+            try:
+                return await asyncio.open_connection(self.host, self.port)
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(1)
+
+    async def run(self, retry_seconds: float = 60):
+        reader, self.writer = await self._connect(retry_seconds)
+        self.lock = asyncio.Lock()
+        await self._send({"op": "hello", "token": self.token, "name": self.name, "slots": self.slots})
+        Logger.info(f"Worker {self.name}: connected to {self.host}:{self.port} with {self.slots} slots.")
+        heartbeat = asyncio.ensure_future(self._heartbeat())
+        try:
+            for _ in range(self.slots):
+                await self._send({"op": "ready"})
+            while True:
+                header = await read_message(reader, self._destinations)
+                op = header.get("op")
+                if op == "job":
+                    self.running[header["id"]] = asyncio.ensure_future(self._run_job(header["id"], header["spec"]))
+                elif op == "endf":
+                    self._endf_received(header)
+                elif op == "cancel":
+                    task = self.running.get(header.get("id"))
+                    if task:
+                        task.cancel()
+                elif op == "done":
+                    break
+        except (ConnectionError, OSError, ValueError, asyncio.IncompleteReadError):
+            Logger.warn(f"Worker {self.name}: lost the coordinator.")
+        finally:
+            heartbeat.cancel()
+            for task in list(self.running.values()):
+                task.cancel()
+            await asyncio.gather(heartbeat, *self.running.values(), return_exceptions=True)
+            self.writer.close()
+        Logger.info(f"Worker {self.name}: {self.completed} jobs completed.")
+
+    async def _send(self, header: Dict, files: Optional[Dict[str, Path]] = None):
+        await send_message(self.writer, self.lock, header, files)
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(Config.HEARTBEAT_INTERVAL)
+            try:
+                await self._send({"op": "heartbeat", "running": len(self.running)})
+            except (ConnectionError, OSError):
+                return
+
+    def _endf_path(self, digest: str, filename: str) -> Path:
+        return self.endf_store / digest / Path(filename).name
+
+    def _destinations(self, header: Dict) -> Dict[str, Path]:
+        if header.get("op") != "endf" or header.get("sha256") not in self.fetches:
+            return {}
+        digest = header["sha256"]
+        path = self._endf_path(digest, self.fetches[digest].filename)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return {"endf": path}
+
+    def _endf_received(self, header: Dict):
+        digest = header.get("sha256")
+        future = self.fetches.pop(digest, None)
+        if future is None or future.done():
+            return
+        path = self._endf_path(digest, future.filename)
+        if path.exists() and artifact_cache.file_digest(path) == digest:
+            future.set_result(path)
+        else:
+            if path.exists():
+                path.unlink()
+            future.set_exception(FileNotFoundError(f"Coordinator could not send ENDF file {future.filename}"))
+
+    async def _endf(self, digest: str, filename: str) -> Path:
+        """Local copy of a job's ENDF file, fetched from the coordinator on first use."""
+        path = self._endf_path(digest, filename)
+        if path.exists():
+            return path
+        future = self.fetches.get(digest)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            future.filename = filename
+            self.fetches[digest] = future
+            await self._send({"op": "fetch", "sha256": digest})
+        return await asyncio.shield(future)
+
+    async def _run_job(self, job_id: int, spec: Dict):
+        name = spec["name"]
+        gen = njoy_execution_engine.ACEGenerator(name)
+        gen.tape_cache = self.tape_cache
+        gen.time_limit = spec.get("time_limit")
+        gen.stall_limit = spec.get("stall_limit")
+        gen.ace_type = spec.get("ace_type", gen.ace_type)
+        out_dir = Path(tempfile.mkdtemp(prefix=f"gennjoy-out-{name}-", dir=self.scratch_root))
+        slot = self.placement.acquire() if self.placement else None
+        try:
+            gen.compression = ace_storage.check_codec(spec.get("compression"))
+            endf_file = await self._endf(spec["sha256"], spec["endf"])
+            Logger.info(f"Worker {self.name}: running {name}")
+            start = time.time()
+            gen.cpu_affinity = slot.cpus if slot else None
+            work_dir = scratch_space.job_dir(name, scratch_space.scratch_root(self.scratch_dir, slot.node if slot else 0))
+            ace_file = await gen.run_njoy_file_async(
+                str(Config.BASE_DIR), endf_file, name, spec["temperatures"], spec["ace"], spec["input"],
+                self.njoy_exec, str(out_dir), work_dir=work_dir,
+            )
+            report = {"elapsed": time.time() - start, "peak_rss_mb": gen.peak_rss_mb}
+            await self._send(
+                {"op": "result", "id": job_id, "report": report},
+                {"ace": Path(ace_file), "xsdir": out_dir / f"{name}.xsdir"},
+            )
+            self.completed += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            Logger.error(f"Worker {self.name}: {name} failed: {e}")
+            try:
+                await self._send({"op": "failed", "id": job_id, "error": str(e),
+                                  "reason": getattr(e, "reason", "error")})
+            except (ConnectionError, OSError):
+                return
+        finally:
+            if slot is not None:
+                self.placement.release(slot)
+            shutil.rmtree(out_dir, ignore_errors=True)
+            self.running.pop(job_id, None)
+
+        try:
+            await self._send({"op": "ready"})
+        except (ConnectionError, OSError):
+            pass
+
+# --- Entry Point ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run NJOY jobs for a GenNJOY coordinator (run_neutron_processing.py --listen).")
+    parser.add_argument("--connect", required=True, help="Coordinator address, HOST:PORT")
+    parser.add_argument("--slots", type=int, default=os.cpu_count() or 1,
+                        help="NJOY processes to run at once (Default: all CPUs)")
+    parser.add_argument("--njoy", default=shutil.which("njoy") or "njoy", help="NJOY executable")
+    parser.add_argument("--scratch-dir", default=None,
+                        help=f"Root for NJOY scratch directories and shipped ENDF files (Default: {scratch_space.Config.SCRATCH_ROOT})")
+    parser.add_argument("--no-cache", action="store_true", help="Do not use a node-local PENDF tape cache")
+    parser.add_argument("--pin", choices=cpu_placement.MODES, default=None,
+                        help="Pin each NJOY run to one core, or to the cores of one NUMA node")
+    parser.add_argument("--name", default=None, help="Worker name shown by the coordinator (Default: host:pid)")
+    parser.add_argument("--retry", type=float, default=60,
+                        help="Seconds to keep retrying while the coordinator is not up yet")
+    args = parser.parse_args()
+
+    host, port = parse_address(args.connect)
+    worker = Worker(host, port, args.slots, args.njoy,
+                    scratch_dir=Path(args.scratch_dir) if args.scratch_dir else None,
+                    use_cache=not args.no_cache, name=args.name, placement=args.pin)
+    try:
+        asyncio.run(worker.run(args.retry))
+    except OSError as e:
+        Logger.error(f"Could not reach the coordinator at {args.connect}: {e}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pass
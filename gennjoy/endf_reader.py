@@ -0,0 +1,198 @@
+import re
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# ENDF writes floats without the 'E' (e.g. 1.001000+3); restore it before parsing.
+_EXPONENT = re.compile(r"(?<=[0-9.])([+-])(?=\d)")
+
+
+def endf_float(field: str) -> float:
+    field = field.strip()
+    if not field:
+        return 0.0
+    return float(_EXPONENT.sub(r"e\1", field))
+
+
+def endf_int(field: str) -> int:
+    field = field.strip()
+    return int(field) if field else 0
+
+
+def line_id(line: str) -> Tuple[int, int, int]:
+    """Return (MAT, MF, MT) from columns 67-75 of an ENDF line."""
+    try:
+        return int(line[66:70]), int(line[70:72]), int(line[72:75])
+    except ValueError:
+        return 0, 0, 0
+
+
+def read_section(file_path, mf: int, mt: int) -> List[str]:
+    """
+    Return the lines of one MF/MT section. Sections are ordered by MF, so the
+    scan stops as soon as it has moved past the requested file.
+    """
+    lines = []
+    with open(file_path, "r", errors="ignore") as f:
+        for line in f:
+            _, line_mf, line_mt = line_id(line)
+            if line_mf == mf and line_mt == mt:
+                lines.append(line)
+            elif line_mf > mf and lines:
+                break
+    return lines
+
+
+class _RecordReader:
+    """Sequential reader for CONT / LIST / TAB1 records of one section."""
+
+    def __init__(self, lines: List[str]):
+        self.lines = lines
+        self.pos = 0
+
+    def cont(self):
+        line = self.lines[self.pos]
+        self.pos += 1
+        return (endf_float(line[0:11]), endf_float(line[11:22]),
+                endf_int(line[22:33]), endf_int(line[33:44]),
+                endf_int(line[44:55]), endf_int(line[55:66]))
+
+    def _skip_values(self, count: int):
+        self.pos += (count + 5) // 6
+
+    def list(self):
+        items = self.cont()
+        self._skip_values(items[4])
+        return items
+
+    def list_values(self):
+        """LIST record with its values: (items, [B(1), ..., B(NPL)])."""
+        items = self.cont()
+        values = []
+        while len(values) < items[4]:
+            line = self.lines[self.pos]
+            self.pos += 1
+            values.extend(endf_float(line[i:i + 11]) for i in range(0, 66, 11))
+        return items, values[:items[4]]
+
+    def tab1(self):
+        items = self.cont()
+        self._skip_values(2 * items[4])
+        self._skip_values(2 * items[5])
+        return items
+
+
+# NLIB codes of MF1/MT451 (ENDF-6 formats manual, table 1)
+_LIBRARIES = {
+    0: "ENDF/B", 1: "ENDF/A", 2: "JEFF", 3: "EFF", 4: "ENDF/B High Energy", 5: "CENDL",
+    6: "JENDL", 17: "TENDL", 18: "ROSFOND", 21: "SG-21", 31: "INDL/V", 32: "INDL/A",
+    33: "FENDL", 34: "IRDF", 35: "BROND", 36: "INGDB-90", 37: "FENDL/A", 41: "BROND",
+}
+
+
+def read_header(file_path) -> Dict:
+    """
+    Material identification from MF1/MT451: MAT number, ZSYMAM (columns 1-11
+    of the first description line), library label (e.g. 'ENDF/B-7.1') and
+    isomeric state of the target.
+    """
+    reader = _RecordReader(read_section(file_path, 1, 451))
+    if len(reader.lines) < 5:
+        raise ValueError(f"No MF1/MT451 header in {file_path}")
+
+    mat = line_id(reader.lines[0])[0]
+    nlib = reader.cont()[4]
+    liso = reader.cont()[3]
+    _, _, lrel, _, _, nver = reader.cont()
+    reader.cont()
+    zsymam = reader.lines[reader.pos][0:11]
+
+    return {
+        "mat": mat,
+        "zsymam": zsymam,
+        "library": f"{_LIBRARIES.get(nlib, 'Unknown')}-{nver}.{lrel}",
+        "isomeric_state": liso,
+    }
+
+
+def read_thermal_parameters(file_path) -> Dict:
+    """
+    Inputs of thermr/acer taken from a thermal scattering evaluation: elastic
+    data present (MF7/MT2) and its type (LTHR - 1), the upper energy of the
+    inelastic data and the number of principal atoms (B(4) and B(6) of MF7/MT4).
+    """
+    elastic = read_section(file_path, 7, 2)
+    elastic_type = _RecordReader(elastic).cont()[2] - 1 if elastic else 0
+
+    reader = _RecordReader(read_section(file_path, 7, 4))
+    reader.cont()
+    _, values = reader.list_values()
+
+    return {
+        "elastic": bool(elastic),
+        "elastic_type": elastic_type,
+        "energy_max": values[3],
+        "natom": int(values[5]),
+    }
+
+
+def read_resonance_counts(file_path) -> Dict[str, int]:
+    """
+    Count resolved resonances and unresolved parameter sets in MF2/MT151.
+
+    Resolved counts are the number of resonances (NRS) summed over all
+    l-values / spin groups; unresolved counts are the number of energy-point
+    parameter sets. Representations that are not recognised stop the scan and
+    return what was counted so far.
+    """
+    counts = {"resolved": 0, "unresolved": 0}
+    if not Path(file_path).exists():
+        return counts
+
+    reader = _RecordReader(read_section(file_path, 2, 151))
+    if not reader.lines:
+        return counts
+
+    try:
+        nis = reader.cont()[4]
+        for _ in range(nis):
+            lfw, ner = reader.cont()[3:5]
+            for _ in range(ner):
+                _, _, lru, lrf, nro, _ = reader.cont()
+                if nro != 0 and lru != 0:
+                    reader.tab1()
+
+                if lru == 0:
+                    reader.cont()
+                elif lru == 1 and lrf in (1, 2, 3):
+                    nls = reader.cont()[4]
+                    for _ in range(nls):
+                        counts["resolved"] += reader.list()[5]
+                elif lru == 1 and lrf == 7:
+                    njs = reader.cont()[4]
+                    reader.list()  # particle pairs
+                    for _ in range(njs):
+                        reader.list()  # channel definitions
+                        counts["resolved"] += reader.list()[3]
+                elif lru == 2 and lfw == 0 and lrf == 1:
+                    nls = reader.cont()[4]
+                    for _ in range(nls):
+                        counts["unresolved"] += reader.list()[5]
+                elif lru == 2 and lfw == 1 and lrf == 1:
+                    ne, nls = reader.list()[4:6]
+                    for _ in range(nls):
+                        njs = reader.cont()[4]
+                        for _ in range(njs):
+                            reader.list()
+                            counts["unresolved"] += ne
+                elif lru == 2 and lrf == 2:
+                    nls = reader.cont()[4]
+                    for _ in range(nls):
+                        njs = reader.cont()[4]
+                        for _ in range(njs):
+                            counts["unresolved"] += reader.list()[5]
+                else:
+                    return counts
+    except (IndexError, ValueError):
+        pass
+
+    return counts
@@ -22,16 +22,19 @@ class Config:
     # --- LIBRARY DATABASE (DIRECT LINKS) ---
     LIBRARIES = {
         "1": {
+            "release": "VIII.1",
             "name": "ENDF/B-VIII.1 (Latest Standard - 2024) [.tar.gz]",
             "n_url": "https://www.nndc.bnl.gov/endf-releases/releases/B-VIII.1/neutrons/neutrons-version.VIII.1.tar.gz",
             "t_url": "https://www.nndc.bnl.gov/endf-releases/releases/B-VIII.1/thermal_scatt/thermal_scatt-version.VIII.1.tar.gz"
         },
         "2": {
+            "release": "VIII.0",
             "name": "ENDF/B-VIII.0 (Stable Standard - 2018) [.zip]",
             "n_url": "https://www.nndc.bnl.gov/endf-b8.0/zips/ENDF-B-VIII.0_neutrons.zip",
             "t_url": "https://www.nndc.bnl.gov/endf-b8.0/zips/ENDF-B-VIII.0_thermal_scatt.zip"
         },
         "3": {
+            "release": "VII.1",
             "name": "ENDF/B-VII.1 (Legacy Standard - 2011) [.zip]",
             "n_url": "https://www.nndc.bnl.gov/endf-b7.1/zips/ENDF-B-VII.1-neutrons.zip",
             "t_url": "https://www.nndc.bnl.gov/endf-b7.1/zips/ENDF-B-VII.1-thermal_scatt.zip"
@@ -76,12 +79,12 @@ def select_library():
         print(f"{Fore.RED}Invalid selection. Defaulting to ENDF/B-VIII.1{Style.RESET_ALL}")
         return Config.LIBRARIES["1"]['n_url'], Config.LIBRARIES["1"]['t_url']
 
-def download_file(url):
+def download_file(url, data_dir=None):
     """Downloads file if not exists, returns local path."""
     if not url: return None
     
     filename = url.split('/')[-1]
-    local_path = Config.DATA_DIR / filename
+    local_path = Path(data_dir or Config.DATA_DIR) / filename
     
     if local_path.exists():
         print(f"{Fore.YELLOW}[CACHE] File '{filename}' already exists. Skipping download.{Style.RESET_ALL}")
@@ -98,11 +101,12 @@ def download_file(url):
         print(f"{Fore.RED}[ERROR] Download failed: {e}{Style.RESET_ALL}")
         return None
 
-def extract_and_organize(archive_path, target_folder_name):
-    """Extracts, organizes, AND CLEANS UP."""
+def extract_and_organize(archive_path, target_folder_name, data_dir=None):
+    """Extracts, organizes, AND CLEANS UP (into data_dir, default: data/)."""
     if not archive_path: return
 
-    final_path = Config.DATA_DIR / target_folder_name
+    data_dir = Path(data_dir or Config.DATA_DIR)
+    final_path = data_dir / target_folder_name
     
     # 1. Clean existing target
     if final_path.exists() and any(final_path.iterdir()):
@@ -113,7 +117,7 @@ def extract_and_organize(archive_path, target_folder_name):
 
     # 2. Extract to temp
     print(f"{Fore.BLUE}[EXTRACTING] Processing archive...{Style.RESET_ALL}")
-    temp_extract_dir = Config.DATA_DIR / "temp_extract"
+    temp_extract_dir = data_dir / "temp_extract"
     if temp_extract_dir.exists(): shutil.rmtree(temp_extract_dir)
     temp_extract_dir.mkdir()
 
@@ -145,7 +149,7 @@ def extract_and_organize(archive_path, target_folder_name):
             else:
                 found_dir = temp_extract_dir
 
-        print(f"{Fore.BLUE}[INSTALLING] Moving '{found_dir.name}' to data/{target_folder_name}...{Style.RESET_ALL}")
+        print(f"{Fore.BLUE}[INSTALLING] Moving '{found_dir.name}' to {final_path}...{Style.RESET_ALL}")
         shutil.move(str(found_dir), str(final_path))
         
         # 4. CLEANUP (Temp folder + Original Archive)
@@ -38,6 +38,21 @@ def get_short_name(filename):
     # Fallback
     return Path(filename).stem
 
+def list_endf_files(directory):
+    """Incident neutron ENDF files of a directory, sorted by name."""
+    return sorted(
+        f for f in Path(directory).iterdir()
+        if f.is_file() and (f.name.startswith("n-") or f.suffix == ".endf")
+    )
+
+def inventory_entry(fname, temps_str):
+    """One batch line, e.g. 'element_n = n-001_H_001.endf   name = H1   temperatures = 293.6 600.0'."""
+    return (
+        f"element_n = {fname.ljust(25)} "
+        f"name = {get_short_name(fname).ljust(8)} "
+        f"temperatures = {temps_str}\n"
+    )
+
 def get_user_temperatures():
     """Prompts user for temperatures."""
     print("-" * 50)
@@ -91,10 +106,7 @@ def main():
     # 4. Scan Files
     print(f"\n{Fore.YELLOW}Scanning directory...{Style.RESET_ALL}")
     try:
-        files = sorted([
-            f for f in Config.NEUTRON_DIR.iterdir() 
-            if f.is_file() and (f.name.startswith("n-") or f.suffix == ".endf")
-        ])
+        files = list_endf_files(Config.NEUTRON_DIR)
     except Exception as e:
         print(f"{Fore.RED}[ERROR] Failed to scan directory: {e}")
         sys.exit(1)
@@ -111,17 +123,7 @@ def main():
         count = 0
         with open(target_file, 'w') as f:
             for n_file in files:
-                fname = n_file.name
-                short_name = get_short_name(fname)
-                
-                # Exact format requested:
-                # element_n = n-001_H_001.endf          name = H1       temperatures = 293.6 600.0
-                entry = (
-                    f"element_n = {fname.ljust(25)} "
-                    f"name = {short_name.ljust(8)} "
-                    f"temperatures = {temps_str}\n"
-                )
-                f.write(entry)
+                f.write(inventory_entry(n_file.name, temps_str))
                 count += 1
                 
                 if count % 50 == 0:
@@ -0,0 +1,231 @@
+import json
+import time
+import heapq
+import signal
+import asyncio
+import contextlib
+from pathlib import Path
+from typing import AsyncContextManager, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+class RetryJob(Exception):
+    """Raised by a handler to run its job again after `delay` seconds, without holding a slot meanwhile."""
+    def __init__(self, delay: float):
+        super().__init__(f"retry in {delay:.0f} s")
+        self.delay = delay
+
+
+class DependencyFailed(RuntimeError):
+    """A job was skipped because a job it depends on failed."""
+    reason = "dependency"
+
+
+class RetryPolicy:
+    """
+    Time limits and bounded retries of NJOY runs.
+
+    A run gets `job_timeout` seconds if set (0 disables it), otherwise
+    TIMEOUT_FACTOR times its predicted duration but at least MIN_TIMEOUT;
+    the limit doubles with every retry in case the prediction was short.
+    A failed run is retried up to `retries` times, after backoff * 2**n s.
+    """
+    TIMEOUT_FACTOR = 10.0
+    MIN_TIMEOUT = 1800.0
+
+    def __init__(self, retries: int = 2, backoff: float = 30.0, job_timeout: Optional[float] = None,
+                 stall_timeout: Optional[float] = 3600.0):
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.job_timeout = job_timeout
+        self.stall_timeout = stall_timeout or None
+
+    def time_limit(self, predicted_seconds: float, attempt: int = 0) -> Optional[float]:
+        if self.job_timeout is not None:
+            base = self.job_timeout
+        else:
+            base = max(self.MIN_TIMEOUT, self.TIMEOUT_FACTOR * (predicted_seconds or 0.0))
+        return base * 2 ** attempt if base else None
+
+    def delay(self, attempt: int) -> Optional[float]:
+        """Backoff before retry number `attempt` (1-based), or None once retries are used up."""
+        if attempt > self.retries:
+            return None
+        return self.backoff * 2 ** (attempt - 1)
+
+
+class FailureReport:
+    """Retried and finally failed runs of a batch, written as JSON for automation."""
+
+    def __init__(self, kind: str, batch):
+        self.kind = kind
+        self.batch = str(batch)
+        self.started = time.time()
+        self.retried: List[Dict] = []
+        self.failed: List[Dict] = []
+
+    @staticmethod
+    def _entry(run: str, attempt: int, error: BaseException) -> Dict:
+        message = str(error)
+        return {
+            "run": run,
+            "attempt": attempt,
+            "reason": getattr(error, "reason", "error"),
+            "error": message.splitlines()[0] if message else type(error).__name__,
+            "detail": message,
+        }
+
+    def retry(self, run: str, attempt: int, error: BaseException):
+        self.retried.append(self._entry(run, attempt, error))
+
+    def fail(self, run: str, attempt: int, error: BaseException):
+        self.failed.append(self._entry(run, attempt, error))
+
+    def write(self, path) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        report = {
+            "kind": self.kind,
+            "batch": self.batch,
+            "started": self.started,
+            "finished": time.time(),
+            "failed": self.failed,
+            "retried": self.retried,
+        }
+        tmp = path.with_name(f".{path.name}.tmp")
+        tmp.write_text(json.dumps(report, indent=2) + "\n")
+        tmp.replace(path)
+        return path
+
+
+def order_largest_first(jobs: Sequence, costs: Sequence[float]) -> List:
+    """Return jobs sorted by decreasing cost (stable for equal costs)."""
+    ranked: List[Tuple[float, int]] = sorted(
+        ((cost, i) for i, cost in enumerate(costs)), key=lambda item: (-item[0], item[1])
+    )
+    return [jobs[i] for _, i in ranked]
+
+
+def critical_path_costs(costs: Sequence[float], depends: Dict[int, Sequence[int]]) -> List[float]:
+    """
+    Cost of each job plus its most expensive chain of dependents
+    (depends: {job: [jobs it waits for]}). Ordering by it starts the
+    prerequisites of long chains early.
+    """
+    dependents: Dict[int, List[int]] = {}
+    for job, prerequisites in depends.items():
+        for prerequisite in prerequisites:
+            dependents.setdefault(prerequisite, []).append(job)
+
+    ranks: Dict[int, float] = {}
+
+    def rank(i):
+        if i not in ranks:
+            ranks[i] = costs[i] + max((rank(d) for d in dependents.get(i, ())), default=0.0)
+        return ranks[i]
+
+    return [rank(i) for i in range(len(costs))]
+
+
+def simulate_makespan(durations: Sequence[float], num_workers: int) -> float:
+    """
+    Wall time of running the durations, in the given order, on a dynamic queue
+    with num_workers slots (each job goes to the first slot to become free).
+    """
+    slots = [0.0] * max(1, num_workers)
+    for duration in durations:
+        heapq.heapreplace(slots, slots[0] + duration)
+    return max(slots)
+
+
+async def _drive(jobs: Sequence, handler: Callable[..., Awaitable], limit: int,
+                 context: Optional[AsyncContextManager] = None, governor=None,
+                 demands: Optional[Sequence[float]] = None,
+                 depends: Optional[Dict[int, Sequence[int]]] = None) -> List[Tuple[object, object]]:
+    async with contextlib.AsyncExitStack() as stack:
+        for manager in (context, governor):
+            if manager is not None:
+                await stack.enter_async_context(manager)
+        return await _drive_jobs(jobs, handler, limit, governor, demands, depends)
+
+
+async def _drive_jobs(jobs: Sequence, handler: Callable[..., Awaitable], limit: int, governor=None,
+                      demands: Optional[Sequence[float]] = None,
+                      depends: Optional[Dict[int, Sequence[int]]] = None) -> List[Tuple[object, object]]:
+    loop = asyncio.get_running_loop()
+    main = asyncio.current_task()
+    try:
+        loop.add_signal_handler(signal.SIGTERM, main.cancel)
+    except (NotImplementedError, RuntimeError):
+        pass  # Not supported on this platform / thread
+
+    slots = asyncio.Semaphore(limit)
+    finished_jobs = [asyncio.Event() for _ in jobs]
+
+    def admission(i):
+        if governor is None:
+            return slots
+        return governor.slot(demands[i] if demands else 0.0)
+
+    async def run_one(i, job):
+        # Wait for prerequisites without holding a slot; the job then queues behind those already waiting
+        for prerequisite in (depends or {}).get(i, ()):
+            await finished_jobs[prerequisite].wait()
+        try:
+            while True:
+                try:
+                    async with admission(i):
+                        return job, await handler(job)
+                except RetryJob as retry:
+                    # Back off outside the slot so that other jobs keep running
+                    await asyncio.sleep(retry.delay)
+        finally:
+            finished_jobs[i].set()
+
+    # Semaphore (and governor) waiters are served first-come first-served, so jobs start in list order
+    tasks = [asyncio.ensure_future(run_one(i, job)) for i, job in enumerate(jobs)]
+    results = []
+    try:
+        for finished in asyncio.as_completed(tasks):
+            results.append(await finished)
+    finally:
+        # On error or cancellation, cancel what is still running (handlers kill their NJOY)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        try:
+            loop.remove_signal_handler(signal.SIGTERM)
+        except (NotImplementedError, RuntimeError):
+            pass
+    return results
+
+
+def run_async_queue(jobs: Sequence, handler: Callable[..., Awaitable], limit: int,
+                    context: Optional[AsyncContextManager] = None, governor=None,
+                    demands: Optional[Sequence[float]] = None,
+                    depends: Optional[Dict[int, Sequence[int]]] = None) -> List[Tuple[object, object]]:
+    """
+    Run the coroutine `handler(job)` for every job from a single event loop,
+    with at most `limit` running at once. Jobs start in the given order as
+    slots free up; (job, result) pairs are returned in completion order.
+    `context` (an async context manager, e.g. a job server) is entered in the
+    event loop before the first job and exited after the last.
+
+    With a governor (resource_governor.ResourceGovernor), jobs are admitted by
+    it instead of the fixed limit; demands[i] is the predicted peak memory (MB)
+    of jobs[i].
+
+    depends[i] lists the indices of jobs that must finish before jobs[i]
+    starts; whether they succeeded is for the handler to check.
+
+    A handler raising RetryJob(delay) gives up its slot and queues its job
+    again after the delay.
+
+    Ctrl-C or SIGTERM cancels the running handlers and raises KeyboardInterrupt.
+    """
+    if not jobs:
+        return []
+    limit = max(1, min(limit, len(jobs)))
+    try:
+        return asyncio.run(_drive(jobs, handler, limit, context, governor, demands, depends))
+    except asyncio.CancelledError:
+        raise KeyboardInterrupt
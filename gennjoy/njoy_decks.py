@@ -0,0 +1,271 @@
+import shutil
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+try:
+    import endf_reader
+except ImportError:
+    from gennjoy import endf_reader
+
+# Module templates, laid out as openmc.data.njoy writes them so that decks
+# (and therefore ACE files) are identical to the ones make_ace produced.
+# acer's output type (card 2) is ACE_ASCII, as make_ace writes, or ACE_BINARY.
+ACE_ASCII = 1
+ACE_BINARY = 2
+_TEMPLATE_RECONR = """
+reconr / %%%%%%%%%%%%%%%%%%% Reconstruct XS for neutrons %%%%%%%%%%%%%%%%%%%%%%%
+{nendf} {npendf}
+'{library} PENDF for {zsymam}'/
+{mat} 2/
+{error}/ err
+'{library}: {zsymam}'/
+'Processed by NJOY'/
+0/
+"""
+
+_TEMPLATE_BROADR = """
+broadr / %%%%%%%%%%%%%%%%%%%%%%% Doppler broaden XS %%%%%%%%%%%%%%%%%%%%%%%%%%%%
+{nendf} {npendf} {nbroadr}
+{mat} {num_temp} 0 0 0. /
+{error}/ errthn
+{temps}
+0/
+"""
+
+_TEMPLATE_HEATR_LOCAL = """
+heatr / %%%%%%%%%%%%%%%%% Add heating kerma (local photons) %%%%%%%%%%%%%%%%%%%%
+{nendf} {nheatr_in} {nheatr_local} /
+{mat} 4 0 0 1 /
+302 318 402 444 /
+"""
+
+_TEMPLATE_HEATR = """
+heatr / %%%%%%%%%%%%%%%%%%%%%%%%% Add heating kerma %%%%%%%%%%%%%%%%%%%%%%%%%%%%
+{nendf} {nheatr_in} {nheatr} /
+{mat} 4 0 0 0 /
+302 318 402 444 /
+"""
+
+_TEMPLATE_GASPR = """
+gaspr / %%%%%%%%%%%%%%%%%%%%%%%%% Add gas production %%%%%%%%%%%%%%%%%%%%%%%%%%%
+{nendf} {ngaspr_in} {ngaspr} /
+"""
+
+_TEMPLATE_PURR = """
+purr / %%%%%%%%%%%%%%%%%%%%%%%% Add probability tables %%%%%%%%%%%%%%%%%%%%%%%%%
+{nendf} {npurr_in} {npurr} /
+{mat} {num_temp} 1 20 64 /
+{temps}
+1.e10
+0/
+"""
+
+_TEMPLATE_ACER = """
+acer / %%%%%%%%%%%%%%%%%%%%%%%% Write out in ACE format %%%%%%%%%%%%%%%%%%%%%%%%
+{nendf} {nacer_in} 0 {nace} {ndir}
+1 0 {ace_type} .{ext} /
+'{library}: {zsymam} at {temperature}'/
+{mat} {temperature}
+1 1 1/
+/
+"""
+
+_TEMPLATE_THERMR = """
+thermr / %%%%%%%%%%%%%%%% Add thermal scattering data (free gas) %%%%%%%%%%%%%%%
+0 {nthermr1_in} {nthermr1}
+0 {mat} 12 {num_temp} 1 0 0 1 221 1/
+{temps}
+{error} {energy_max}
+thermr / %%%%%%%%%%%%%%%% Add thermal scattering data (bound) %%%%%%%%%%%%%%%%%%
+{nthermal_endf} {nthermr2_in} {nthermr2}
+{mat_thermal} {mat} 16 {num_temp} 2 {elastic} 0 {natom} 222 1/
+{temps}
+{error} {energy_max}
+"""
+
+_TEMPLATE_THERMAL_ACER = """
+acer / %%%%%%%%%%%%%%%%%%%%%%%% Write out in ACE format %%%%%%%%%%%%%%%%%%%%%%%%
+{nendf} {nacer_in} 0 {nace} {ndir}
+2 0 {ace_type} .{ext}/
+'{library}: {zsymam_thermal} processed by NJOY'/
+{mat} {temperature} '{table_name}' {nza} /
+{zaids} /
+222 64 {mt_elastic} {elastic_type} {nmix} {energy_max} {iwt}/
+"""
+
+
+class NJOYDeck:
+    """
+    An NJOY input deck, kept as its module inputs so that the reconr/broadr
+    stage can be run (or skipped) on its own, together with the tapes it
+    reads and the ACE/xsdir tapes written by each acer run.
+
+    pendf_unit / broadr_unit are the tapes written by reconr and broadr; the
+    remaining modules only read them, so a cached tape staged under that unit
+    replaces the module.
+    """
+
+    def __init__(self, modules: List[Tuple[str, str]], tapein: Dict[int, Path], acer_tapes: List[tuple],
+                 pendf_unit: int, broadr_unit: int, error: float, temperatures: Sequence[float],
+                 isomeric_state: int = 0):
+        self.modules = modules
+        self.tapein = tapein
+        self.acer_tapes = acer_tapes
+        self.pendf_unit = pendf_unit
+        self.broadr_unit = broadr_unit
+        self.error = error
+        self.temperatures = list(temperatures)
+        self.isomeric_state = isomeric_state
+
+    @property
+    def commands(self) -> str:
+        """The complete deck."""
+        return self.select(name for name, _ in self.modules)
+
+    def select(self, names) -> str:
+        """Deck made of the named modules only (in deck order)."""
+        names = set(names)
+        return "".join(text for name, text in self.modules if name in names) + "stop\n"
+
+    def without(self, names) -> str:
+        """Deck without the named modules."""
+        names = set(names)
+        return self.select(name for name, _ in self.modules if name not in names)
+
+    @property
+    def neutron_endf(self) -> Path:
+        """Incident neutron evaluation processed by reconr/broadr."""
+        return self.tapein[20]
+
+    def stage(self, work_dir: Path):
+        """Copy the input evaluations to tapeNN in the run directory."""
+        for unit, src in self.tapein.items():
+            shutil.copyfile(src, work_dir / f"tape{unit}")
+
+    def collect(self, work_dir: Path, ace_file: Path, xsdir_file: Path):
+        """
+        Concatenate the per-temperature ACE and xsdir tapes, in temperature order.
+        Binary tables fill whole records, so both types are joined byte for byte.
+        """
+        with open(ace_file, "wb") as ace_out, open(xsdir_file, "w") as xsdir_out:
+            for nace, ndir in self.acer_tapes:
+                data = (work_dir / f"tape{nace}").read_bytes()
+                # Metastable targets: NJOY writes the ground-state ZAID, add 400 to the mass
+                # (the ZAID opens the header of either type)
+                if self.isomeric_state > 0 and int(data[3:4]) <= 2:
+                    data = data[:3] + str(int(data[3:4]) + 4).encode() + data[4:]
+                ace_out.write(data)
+                xsdir_out.write((work_dir / f"tape{ndir}").read_text())
+
+
+def _temps(temperatures: Sequence[float]) -> str:
+    return " ".join(str(t) for t in temperatures)
+
+
+def neutron_deck(endf_file: Path, temperatures: Sequence[float], error: float,
+                 ace_type: int = ACE_ASCII) -> NJOYDeck:
+    """reconr, broadr, heatr (local and full), gaspr, purr and one acer per temperature."""
+    header = endf_reader.read_header(endf_file)
+    fields = dict(
+        header,
+        error=error,
+        ace_type=ace_type,
+        num_temp=len(temperatures),
+        temps=_temps(temperatures),
+        nendf=20,
+        npendf=21,
+        nbroadr=22,
+        nheatr_in=22,
+        nheatr_local=23,
+        nheatr=24,
+        ngaspr_in=24,
+        ngaspr=25,
+        npurr_in=25,
+        npurr=26,
+        nacer_in=26,
+    )
+    modules = [
+        ("reconr", _TEMPLATE_RECONR.format(**fields)),
+        ("broadr", _TEMPLATE_BROADR.format(**fields)),
+        ("heatr", _TEMPLATE_HEATR_LOCAL.format(**fields)),
+        ("heatr", _TEMPLATE_HEATR.format(**fields)),
+        ("gaspr", _TEMPLATE_GASPR.format(**fields)),
+        ("purr", _TEMPLATE_PURR.format(**fields)),
+    ]
+
+    acer_tapes = []
+    for i, temperature in enumerate(temperatures):
+        nace = fields["nacer_in"] + 1 + 2 * i
+        modules.append(("acer", _TEMPLATE_ACER.format(
+            **fields, nace=nace, ndir=nace + 1, ext=f"{i + 1:02}", temperature=temperature
+        )))
+        acer_tapes.append((nace, nace + 1))
+
+    return NJOYDeck(modules, {20: Path(endf_file)}, acer_tapes, fields["npendf"], fields["nbroadr"],
+                    error, temperatures, header["isomeric_state"])
+
+
+def thermal_table(endf_file_t: Path, mat_thermal: int):
+    """
+    ACE table name, ZAIDs and number of mixed moderators that openmc assigns to
+    a thermal scattering evaluation (its table of known materials).
+    """
+    import openmc.data
+    from openmc.data.njoy import _get_thermal_data
+    data = _get_thermal_data(openmc.data.endf.Evaluation(str(endf_file_t)), mat_thermal)
+    return data.name, list(data.zaids), data.nmix
+
+
+def thermal_deck(endf_file_n: Path, endf_file_t: Path, temperatures: Sequence[float],
+                 error: float, iwt: int, ace_type: int = ACE_ASCII) -> NJOYDeck:
+    """reconr and broadr of the partner nuclide, thermr (free gas, bound) and acer per temperature."""
+    header = endf_reader.read_header(endf_file_n)
+    header_t = endf_reader.read_header(endf_file_t)
+    thermal = endf_reader.read_thermal_parameters(endf_file_t)
+    table_name, zaids, nmix = thermal_table(endf_file_t, header_t["mat"])
+
+    fields = dict(
+        header,
+        library=header_t["library"],
+        error=error,
+        ace_type=ace_type,
+        iwt=iwt,
+        num_temp=len(temperatures),
+        temps=_temps(temperatures),
+        mat_thermal=header_t["mat"],
+        zsymam_thermal=header_t["zsymam"].strip(),
+        table_name=table_name,
+        nza=len(zaids),
+        zaids=" ".join(str(z) for z in zaids[:3]),
+        nmix=nmix,
+        elastic=int(thermal["elastic"]),
+        elastic_type=thermal["elastic_type"],
+        mt_elastic=223 if thermal["elastic"] else 0,
+        energy_max=thermal["energy_max"],
+        natom=thermal["natom"],
+        nendf=20,
+        nthermal_endf=21,
+        npendf=22,
+        nbroadr=23,
+        nthermr1_in=23,
+        nthermr1=24,
+        nthermr2_in=24,
+        nthermr2=25,
+        nacer_in=25,
+    )
+    modules = [
+        ("reconr", _TEMPLATE_RECONR.format(**fields)),
+        ("broadr", _TEMPLATE_BROADR.format(**fields)),
+        ("thermr", _TEMPLATE_THERMR.format(**fields)),
+    ]
+
+    acer_tapes = []
+    for i, temperature in enumerate(temperatures):
+        nace = fields["nacer_in"] + 1 + 2 * i
+        modules.append(("acer", _TEMPLATE_THERMAL_ACER.format(
+            **fields, nace=nace, ndir=nace + 1, ext=f"{i + 1:02}", temperature=temperature
+        )))
+        acer_tapes.append((nace, nace + 1))
+
+    return NJOYDeck(modules, {20: Path(endf_file_n), 21: Path(endf_file_t)}, acer_tapes,
+                    fields["npendf"], fields["nbroadr"], error, temperatures)
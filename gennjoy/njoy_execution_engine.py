@@ -1,10 +1,34 @@
 import os
+import re
+import sys
 import shutil
 import time
+import asyncio
 from pathlib import Path
-import openmc.data.njoy
 from colorama import Fore, Style, init
 
+# Ensure local modules can be imported when running as a script
+current_dir = Path(__file__).resolve().parent
+if str(current_dir) not in sys.path:
+    sys.path.append(str(current_dir))
+
+try:
+    import njoy_decks
+    import scratch_space
+    import cpu_placement
+    import xsdir
+    import ace_index
+    import ace_binary
+    import ace_storage
+except ImportError:
+    from gennjoy import njoy_decks
+    from gennjoy import scratch_space
+    from gennjoy import cpu_placement
+    from gennjoy import xsdir
+    from gennjoy import ace_index
+    from gennjoy import ace_binary
+    from gennjoy import ace_storage
+
 # Initialize terminal color conversion
 init(autoreset=True)
 
@@ -87,12 +111,58 @@ class InputGenerator:
             fic.write(line)
 
 
+class NJOYTimeout(RuntimeError):
+    """NJOY was killed for exceeding its time limit ("timeout") or for writing nothing ("stalled")."""
+    def __init__(self, message, reason):
+        super().__init__(message)
+        self.reason = reason
+
+
+class NJOYNotStarted(OSError):
+    """The NJOY executable is missing or not executable: retrying cannot help."""
+
+
+def _log_tail(work_dir, lines=10):
+    """Last lines of a run's njoy.log, prefixed with a newline (empty without output)."""
+    log_path = Path(work_dir) / "njoy.log"
+    if not log_path.exists():
+        return ""
+    tail = log_path.read_text(errors="ignore").splitlines()[-lines:]
+    return "".join(f"\n{line}" for line in tail)
+
+
+def _renumber_zaid(line, suffix):
+    """Replace the table suffix of the ZAID starting `line` (1001.01c -> 1001{suffix})."""
+    parts = line.split()
+    if not parts:
+        return line
+    zaid = parts[0]
+    return line.replace(zaid, zaid.rsplit(".", 1)[0] + suffix, 1)
+
+
 class ACEGenerator:
     """
     Class responsible for running NJOY and managing files (Professional Edition).
     """
+    # NJOY tolerances/weighting used by run_njoy and run_njoy_tsl
+    # (written into the decks built by njoy_decks)
+    NEUTRON_ERROR = 0.001
+    TSL_ERROR = 0.01
+    TSL_IWT = 2
+
     def __init__(self, filename):
         self.filename = filename
+        self.peak_rss_mb = None  # Peak RSS of the last NJOY run (MB)
+        self.io_stats = (0, 0, 0.0)  # Last run: tape bytes, bytes copied out, seconds publishing
+        self.tape_cache = None  # artifact_cache.TapeCache: reuse reconr/broadr tapes across runs
+        self.time_limit = None  # Wall-clock limit of one deck, all stages (s)
+        self.stall_limit = None  # Kill NJOY when its log and tapes do not change for this long (s)
+        self.cpu_affinity = None  # CPUs NJOY is pinned to (cpu_placement.CPUPlacement)
+        self.endf_dirs = {}  # {data-path variable: ENDF directory}, overrides the environment (library workspaces)
+        self.decks_dir = None  # Where input decks are saved (Default: data/njoy_input_decks)
+        self.ace_type = njoy_decks.ACE_ASCII  # ACE output of acer: ACE_ASCII (type 1) or ACE_BINARY (type 2)
+        self.compression = None  # Codec ACE files are stored with (ace_storage), None: uncompressed
+        self.storage = None  # ace_storage.StorageReport of the compressed files written
 
     def search_string_in_file(self, file_path, string_to_search):
         results = []
@@ -108,6 +178,21 @@ class ACEGenerator:
             print(Fore.RED + f"[njoy_execution_engine] Error reading file {file_path}: {e}")
         return results
 
+    def resolve_endf_file(self, base_dir, env_var, element):
+        """
+        Resolve an ENDF file from a data-path environment variable
+        (absolute path, or relative to base_dir), or from self.endf_dirs.
+        Returns None if unset.
+        """
+        endf_data = self.endf_dirs.get(env_var) or os.environ.get(env_var)
+        if not endf_data:
+            return None
+
+        path_from_env = Path(endf_data)
+        if path_from_env.is_absolute():
+            return path_from_env / element
+        return (Path(base_dir) / path_from_env / element).resolve()
+
     def gen_parametre_njoy(self, line_content):
         parts = line_content.replace('=', ' ').split()
         element = None
@@ -140,164 +225,323 @@ class ACEGenerator:
 
         return [element, name, temperatures]
 
-    def run_njoy(self, base_dir, element, name, temperatures, ace_ascii, input_njoy, njoy_exec, output_path):
+    def run_njoy(self, base_dir, element, name, temperatures, ace_ascii, input_njoy, njoy_exec, output_path,
+                 work_dir=None):
+        """Blocking form of run_njoy_async."""
+        return asyncio.run(self.run_njoy_async(
+            base_dir, element, name, temperatures, ace_ascii, input_njoy, njoy_exec, output_path, work_dir
+        ))
+
+    def run_njoy_tsl(self, base_dir, element_n, element_t, name, temperatures, ace_ascii, input_njoy, njoy_exec, output_rel_path,
+                     work_dir=None):
+        """Blocking form of run_njoy_tsl_async."""
+        return asyncio.run(self.run_njoy_tsl_async(
+            base_dir, element_n, element_t, name, temperatures, ace_ascii, input_njoy, njoy_exec, output_rel_path, work_dir
+        ))
+
+    async def run_njoy_async(self, base_dir, element, name, temperatures, ace_ascii, input_njoy, njoy_exec, output_path,
+                             work_dir=None):
         """
-        Executes NJOY using updated directory conventions.
-        base_dir: The root directory of the package/project (contains inputs/, data/).
+        Process an incident neutron evaluation into `output_path/ace_ascii`
+        (plus `{name}.xsdir`). NJOY runs in work_dir (default: a new directory
+        under the scratch root); the input deck is saved to data/njoy_input_decks.
+        Never changes the process cwd.
         """
-        original_cwd = Path.cwd()
         base_path = Path(base_dir)
-        temp_dir = base_path / name  # Temporary directory for NJOY run
-        dest_dir = Path(output_path)
-        
-        dest_dir.mkdir(parents=True, exist_ok=True)
-        
-        endf_data = os.environ.get("OPENMC_ENDF_DATA")
-        if not endf_data:
-            raise EnvironmentError("OPENMC_ENDF_DATA not set")
-        
+
         # Resolve ENDF file path (supports absolute path in env var or relative to base_dir)
-        path_from_env = Path(endf_data)
-        if path_from_env.is_absolute():
-            endf_file = path_from_env / element
-        else:
-            endf_file = (base_path / path_from_env / element).resolve()
+        endf_file = self.resolve_endf_file(base_path, "OPENMC_ENDF_DATA", element)
+        if endf_file is None:
+            raise EnvironmentError("OPENMC_ENDF_DATA not set")
 
         if not endf_file.exists():
             raise FileNotFoundError(f"ENDF file not found: {endf_file}")
 
-        if temp_dir.exists():
-            shutil.rmtree(temp_dir)
-        temp_dir.mkdir()
-
-        try:
-            os.chdir(temp_dir)
-
-            # RUN NJOY
-            openmc.data.njoy.make_ace(
-                str(endf_file),
-                error=0.001,
-                temperatures=temperatures,
-                acer=ace_ascii,
-                input_filename=input_njoy,
-                stdout=False,
-                njoy_exec=njoy_exec,
-            )
-            
-            # MOVE ARTIFACTS (ACE File)
-            src_ace = temp_dir / ace_ascii
-            dst_ace = dest_dir / ace_ascii
-            
-            if src_ace.exists():
-                shutil.move(str(src_ace), str(dst_ace))
-            else:
-                files = list(temp_dir.glob('*'))
-                raise FileNotFoundError(f"ACE file {ace_ascii} not generated. Found: {[f.name for f in files]}")
-
-            # MOVE ARTIFACTS (xsdir)
-            src_xsdir = temp_dir / "xsdir"
-            dst_xsdir = dest_dir / f"{name}.xsdir"
-            if src_xsdir.exists():
-                shutil.move(str(src_xsdir), str(dst_xsdir))
-            
-            # MOVE ARTIFACTS (Input Deck)
-            # Ensure the target directory exists within the package data structure
-            njoy_inputs_dir = base_path / "data" / "njoy_input_decks"
-            njoy_inputs_dir.mkdir(parents=True, exist_ok=True)
-            
-            src_input = temp_dir / input_njoy
-            if src_input.exists():
-                shutil.move(str(src_input), str(njoy_inputs_dir / input_njoy))
-
-            return str(dst_ace)
+        return await self.run_njoy_file_async(base_dir, endf_file, name, temperatures, ace_ascii, input_njoy,
+                                              njoy_exec, output_path, work_dir)
 
-        except Exception as e:
-            raise RuntimeError(f"NJOY failed: {e}")
-            
-        finally:
-            os.chdir(original_cwd)
-            # Cleanup temp dir only if successful (or based on preference)
-            if (dest_dir / ace_ascii).exists():
-                 if temp_dir.exists(): shutil.rmtree(temp_dir)
-            else:
-                 print(Fore.RED + f"   -> Debug: Preserving temp dir {temp_dir} due to failure.")
+    async def run_njoy_file_async(self, base_dir, endf_file, name, temperatures, ace_ascii, input_njoy, njoy_exec,
+                                  output_path, work_dir=None):
+        """run_njoy_async for an ENDF file given by path (e.g. one shipped to a remote worker)."""
+        deck = njoy_decks.neutron_deck(Path(endf_file), temperatures, self.NEUTRON_ERROR, self.ace_type)
+        return await self._execute_deck(deck, Path(base_dir), name, ace_ascii, input_njoy, njoy_exec,
+                                        Path(output_path), work_dir, keep_failed=True)
 
-    def run_njoy_tsl(self, base_dir, element_n, element_t, name, temperatures, ace_ascii, input_njoy, njoy_exec, output_rel_path):
-        original_cwd = Path.cwd()
+    async def run_njoy_tsl_async(self, base_dir, element_n, element_t, name, temperatures, ace_ascii, input_njoy, njoy_exec, output_rel_path,
+                                 work_dir=None):
+        """Thermal scattering counterpart of run_njoy_async."""
         base_path = Path(base_dir)
-        temp_dir = base_path / name
-        dest_dir = Path(output_rel_path)
-        dest_dir.mkdir(parents=True, exist_ok=True)
-
-        endf_data_n = os.environ.get("OPENMC_ENDF_DATA_Neutron")
-        endf_data_t = os.environ.get("OPENMC_ENDF_DATA_Thermal")
-        
-        if not endf_data_n or not endf_data_t:
-             raise EnvironmentError("TSL Environment variables not set.")
 
         # Logic to handle absolute/relative paths for ENDF data
-        if Path(endf_data_n).is_absolute():
-            endf_file_n = Path(endf_data_n) / element_n
-        else:
-            endf_file_n = base_path / endf_data_n / element_n
+        endf_file_n = self.resolve_endf_file(base_path, "OPENMC_ENDF_DATA_Neutron", element_n)
+        endf_file_t = self.resolve_endf_file(base_path, "OPENMC_ENDF_DATA_Thermal", element_t)
 
-        if Path(endf_data_t).is_absolute():
-            endf_file_t = Path(endf_data_t) / element_t
-        else:
-            endf_file_t = base_path / endf_data_t / element_t
+        if endf_file_n is None or endf_file_t is None:
+             raise EnvironmentError("TSL Environment variables not set.")
 
         if not endf_file_n.exists(): raise FileNotFoundError(f"Neutron file missing: {endf_file_n}")
         if not endf_file_t.exists(): raise FileNotFoundError(f"Thermal file missing: {endf_file_t}")
 
-        if temp_dir.exists(): shutil.rmtree(temp_dir)
-        temp_dir.mkdir()
-
         try:
-            os.chdir(temp_dir)
-            
-            openmc.data.njoy.make_ace_thermal(
-                str(endf_file_n),
-                str(endf_file_t),
-                error=0.01,
-                iwt=2,
-                temperatures=temperatures,
-                ace=ace_ascii,
-                input_filename=input_njoy,
-                stdout=False,
-                njoy_exec=njoy_exec,
-            )
-
-            src_ace = temp_dir / ace_ascii
-            if src_ace.exists(): shutil.move(str(src_ace), str(dest_dir / ace_ascii))
-            
-            src_xsdir = temp_dir / "xsdir"
-            if src_xsdir.exists(): shutil.move(str(src_xsdir), str(dest_dir / f"{name}.xsdir"))
+            deck = njoy_decks.thermal_deck(endf_file_n, endf_file_t, temperatures, self.TSL_ERROR, self.TSL_IWT,
+                                           self.ace_type)
+        except Exception as e:
+            raise RuntimeError(f"TSL Processing failed for {name}: {e}")
+        return await self._execute_deck(deck, base_path, name, ace_ascii, input_njoy, njoy_exec,
+                                        Path(output_rel_path), work_dir, keep_failed=False)
+
+    async def _execute_deck(self, deck, base_path, name, ace_ascii, input_njoy, njoy_exec, dest_dir, work_dir, keep_failed):
+        """Run one deck in its own scratch directory and publish the ACE file and xsdir to dest_dir."""
+        # Scratch directory for this NJOY run (unique, on the configured scratch root)
+        temp_dir = Path(work_dir) if work_dir else scratch_space.job_dir(name)
+        temp_dir.mkdir(parents=True, exist_ok=True)
+        dest_dir.mkdir(parents=True, exist_ok=True)
 
-            # Move Input Deck
-            njoy_inputs_dir = base_path / "data" / "njoy_input_decks"
-            njoy_inputs_dir.mkdir(parents=True, exist_ok=True)
-            
-            src_input = temp_dir / input_njoy
-            if src_input.exists(): shutil.move(str(src_input), str(njoy_inputs_dir / input_njoy))
+        # Save the input deck within the package data structure (or the workspace)
+        njoy_inputs_dir = Path(self.decks_dir) if self.decks_dir else base_path / "data" / "njoy_input_decks"
+        njoy_inputs_dir.mkdir(parents=True, exist_ok=True)
+        (njoy_inputs_dir / input_njoy).write_text(deck.commands)
 
+        done = False
+        self.peak_rss_mb = None
+        try:
+            deck.stage(temp_dir)
+            if self.time_limit:
+                try:
+                    await asyncio.wait_for(self._run_stages(deck, njoy_exec, temp_dir), self.time_limit)
+                except asyncio.TimeoutError:
+                    raise NJOYTimeout(f"NJOY killed after {self.time_limit:.0f} s (time limit){_log_tail(temp_dir)}", "timeout")
+            else:
+                await self._run_stages(deck, njoy_exec, temp_dir)
+            deck.collect(temp_dir, temp_dir / ace_ascii, temp_dir / "xsdir")
+            tape_bytes = sum(f.stat().st_size for f in temp_dir.iterdir() if f.is_file())
+
+            # PUBLISH ARTIFACTS: ACE first, the xsdir fragment marks a finished run
+            start = time.perf_counter()
+            # Compression streams the file out of scratch in a thread (zlib and zstd release the GIL)
+            copied = await asyncio.get_running_loop().run_in_executor(
+                None, ace_storage.publish, temp_dir / ace_ascii, dest_dir / ace_ascii, self.compression, self.storage)
+            copied += scratch_space.publish(temp_dir / "xsdir", dest_dir / f"{name}.xsdir")
+            self.io_stats = (tape_bytes, copied, time.perf_counter() - start)
+            done = True
             return str(dest_dir / ace_ascii)
 
+        except (asyncio.CancelledError, NJOYTimeout, NJOYNotStarted):
+            keep_failed = False
+            raise
         except Exception as e:
-            raise RuntimeError(f"TSL Processing failed for {name}: {e}")
+            raise RuntimeError(f"NJOY failed: {e}")
+
         finally:
-            os.chdir(original_cwd)
-            if temp_dir.exists(): shutil.rmtree(temp_dir, ignore_errors=True)
+            if done or not keep_failed:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+            else:
+                print(Fore.RED + f"   -> Debug: Preserving temp dir {temp_dir} due to failure.")
 
-    def gen_xsdir(self, name, num_line, base_dir, output_path, valid_temperatures):
-        data_dir = Path(output_path)
-        master_xsdir = data_dir / "xsdir"
-        local_xsdir = data_dir / f"{name}.xsdir"
-        
+    async def _run_stages(self, deck, njoy_exec, work_dir):
+        """
+        Run a staged deck. Without a tape cache this is a single NJOY run. With
+        one, the broadened (or else the 0 K PENDF) tape is restored from the
+        cache when possible, and otherwise produced by a reconr/broadr-only run
+        and stored, before the rest of the deck runs from it.
+        """
+        if self.tape_cache is None:
+            await self._run_njoy_process(njoy_exec, deck.commands, work_dir)
+            return
+
+        cache = self.tape_cache
+        endf = deck.neutron_endf
+        # Hashing the ENDF file and copying tapes (to and from a shared cache too) run in
+        # threads: the event loop keeps supervising the other NJOY runs meanwhile
+        loop = asyncio.get_running_loop()
+        pendf_key, broadr_key = await loop.run_in_executor(
+            None, cache.keys, endf, deck.error, deck.temperatures, njoy_exec)
+        pendf_tape = work_dir / f"tape{deck.pendf_unit}"
+        broadr_tape = work_dir / f"tape{deck.broadr_unit}"
+
+        # Concurrent runs of the same nuclide wait here for the first one's tapes
+        async with cache.lock(broadr_key):
+            if not await loop.run_in_executor(None, cache.fetch, broadr_key, broadr_tape, "broadr"):
+                async with cache.lock(pendf_key):
+                    if not await loop.run_in_executor(None, cache.fetch, pendf_key, pendf_tape, "reconr"):
+                        await self._run_njoy_process(njoy_exec, deck.select(["reconr"]), work_dir)
+                        await loop.run_in_executor(None, cache.store, pendf_key, pendf_tape, "reconr", endf)
+                await self._run_njoy_process(njoy_exec, deck.select(["broadr"]), work_dir)
+                await loop.run_in_executor(None, cache.store, broadr_key, broadr_tape, "broadr", endf)
+
+        await self._run_njoy_process(njoy_exec, deck.without(["reconr", "broadr"]), work_dir)
+
+    async def _run_njoy_process(self, njoy_exec, commands, work_dir):
+        """
+        Start NJOY in work_dir with the deck on stdin and wait for it without
+        blocking the event loop. Output is appended to work_dir/njoy.log.
+        Cancelling the coroutine kills NJOY. Raises self.peak_rss_mb to the
+        process high-water mark (stays None if unavailable). With a stall
+        limit, NJOY is killed (NJOYTimeout) once nothing in work_dir changed
+        for that long.
+        """
+        log_path = Path(work_dir) / "njoy.log"
+        with open(log_path, "ab") as log:
+            try:
+                proc = await asyncio.create_subprocess_exec(
+                    njoy_exec, stdin=asyncio.subprocess.PIPE, stdout=log, stderr=asyncio.subprocess.STDOUT,
+                    cwd=str(work_dir),
+                )
+            except (FileNotFoundError, PermissionError) as e:
+                raise NJOYNotStarted(e.errno, f"Cannot run NJOY '{njoy_exec}': {e.strerror}")
+            if self.cpu_affinity:
+                # NJOY waits for its deck on stdin, so it is pinned before it allocates anything
+                cpu_placement.pin(proc.pid, self.cpu_affinity)
+            monitor = asyncio.ensure_future(self._track_peak_rss(proc.pid))
+            watchdog = asyncio.ensure_future(self._watch_output(proc, work_dir)) if self.stall_limit else None
+            try:
+                await proc.communicate(commands.encode())
+            except asyncio.CancelledError:
+                if proc.returncode is None:
+                    proc.kill()
+                    await proc.wait()
+                raise
+            finally:
+                monitor.cancel()
+                if watchdog is not None:
+                    watchdog.cancel()
+
+        if watchdog is not None and not watchdog.cancelled() and watchdog.done() and watchdog.result():
+            raise NJOYTimeout(f"NJOY killed after {self.stall_limit:.0f} s without output{_log_tail(work_dir)}", "stalled")
+        if proc.returncode != 0:
+            raise RuntimeError(f"{njoy_exec} exited with code {proc.returncode}:{_log_tail(work_dir)}")
+
+    async def _watch_output(self, proc, work_dir):
+        """Kill proc once no file in work_dir grew or was touched for self.stall_limit s. True if it did."""
+        def signature():
+            stats = [f.stat() for f in Path(work_dir).iterdir() if f.is_file()]
+            return sum(st.st_size for st in stats), max((st.st_mtime for st in stats), default=0)
+
+        last, changed_at = signature(), time.monotonic()
+        while proc.returncode is None:
+            await asyncio.sleep(min(30.0, self.stall_limit / 4))
+            current = signature()
+            if current != last:
+                last, changed_at = current, time.monotonic()
+            elif time.monotonic() - changed_at > self.stall_limit:
+                proc.kill()
+                return True
+        return False
+
+    async def _track_peak_rss(self, pid, interval=1.0):
+        """Poll the NJOY process high-water mark (VmHWM) until it exits (Linux only)."""
+        status = Path(f"/proc/{pid}/status")
+        while True:
+            try:
+                for line in status.read_text().splitlines():
+                    if line.startswith("VmHWM:"):
+                        rss = int(line.split()[1]) / 1024
+                        self.peak_rss_mb = max(rss, self.peak_rss_mb or 0)
+            except (OSError, ValueError, IndexError):
+                return
+            await asyncio.sleep(interval)
+
+    def merge_temperature_parts(self, parts, dest_ace, dest_xsdir, table_type):
+        """
+        Stitch single-temperature NJOY outputs into one ACE file and xsdir fragment,
+        in temperature order, renumbering each table to .01c/.02c/... (or .NNt).
+        parts: list of (ace_file, xsdir_file), each holding the .01 table of one temperature.
+        Both are written to hidden files next to their destinations and renamed, ACE first.
+        """
+        dest_ace, dest_xsdir = Path(dest_ace), Path(dest_xsdir)
+        ace_tmp = dest_ace.with_name(f".{dest_ace.name}.tmp")
+        xsdir_tmp = dest_xsdir.with_name(f".{dest_xsdir.name}.tmp")
+        with ace_storage.writer(ace_tmp, self.compression, report=self.storage) as ace_out, \
+                open(xsdir_tmp, "w") as xsdir_out:
+            for i, (ace_part, xsdir_part) in enumerate(parts, 1):
+                suffix = f".{i:02}{table_type}"
+                with ace_storage.open_ace(ace_part) as f:
+                    head = f.read(ace_index.RECORD_LENGTH)
+                    if ace_index.is_binary(head):
+                        ace_out.write(ace_binary.renumber(head + f.read(), i, table_type)[0])
+                    else:
+                        first, newline, rest = head.partition(b"\n")
+                        ace_out.write(_renumber_zaid(first.decode(), suffix).encode() + newline + rest)
+                        shutil.copyfileobj(f, ace_out)
+                if Path(xsdir_part).exists():
+                    with open(xsdir_part, "r") as f:
+                        for line in f:
+                            xsdir_out.write(_renumber_zaid(line, suffix))
+        os.replace(ace_tmp, dest_ace)
+        os.replace(xsdir_tmp, dest_xsdir)
+
+    def append_temperature_tables(self, ace_file, new_ace, new_xsdir, dest_xsdir, first_index, table_type):
+        """
+        Append the tables of new_ace (an NJOY run at the added temperatures) to
+        ace_file, renumbering them .{first_index}, .{first_index + 1}, ... The
+        ACE file is replaced atomically, then dest_xsdir is rewritten atomically
+        with the renumbered xsdir lines of new_xsdir appended. Returns the new
+        table names.
+        """
+        ace_file = Path(ace_file)
+        ace_type = ace_index.file_type(ace_file)
+        if ace_index.file_type(new_ace) != ace_type:
+            raise RuntimeError(f"Cannot append to {ace_file.name}: ASCII and binary ACE tables do not mix.")
+        header = re.compile(rb"^\s*\S+\.\d\d" + table_type.encode() + rb"\s")
+        tmp = ace_file.with_name(f".{ace_file.name}.tmp")
+        shutil.copyfile(ace_file, tmp)
+        # A compressed file gets the new tables as a further gzip member / zstd frame of its codec
+        codec = ace_storage.file_codec(ace_file)
+        with ace_storage.writer(tmp, codec, "ab", self.storage) as ace_out:
+            if ace_type == njoy_decks.ACE_BINARY:
+                ace_out.write(ace_binary.renumber(ace_storage.read_bytes(new_ace), first_index, table_type)[0])
+            else:
+                index = first_index - 1
+                with ace_storage.open_ace(new_ace) as f:
+                    for line in f:
+                        if header.match(line):
+                            index += 1
+                            line = _renumber_zaid(line.decode(), f".{index:02}{table_type}").encode()
+                        ace_out.write(line)
+
+        tables, lines = [], []
+        with open(new_xsdir, "r") as f:
+            for i, line in enumerate(f, first_index):
+                line = _renumber_zaid(line, f".{i:02}{table_type}")
+                if line.split():
+                    tables.append(line.split()[0])
+                lines.append(line)
+        os.replace(tmp, ace_file)
+
+        dest_xsdir = Path(dest_xsdir)
+        existing = dest_xsdir.read_text() if dest_xsdir.exists() else ""
+        if existing and not existing.endswith("\n"):
+            existing += "\n"
+        xsdir_tmp = dest_xsdir.with_name(f".{dest_xsdir.name}.tmp")
+        xsdir_tmp.write_text(existing + "".join(lines))
+        os.replace(xsdir_tmp, dest_xsdir)
+        return tables
+
+    def remove_xsdir_entries(self, master_xsdir, name):
+        """
+        Drop the directory entries that point at ACE file `name` from a master xsdir,
+        leaving the atomic weight ratios untouched. Returns the number of entries removed.
+        """
+        master_xsdir = Path(master_xsdir)
         if not master_xsdir.exists():
-             with open(master_xsdir, 'w') as f: f.write("directory\n")
+            return 0
+
+        directory = xsdir.Xsdir.read(master_xsdir)
+        removed = directory.remove_file(name)
+        if removed:
+            directory.write(master_xsdir)
+        return removed
 
+    def gen_xsdir(self, name, tables, base_dir, output_path, valid_temperatures):
+        """
+        Return the formatted entries of `{name}.xsdir` (the fragment is consumed).
+        tables: ace_index.ACETable of each temperature (None if not found), for the addresses
+        and, for binary tables, the file type and record layout.
+        The master xsdir is reduced from these fragments when the build ends (xsdir.write_master).
+        """
+        local_xsdir = Path(output_path) / f"{name}.xsdir"
         if not local_xsdir.exists():
-            return
+            return []
 
         with open(local_xsdir, "r") as f:
             lines = f.readlines()
@@ -307,34 +551,19 @@ class ACEGenerator:
             parts = line.split()
             if len(parts) < 10: continue
 
-            address = num_line[i] if (num_line and i < len(num_line)) else parts[5]
-            
+            table = tables[i] if (tables and i < len(tables)) else None
+            if table is not None:
+                filetype, address = table.filetype, table.address
+            else:
+                filetype, address = int(parts[4]), int(parts[5])
+            # Type 2: record length (bytes) and entries per record of the direct-access file
+            record_length, entries = ((ace_index.RECORD_LENGTH, ace_index.ENTRIES_PER_RECORD)
+                                      if filetype == njoy_decks.ACE_BINARY else (0, 0))
+
             # Formatting as per MCNP xsdir spec
-            w1 = parts[0].rjust(11)
-            w2 = parts[1].rjust(11)
-            w3 = name.rjust(6)
-            w4 = "0".rjust(3)
-            w5 = "1".rjust(2)
-            w6 = str(address).rjust(8)
-            w7 = parts[6].rjust(8)
-            w8 = "0".rjust(2)
-            w9 = "0".rjust(2)
-            w10 = parts[9].rjust(10)
-            w11 = "ptable".rjust(8)
-            
-            formatted_block.append(f"{w1}{w2}{w3}{w4}{w5}{w6}{w7}{w8}{w9}{w10}{w11}\n")
-
-        needs_newline = False
-        if master_xsdir.exists() and master_xsdir.stat().st_size > 0:
-            with open(master_xsdir, 'rb') as f:
-                f.seek(-1, 2)
-                last_char = f.read(1)
-                if last_char != b'\n':
-                    needs_newline = True
-        
-        with open(master_xsdir, "a") as f:
-            if needs_newline:
-                f.write("\n")
-            f.writelines(formatted_block)
-            
-        local_xsdir.unlink()
\ No newline at end of file
+            entry = xsdir.XsdirEntry(parts[0], parts[1], name, "0", filetype, address, int(parts[6]),
+                                     record_length, entries, parts[9], ptable=True)
+            formatted_block.append(entry.format())
+
+        local_xsdir.unlink()
+        return formatted_block
\ No newline at end of file
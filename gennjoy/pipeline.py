@@ -0,0 +1,507 @@
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import functools
+import argparse
+import warnings
+from multiprocessing import cpu_count
+from importlib.metadata import version as package_version, PackageNotFoundError
+from pathlib import Path
+from typing import Dict, List, Optional
+from colorama import Fore, Style, init
+
+# Ensure local modules can be imported when running as a script
+current_dir = Path(__file__).resolve().parent
+if str(current_dir) not in sys.path:
+    sys.path.append(str(current_dir))
+
+try:
+    import fetch_endf_library
+    import generate_neutron_input
+    import run_neutron_processing
+    import run_tsl_processing
+    import run_all_processing
+    import njoy_execution_engine
+    import job_scheduler
+    import artifact_cache
+    import scratch_space
+    import cpu_placement
+    import ace_storage
+    import cost_model
+except ImportError:
+    from gennjoy import fetch_endf_library
+    from gennjoy import generate_neutron_input
+    from gennjoy import run_neutron_processing
+    from gennjoy import run_tsl_processing
+    from gennjoy import run_all_processing
+    from gennjoy import njoy_execution_engine
+    from gennjoy import job_scheduler
+    from gennjoy import artifact_cache
+    from gennjoy import scratch_space
+    from gennjoy import cpu_placement
+    from gennjoy import ace_storage
+    from gennjoy import cost_model
+
+# Initialize colorama
+init(autoreset=True)
+
+
+# --- Configuration & Constants ---
+class Config:
+    BASE_DIR = Path(__file__).resolve().parent
+    DATA_DIR = BASE_DIR / "data"
+    NEUTRON_ENDF = DATA_DIR / "incident_neutron_endf"
+    THERMAL_ENDF = DATA_DIR / "thermal_scattering_endf"
+    NEUTRON_BATCH = BASE_DIR / "inputs" / "neutron_process_batch.i"
+
+    # Same tool and layout as compile_openmc_library.py (option 6)
+    CONVERTER = "openmc-ace-to-hdf5"
+    LIBRARY_DIR = DATA_DIR / "hdf5_library"
+    # ACE file -> digest and HDF5 files it was converted to
+    MANIFEST = ".pipeline.json"
+    INDEX = "cross_sections.xml"
+
+
+# --- Logging Helper ---
+class Logger:
+    @staticmethod
+    def info(msg):
+        print(f"{Fore.GREEN}[INFO] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def debug(msg):
+        print(f"{Fore.CYAN}[DEBUG] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def warn(msg):
+        print(f"{Fore.YELLOW}[WARN] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def error(msg):
+        print(f"{Fore.RED}[ERROR] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def header(msg):
+        print(f"\n{Fore.MAGENTA}{'='*60}")
+        print(f"{Fore.BLUE}{Style.BRIGHT}{msg.center(60)}")
+        print(f"{Fore.MAGENTA}{'='*60}{Style.RESET_ALL}")
+
+
+# --- HDF5 Conversion ---
+class HDF5Converter:
+    """
+    Converts ACE files to HDF5 while NJOY is still running.
+
+    Used as the context of the NJOY job pool: submit() starts the conversion
+    of a table as soon as its ACE file is merged, and leaving the context
+    waits for the conversions still running. A manifest records the digest
+    of every converted ACE file, so unchanged tables are not converted again.
+    """
+
+    def __init__(self, library_dir: Path, limit: int = 1, tool: str = Config.CONVERTER,
+                 cache: Optional[artifact_cache.ArtifactCache] = None):
+        self.library_dir = Path(library_dir)
+        self.limit = max(1, limit)
+        self.tool = tool
+        # HDF5 files are also kept in the artifact cache, keyed by ACE contents and OpenMC version
+        self.cache = cache
+        self.manifest_file = self.library_dir / Config.MANIFEST
+        self.manifest: Dict[str, dict] = {}
+        if self.manifest_file.exists():
+            try:
+                self.manifest = json.loads(self.manifest_file.read_text())
+            except (OSError, ValueError):
+                Logger.warn(f"Unreadable conversion manifest {self.manifest_file}, converting everything again.")
+        # Tables queued before the event loop runs, started on entering the context
+        self.backlog: List[tuple] = []
+        self.tasks: List[asyncio.Task] = []
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.converted = 0
+        self.restored = 0
+        self.skipped = 0
+        self.failed: List[str] = []
+        self.busy = 0.0
+        # Compressed ACE files are decompressed for the converter
+        self.storage = ace_storage.StorageReport()
+
+    def is_current(self, ace_file: Path, digest: str) -> bool:
+        """Whether the HDF5 files of ace_file (whose contents hash to `digest`) are up to date."""
+        entry = self.manifest.get(ace_file.name)
+        if not entry or not ace_file.exists():
+            return False
+        if not all((self.library_dir / h5).exists() for h5 in entry["h5"]):
+            return False
+        return entry["sha256"] == digest
+
+    def submit(self, name: str, ace_file: Path):
+        """Queue the conversion of a finished ACE file (skipped if its HDF5 file is up to date)."""
+        if self.semaphore is None:
+            self.backlog.append((name, ace_file))
+            return
+        self.tasks.append(asyncio.ensure_future(self._convert(name, Path(ace_file))))
+
+    def _cache_key(self, digest: str) -> str:
+        return artifact_cache.cache_key({"kind": "hdf5", "ace": digest, "openmc": converter_version(self.tool)})
+
+    def _restore(self, key: str) -> Optional[str]:
+        """Copy the cached HDF5 file of `key` into the library. Returns its name (None: not cached)."""
+        meta = self.cache.meta(key)
+        h5_name = (meta or {}).get("h5")
+        if not h5_name:
+            return None
+        tmp = self.library_dir / f".{h5_name}.tmp"
+        if not self.cache.fetch(key, {"h5": tmp}):
+            return None
+        os.replace(tmp, self.library_dir / h5_name)
+        return h5_name
+
+    async def _convert(self, name: str, ace_file: Path):
+        # Hashing and copying whole ACE/HDF5 files stays off the event loop that drives NJOY
+        loop = asyncio.get_running_loop()
+        digest = await loop.run_in_executor(None, artifact_cache.file_digest, ace_file)
+        if self.is_current(ace_file, digest):
+            self.skipped += 1
+            return
+        async with self.semaphore:
+            key = await loop.run_in_executor(None, self._cache_key, digest) if self.cache is not None else None
+            h5_name = await loop.run_in_executor(None, self._restore, key) if key is not None else None
+            if h5_name is not None:
+                self.manifest[ace_file.name] = {"sha256": digest, "h5": [h5_name]}
+                self.restored += 1
+                Logger.info(f"HDF5: {name} -> {h5_name} (artifact cache)")
+                return
+            out_dir = self.library_dir / f".convert-{name}"
+            shutil.rmtree(out_dir, ignore_errors=True)
+            out_dir.mkdir(parents=True)
+            env = os.environ.copy()
+            env["PYTHONWARNINGS"] = "ignore"
+            start = time.time()
+            try:
+                source = await loop.run_in_executor(None, ace_storage.plain_file, ace_file, out_dir, self.storage)
+                proc = await asyncio.create_subprocess_exec(
+                    self.tool, "-d", str(out_dir), str(source),
+                    stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE, env=env,
+                )
+                _, stderr = await proc.communicate()
+                h5_files = sorted(out_dir.glob("*.h5"))
+                if proc.returncode != 0 or not h5_files:
+                    message = stderr.decode(errors="replace").strip().splitlines()
+                    raise RuntimeError(message[-1] if message else f"exit code {proc.returncode}")
+                # Atomic hand-over: OpenMC never sees a half-written library file
+                for h5 in h5_files:
+                    os.replace(h5, self.library_dir / h5.name)
+                self.manifest[ace_file.name] = {"sha256": digest, "h5": [h5.name for h5 in h5_files]}
+                if key is not None and len(h5_files) == 1:
+                    h5 = self.library_dir / h5_files[0].name
+                    await loop.run_in_executor(None, functools.partial(
+                        self.cache.store, key, {"h5": h5}, meta={"kind": "hdf5", "h5": h5.name, "ace": ace_file.name}))
+                self.converted += 1
+                Logger.info(f"HDF5: {name} -> {', '.join(h5.name for h5 in h5_files)}")
+            except Exception as e:
+                self.failed.append(name)
+                Logger.error(f"HDF5 conversion of {name} failed: {e}")
+            finally:
+                self.busy += time.time() - start
+                shutil.rmtree(out_dir, ignore_errors=True)
+
+    def save(self):
+        tmp = self.manifest_file.with_name(f"{self.manifest_file.name}.tmp")
+        tmp.write_text(json.dumps(self.manifest, indent=1, sort_keys=True))
+        os.replace(tmp, self.manifest_file)
+
+    async def __aenter__(self):
+        self.library_dir.mkdir(parents=True, exist_ok=True)
+        self.semaphore = asyncio.Semaphore(self.limit)
+        backlog, self.backlog = self.backlog, []
+        for name, ace_file in backlog:
+            self.tasks.append(asyncio.ensure_future(self._convert(name, Path(ace_file))))
+        return self
+
+    async def __aexit__(self, *exc):
+        if self.tasks:
+            pending = sum(1 for task in self.tasks if not task.done())
+            if pending:
+                Logger.info(f"Waiting for {pending} HDF5 conversions...")
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.save()
+        self.semaphore = None
+        return False
+
+
+_CONVERTER_VERSIONS: Dict[str, str] = {}
+
+
+def converter_version(tool: str) -> str:
+    """OpenMC version behind the converter (falls back to a hash of the tool)."""
+    if tool not in _CONVERTER_VERSIONS:
+        try:
+            _CONVERTER_VERSIONS[tool] = package_version("openmc")
+        except PackageNotFoundError:
+            exe = shutil.which(tool) or tool
+            _CONVERTER_VERSIONS[tool] = f"sha256:{artifact_cache.file_digest(exe)}" if Path(exe).is_file() else "unknown"
+    return _CONVERTER_VERSIONS[tool]
+
+
+def write_index(library_dir: Path) -> bool:
+    """Write cross_sections.xml for the HDF5 files of library_dir (needs the openmc package)."""
+    try:
+        import openmc.data
+    except ImportError:
+        Logger.warn(f"The 'openmc' package is not installed: {Config.INDEX} not written.")
+        return False
+
+    h5_inventory = sorted(library_dir.glob("*.h5"))
+    if not h5_inventory:
+        Logger.warn("No HDF5 libraries found. Indexing skipped.")
+        return False
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        library = openmc.data.DataLibrary()
+        for h5_file in h5_inventory:
+            library.register_file(h5_file)
+        tmp = library_dir / f".{Config.INDEX}.tmp"
+        library.export_to_xml(tmp)
+    os.replace(tmp, library_dir / Config.INDEX)
+    Logger.info(f"Indexed {len(h5_inventory)} HDF5 libraries in {library_dir / Config.INDEX}")
+    return True
+
+
+# --- Pipeline ---
+class Pipeline:
+    """
+    fetch -> batch file -> NJOY -> xsdir merge -> HDF5 -> cross_sections.xml.
+
+    Every stage is skipped when its output is up to date: the ENDF library
+    when its directory is populated, the batch file when it exists, NJOY
+    runs through the --incremental build journal and the artifact cache,
+    conversions through the converter manifest, and the index when no HDF5
+    file changed. Each table is handed to the converter as soon as NJOY has
+    finished and merged it, so conversions overlap with the remaining NJOY
+    runs instead of waiting for the whole batch.
+    """
+
+    def __init__(self, neutron_batch: Path, tsl_batch: Optional[Path], njoy_cmd: str, cpu_limit: int,
+                 library: Optional[str] = None, temperatures: Optional[List[float]] = None,
+                 convert: bool = True, convert_jobs: int = 1, options: Optional[dict] = None,
+                 governor: bool = True, max_jobs: Optional[int] = None):
+        self.neutron_batch = neutron_batch
+        self.tsl_batch = tsl_batch
+        self.njoy_cmd = njoy_cmd
+        self.cpu_limit = cpu_limit
+        self.library = library
+        self.temperatures = temperatures or generate_neutron_input.Config.DEFAULT_TEMPS_LIST
+        self.convert = convert
+        self.convert_jobs = convert_jobs
+        self.options = options or {}
+        self.governor = governor
+        self.max_jobs = max_jobs
+        self.failed = False
+
+    def fetch(self) -> bool:
+        """Download the ENDF library unless its directories are already populated."""
+        targets = [(Config.NEUTRON_ENDF, fetch_endf_library.Config.NEUTRON_DIR_NAME, "n_url")]
+        if self.tsl_batch is not None:
+            targets.append((Config.THERMAL_ENDF, fetch_endf_library.Config.THERMAL_DIR_NAME, "t_url"))
+        for directory, folder, url_key in targets:
+            if directory.is_dir() and any(directory.iterdir()):
+                Logger.info(f"Fetch: {directory.name} up to date.")
+                continue
+            if self.library is None:
+                Logger.error(f"{directory} is empty. Pass --library to download it.")
+                return False
+            Config.DATA_DIR.mkdir(parents=True, exist_ok=True)
+            archive = fetch_endf_library.download_file(fetch_endf_library.Config.LIBRARIES[self.library][url_key])
+            fetch_endf_library.extract_and_organize(archive, folder)
+            if not directory.is_dir():
+                Logger.error(f"Fetching {folder} failed.")
+                return False
+        return True
+
+    def generate_batch(self) -> bool:
+        """Write a batch file of every neutron ENDF file if none exists."""
+        if self.neutron_batch.exists():
+            Logger.info(f"Batch: {self.neutron_batch.name} up to date.")
+            return True
+        files = generate_neutron_input.list_endf_files(Config.NEUTRON_ENDF)
+        if not files:
+            Logger.error(f"No ENDF files found in {Config.NEUTRON_ENDF}")
+            return False
+        temps_str = " ".join(str(t) for t in self.temperatures)
+        self.neutron_batch.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.neutron_batch, "w") as f:
+            for endf_file in files:
+                f.write(generate_neutron_input.inventory_entry(endf_file.name, temps_str))
+        Logger.info(f"Batch: {self.neutron_batch.name} written with {len(files)} isotopes.")
+        return True
+
+    def _finished_tables(self, processor, output_dir: Path, jobs) -> List[str]:
+        """Journaled tables that no planned NJOY job rewrites (already up to date)."""
+        gen = njoy_execution_engine.ACEGenerator(str(processor.input_file))
+        pending = set()
+        for job in jobs:
+            line = job[0][1] if isinstance(job[0], tuple) else job[0]
+            pending.add(gen.gen_parametre_njoy(line)[1])
+        return [name for name in processor.journal.names()
+                if name not in pending and (output_dir / name).exists()]
+
+    @staticmethod
+    async def _drain(converter: HDF5Converter):
+        async with converter:
+            pass
+
+    def process(self) -> bool:
+        """Run NJOY on the batch files and stream finished tables to the HDF5 converter."""
+        neutron = run_neutron_processing.NeutronProcessor(
+            self.neutron_batch, self.njoy_cmd, self.cpu_limit, incremental=True, **self.options)
+        tsl = None
+        if self.tsl_batch is not None:
+            tsl = run_tsl_processing.TSLProcessor(
+                self.tsl_batch, self.njoy_cmd, self.cpu_limit, incremental=True, **self.options)
+        combined = run_all_processing.CombinedProcessor(neutron, tsl, self.cpu_limit,
+                                                        governor=self.governor, max_jobs=self.max_jobs)
+        jobs = combined.plan_jobs()
+
+        converter = None
+        if self.convert:
+            converter = HDF5Converter(Config.LIBRARY_DIR, self.convert_jobs, cache=neutron.cache)
+            for processor in filter(None, (neutron, tsl)):
+                processor.on_complete = converter.submit
+
+            # Tables NJOY does not touch this time may still lack their HDF5 file;
+            # they are converted alongside the first NJOY runs
+            for kind, processor in (("neutron", neutron), ("tsl", tsl)):
+                if processor is not None:
+                    own = [job for k, job in jobs if k == kind]
+                    for name in self._finished_tables(processor, processor.output_ace, own):
+                        converter.submit(name, processor.output_ace / name)
+
+        if jobs:
+            combined.execute(context=converter, jobs=jobs)
+        else:
+            Logger.info("NJOY: every table is up to date.")
+            if converter is not None:
+                asyncio.run(self._drain(converter))
+            neutron.finish()
+            if tsl is not None:
+                tsl.finish()
+
+        self.failed = combined.failed
+        if converter is None:
+            return not self.failed
+        Logger.info(f"HDF5: {converter.converted} converted, {converter.restored} from the artifact cache, "
+                    f"{converter.skipped} up to date, "
+                    f"{len(converter.failed)} failed ({cost_model.format_duration(converter.busy)} "
+                    f"of conversion time).")
+        if converter.storage.decompressed_files:
+            Logger.info(converter.storage.summary())
+        self.failed = self.failed or bool(converter.failed)
+        index = Config.LIBRARY_DIR / Config.INDEX
+        if converter.converted or converter.restored or not index.exists():
+            write_index(Config.LIBRARY_DIR)
+        else:
+            Logger.info(f"Index: {Config.INDEX} up to date.")
+        return not self.failed
+
+    def run(self) -> bool:
+        Logger.header("STARTING PIPELINE")
+        if not self.fetch() or not self.generate_batch():
+            self.failed = True
+            return False
+        return self.process()
+
+
+# --- Command Line ---
+def add_arguments(parser: argparse.ArgumentParser):
+    """Arguments of `gennjoy pipeline` (shared with `gennjoy watch`)."""
+    parser.add_argument("neutron_batch", nargs="?", default=str(Config.NEUTRON_BATCH),
+                        help="Incident neutron batch file, written from the ENDF directory if missing "
+                             "(Default: inputs/neutron_process_batch.i)")
+    parser.add_argument("--tsl-batch", default=None,
+                        help="Also process this TSL batch file, in the same NJOY job pool")
+    parser.add_argument("--library", choices=sorted(fetch_endf_library.Config.LIBRARIES), default=None,
+                        help="ENDF library to download when the data directories are empty "
+                             "(numbers as in option 1)")
+    parser.add_argument("--temperatures", type=float, nargs="+", default=None,
+                        help="Temperatures of a generated batch file (Default: 293.6 600.0 900.0)")
+    parser.add_argument("--njoy", default=shutil.which("njoy") or "njoy",
+                        help="NJOY command (Default: njoy from PATH)")
+    parser.add_argument("--cpus", type=int, default=cpu_count(),
+                        help="CPUs for NJOY (Default: all)")
+    parser.add_argument("--no-hdf5", action="store_true",
+                        help="Stop after NJOY and the xsdir merge")
+    parser.add_argument("--convert-jobs", type=int, default=1,
+                        help=f"Concurrent {Config.CONVERTER} runs (Default: 1)")
+    parser.add_argument("--split-temperatures", action="store_true",
+                        help="Run each temperature as its own NJOY job and stitch the ACE tables")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Do not restore or store results in the artifact cache")
+    parser.add_argument("--scratch-dir", default=None,
+                        help=f"Root for per-job NJOY scratch directories, e.g. /dev/shm (Default: {scratch_space.Config.SCRATCH_ROOT})")
+    parser.add_argument("--no-governor", action="store_true",
+                        help="Run exactly the requested number of NJOY jobs at once (no memory-aware, self-tuning concurrency)")
+    parser.add_argument("--max-jobs", type=int, default=None,
+                        help="Upper bound for the self-tuned NJOY concurrency (Default: twice the CPU count)")
+    parser.add_argument("--job-timeout", type=float, default=None, metavar="SECONDS",
+                        help="Wall-clock limit of one NJOY run, 0 for none (Default: derived from its predicted time)")
+    parser.add_argument("--stall-timeout", type=float, default=3600.0, metavar="SECONDS",
+                        help="Kill NJOY when its log and tapes have not changed for this long, 0 to disable (Default: 3600)")
+    parser.add_argument("--retries", type=int, default=2,
+                        help="Retries of a failed or killed NJOY run, with exponential backoff (Default: 2)")
+    parser.add_argument("--pin", choices=cpu_placement.MODES, default=None,
+                        help="Pin each NJOY run to one core, or to the cores of one NUMA node")
+    parser.add_argument("--binary-ace", action="store_true",
+                        help="Write binary (type 2) ACE files instead of ASCII ones")
+
+
+def from_arguments(args) -> Pipeline:
+    """Pipeline for parsed add_arguments() arguments; sets up the ENDF data paths."""
+    # Same data layout as the interactive options
+    os.environ.setdefault("OPENMC_ENDF_DATA", str(Config.NEUTRON_ENDF))
+    os.environ.setdefault("OPENMC_ENDF_DATA_Neutron", os.environ["OPENMC_ENDF_DATA"])
+    os.environ.setdefault("OPENMC_ENDF_DATA_Thermal", str(Config.THERMAL_ENDF))
+    Config.NEUTRON_ENDF = Path(os.environ["OPENMC_ENDF_DATA"])
+    Config.THERMAL_ENDF = Path(os.environ["OPENMC_ENDF_DATA_Thermal"])
+
+    convert = not args.no_hdf5
+    if convert and not shutil.which(Config.CONVERTER):
+        Logger.warn(f"'{Config.CONVERTER}' not found in PATH: running the NJOY stages only.")
+        convert = False
+
+    options = dict(
+        split_temperatures=args.split_temperatures,
+        use_cache=not args.no_cache,
+        governor=not args.no_governor,
+        max_jobs=args.max_jobs,
+        retry=job_scheduler.RetryPolicy(args.retries, job_timeout=args.job_timeout,
+                                        stall_timeout=args.stall_timeout),
+        placement=args.pin,
+        binary_ace=args.binary_ace,
+        scratch_dir=Path(args.scratch_dir) if args.scratch_dir else None,
+    )
+    return Pipeline(
+        Path(args.neutron_batch).resolve(),
+        Path(args.tsl_batch).resolve() if args.tsl_batch else None,
+        args.njoy, max(1, args.cpus),
+        library=args.library, temperatures=args.temperatures,
+        convert=convert, convert_jobs=args.convert_jobs, options=options,
+        governor=not args.no_governor, max_jobs=args.max_jobs,
+    )
+
+
+# --- Entry Point ---
+if __name__ == "__main__":
+    start_time = time.time()
+
+    parser = argparse.ArgumentParser(
+        description="Fetch, generate, run NJOY and convert to HDF5, streaming each table to the next stage.")
+    add_arguments(parser)
+    pipeline = from_arguments(parser.parse_args())
+    pipeline.run()
+
+    elapsed = time.time() - start_time
+    print(f"\n{Fore.GREEN}Total Time: {cost_model.format_duration(elapsed)}")
+    if pipeline.failed:
+        sys.exit(1)
@@ -0,0 +1,257 @@
+import os
+import asyncio
+import contextlib
+import collections
+from typing import Dict, Optional, Tuple
+
+
+class Config:
+    # Memory kept free for the OS and page cache when admitting NJOY runs (MB)
+    MEMORY_RESERVE_MB = float(os.environ.get("GENNJOY_MEMORY_RESERVE_MB", 1024))
+
+    # Sampling period of /proc (s) and samples that must agree before the
+    # concurrency limit moves
+    INTERVAL = 2.0
+    STEADY_SAMPLES = 3
+
+    # CPU busy fraction below which more jobs are started, and above which
+    # (with more runnable processes than CPUs) the limit is lowered
+    CPU_TARGET = 0.90
+    CPU_SATURATED = 0.98
+    # Share of time tasks stall on I/O (PSI "some avg10", else iowait) that
+    # counts as I/O saturation
+    IO_SATURATED = 0.30
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path, "r") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def memory_available_mb() -> Optional[float]:
+    """MemAvailable from /proc/meminfo (Linux), in MB."""
+    text = _read("/proc/meminfo")
+    if not text:
+        return None
+    for line in text.splitlines():
+        if line.startswith("MemAvailable:"):
+            return int(line.split()[1]) / 1024
+    return None
+
+
+def child_rss_mb(parent: int) -> Dict[int, float]:
+    """Current RSS (MB) of every direct child process of `parent` (the running NJOY runs)."""
+    rss = {}
+    try:
+        pids = [p for p in os.listdir("/proc") if p.isdigit()]
+    except OSError:
+        return rss
+    for pid in pids:
+        stat = _read(f"/proc/{pid}/stat")
+        # Field 4 (ppid) follows the parenthesised command name
+        if not stat or int(stat.rsplit(")", 1)[1].split()[1]) != parent:
+            continue
+        status = _read(f"/proc/{pid}/status") or ""
+        for line in status.splitlines():
+            if line.startswith("VmRSS:"):
+                rss[int(pid)] = int(line.split()[1]) / 1024
+    return rss
+
+
+def cpu_times() -> Optional[Tuple[float, float, float]]:
+    """(busy, iowait, total) jiffies from /proc/stat."""
+    text = _read("/proc/stat")
+    if not text:
+        return None
+    fields = [float(v) for v in text.splitlines()[0].split()[1:]]
+    idle, iowait = fields[3], fields[4]
+    total = sum(fields[:8])
+    return total - idle - iowait, iowait, total
+
+
+def runnable_processes() -> Optional[int]:
+    text = _read("/proc/stat") or ""
+    for line in text.splitlines():
+        if line.startswith("procs_running"):
+            return int(line.split()[1])
+    return None
+
+
+def io_pressure() -> Optional[float]:
+    """Share of the last 10 s in which some task stalled on I/O (Linux PSI)."""
+    text = _read("/proc/pressure/io")
+    if not text:
+        return None
+    for part in text.split():
+        if part.startswith("avg10="):
+            return float(part.split("=")[1]) / 100
+    return None
+
+
+class ResourceGovernor:
+    """
+    Admission control for NJOY runs started from one event loop.
+
+    slot(memory_mb) is entered before a run starts: runs are admitted in
+    request order while fewer than `limit` are running and the predicted peak
+    memory of the run fits in the available memory. That is MemAvailable
+    minus a reserve, minus the growth the running jobs are still expected to
+    have (their predicted peaks less the RSS their NJOY children have reached).
+    One run is always admitted when nothing is running.
+
+    While entered as an async context manager, a monitor samples /proc every
+    INTERVAL seconds and moves `limit` between `floor` and `ceiling`:
+      - up while the CPUs are not busy and every slot is in use (small,
+        I/O-bound jobs get overcommitted)
+      - down while I/O is saturated, or the CPUs are saturated with more
+        runnable processes than CPUs
+    Without /proc (non-Linux) the governor is a fixed limit.
+    """
+
+    def __init__(self, limit: int, ceiling: Optional[int] = None, floor: int = 1,
+                 memory_reserve_mb: Optional[float] = None):
+        self.cpus = os.cpu_count() or 1
+        self.limit = max(1, limit)
+        self.floor = max(1, min(floor, self.limit))
+        self.ceiling = max(self.limit, ceiling or 2 * self.cpus)
+        self.memory_reserve_mb = Config.MEMORY_RESERVE_MB if memory_reserve_mb is None else memory_reserve_mb
+
+        self.running = 0
+        self.committed_mb = 0.0
+        self.waiting = collections.deque()
+        self.changed = None
+        self.monitor = None
+
+        self.available_mb = memory_available_mb()
+        self.children: Dict[int, float] = {}
+        self.last_cpu = cpu_times()
+        self.trend = 0
+
+        # Report
+        self.start_limit = self.limit
+        self.min_limit = self.max_limit = self.limit
+        self.delayed = 0
+        self.peak_children_mb = 0.0
+
+    async def __aenter__(self):
+        self.changed = asyncio.Condition()
+        self.monitor = asyncio.ensure_future(self._monitor())
+        return self
+
+    async def __aexit__(self, *exc):
+        self.monitor.cancel()
+        await asyncio.gather(self.monitor, return_exceptions=True)
+
+    # --- Admission ---
+    def headroom_mb(self) -> Optional[float]:
+        """Memory left for a new run (None if unknown)."""
+        if self.available_mb is None:
+            return None
+        growth = max(0.0, self.committed_mb - sum(self.children.values()))
+        return self.available_mb - growth - self.memory_reserve_mb
+
+    def _memory_fits(self, memory_mb: float) -> bool:
+        headroom = self.headroom_mb()
+        return headroom is None or headroom >= memory_mb
+
+    def _admissible(self, ticket, memory_mb: float) -> bool:
+        if self.waiting[0] is not ticket:
+            return False
+        if self.running == 0:
+            return True
+        return self.running < self.limit and self._memory_fits(memory_mb)
+
+    @contextlib.asynccontextmanager
+    async def slot(self, memory_mb: float = 0.0):
+        """Wait for admission of a run with the given predicted peak memory."""
+        memory_mb = memory_mb or 0.0
+        ticket = object()
+        self.waiting.append(ticket)
+        counted = False
+        admitted = False
+        try:
+            async with self.changed:
+                while not self._admissible(ticket, memory_mb):
+                    if not counted and self.waiting[0] is ticket and self.running < self.limit:
+                        # Head of the queue with a free slot, held back by memory
+                        self.delayed += 1
+                        counted = True
+                    await self.changed.wait()
+                self.waiting.popleft()
+                self.running += 1
+                self.committed_mb += memory_mb
+                admitted = True
+                self.changed.notify_all()
+        finally:
+            if not admitted:
+                # Cancelled while queued: let the next request move up
+                self.waiting.remove(ticket)
+                async with self.changed:
+                    self.changed.notify_all()
+
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self.committed_mb -= memory_mb
+            async with self.changed:
+                self.changed.notify_all()
+
+    # --- Monitoring ---
+    async def _monitor(self):
+        while True:
+            await asyncio.sleep(Config.INTERVAL)
+            self.sample()
+            async with self.changed:
+                self.changed.notify_all()
+
+    def sample(self):
+        """Refresh the memory figures and move the limit on CPU/I/O saturation."""
+        self.available_mb = memory_available_mb()
+        self.children = child_rss_mb(os.getpid())
+        self.peak_children_mb = max(self.peak_children_mb, sum(self.children.values()))
+
+        now = cpu_times()
+        if now is None or self.last_cpu is None:
+            return
+        busy = now[0] - self.last_cpu[0]
+        iowait = now[1] - self.last_cpu[1]
+        total = max(now[2] - self.last_cpu[2], 1e-9)
+        self.last_cpu = now
+
+        cpu_busy = busy / total
+        io_stall = io_pressure()
+        if io_stall is None:
+            io_stall = iowait / total
+        runnable = runnable_processes() or 0
+
+        if io_stall > Config.IO_SATURATED or (cpu_busy > Config.CPU_SATURATED and runnable > self.cpus):
+            step = -1
+        elif cpu_busy < Config.CPU_TARGET and self.running >= self.limit and self.waiting \
+                and self._memory_fits(self.memory_reserve_mb):
+            step = 1
+        else:
+            step = 0
+        self._tune(step)
+
+    def _tune(self, step: int):
+        # Only move after STEADY_SAMPLES consecutive samples point the same way
+        if step == 0 or (self.trend and (step > 0) != (self.trend > 0)):
+            self.trend = 0
+        self.trend += step
+        if abs(self.trend) < Config.STEADY_SAMPLES:
+            return
+        self.trend = 0
+        self.limit = min(self.ceiling, max(self.floor, self.limit + step))
+        self.min_limit = min(self.min_limit, self.limit)
+        self.max_limit = max(self.max_limit, self.limit)
+
+    def summary(self) -> str:
+        return (
+            f"Governor: concurrency {self.start_limit} -> {self.limit} "
+            f"(range {self.min_limit}-{self.max_limit}), {self.delayed} starts delayed for memory, "
+            f"peak NJOY RSS {self.peak_children_mb / 1024:.1f} GB."
+        )
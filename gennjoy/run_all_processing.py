@@ -0,0 +1,295 @@
+import os
+import sys
+import time
+import argparse
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from colorama import Fore, Style, init
+
+# Ensure local modules can be imported when running as a script
+current_dir = Path(__file__).resolve().parent
+if str(current_dir) not in sys.path:
+    sys.path.append(str(current_dir))
+
+try:
+    import run_neutron_processing
+    import run_tsl_processing
+    import job_scheduler
+    import cost_model
+    import artifact_cache
+    import resource_governor
+    import scratch_space
+    import cpu_placement
+except ImportError:
+    from gennjoy import run_neutron_processing
+    from gennjoy import run_tsl_processing
+    from gennjoy import job_scheduler
+    from gennjoy import cost_model
+    from gennjoy import artifact_cache
+    from gennjoy import resource_governor
+    from gennjoy import scratch_space
+    from gennjoy import cpu_placement
+
+# Initialize colorama
+init(autoreset=True)
+
+
+# --- Configuration & Constants ---
+class Config:
+    BASE_DIR = Path(__file__).resolve().parent
+    INPUTS_DIR = BASE_DIR / "inputs"
+
+    NEUTRON_BATCH = INPUTS_DIR / "neutron_process_batch.i"
+    TSL_BATCH = INPUTS_DIR / "tsl_process_batch.i"
+
+
+# --- Logging Helper ---
+class Logger:
+    @staticmethod
+    def info(msg):
+        print(f"{Fore.GREEN}[INFO] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def debug(msg):
+        print(f"{Fore.CYAN}[DEBUG] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def warn(msg):
+        print(f"{Fore.YELLOW}[WARN] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def error(msg):
+        print(f"{Fore.RED}[ERROR] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def header(msg):
+        print(f"\n{Fore.MAGENTA}{'='*60}")
+        print(f"{Fore.BLUE}{Style.BRIGHT}{msg.center(60)}")
+        print(f"{Fore.MAGENTA}{'='*60}{Style.RESET_ALL}")
+
+
+# --- Combined Processor ---
+class CombinedProcessor:
+    """
+    Runs the jobs of a neutron and a TSL processor in one NJOY job pool.
+
+    A TSL job waits for the neutron jobs of the same batch that process its
+    incident neutron evaluation (same ENDF contents), and is skipped if one
+    of them failed. Jobs are started largest-first by the predicted time of
+    their longest dependency chain, so the neutron partners of heavy TSL
+    materials go first and the CPUs stay busy across both workloads.
+    """
+
+    def __init__(self, neutron, tsl=None, cpu_limit: int = 1, governor: bool = True, max_jobs: Optional[int] = None):
+        self.neutron = neutron
+        self.tsl = tsl
+        self.cpu_limit = cpu_limit
+        self.use_governor = governor
+        self.max_jobs = max_jobs
+        # One tape cache and one CPU placement for both workloads
+        if self.tsl is not None:
+            self.tsl.tape_cache = self.neutron.tape_cache
+            if self.neutron.placement is not None:
+                self.tsl.placement = self.neutron.placement
+        # TSL job -> neutron jobs of its partner evaluation
+        self.partners: Dict[Tuple, List[Tuple]] = {}
+
+    def _processor(self, kind: str):
+        return self.neutron if kind == "neutron" else self.tsl
+
+    def _partner_dependencies(self, jobs: List[Tuple[str, Tuple]]) -> Dict[int, List[int]]:
+        """{TSL job index: indices of the neutron jobs processing its incident neutron ENDF file}."""
+        gen = self.neutron._generator()
+        tsl_gen = self.tsl._generator() if self.tsl is not None else gen
+        digests: Dict[Path, str] = {}
+
+        def digest(generator, base_dir, env_var, element):
+            endf_file = generator.resolve_endf_file(base_dir, env_var, element) if element else None
+            if endf_file is None or not endf_file.is_file():
+                return None
+            if endf_file not in digests:
+                digests[endf_file] = artifact_cache.file_digest(endf_file)
+            return digests[endf_file]
+
+        producers: Dict[str, List[int]] = {}
+        for i, (kind, (line, _)) in enumerate(jobs):
+            if kind == "neutron":
+                key = digest(gen, run_neutron_processing.Config.BASE_DIR, "OPENMC_ENDF_DATA", gen.gen_parametre_njoy(line)[0])
+                if key:
+                    producers.setdefault(key, []).append(i)
+
+        depends = {}
+        for i, (kind, (pair, _)) in enumerate(jobs):
+            if kind == "tsl":
+                element_n = gen.gen_parametre_njoy(pair[0])[0]
+                key = digest(tsl_gen, run_tsl_processing.Config.BASE_DIR, "OPENMC_ENDF_DATA_Neutron", element_n)
+                if key in producers:
+                    depends[i] = producers[key]
+                    self.partners[jobs[i][1]] = [jobs[p][1] for p in producers[key]]
+        return depends
+
+    async def _run_job(self, job: Tuple[str, Tuple]):
+        kind, inner = job
+        if kind == "neutron":
+            return await self.neutron._process_isotope(inner)
+
+        failed = [partner for partner in self.partners.get(inner, ()) if partner in self.neutron.failed_jobs]
+        if failed:
+            gen = self.tsl._generator()
+            name = gen.gen_parametre_njoy(inner[0][1])[1]
+            partner = gen.gen_parametre_njoy(failed[0][0])[1]
+            error = job_scheduler.DependencyFailed(f"incident neutron partner {partner} failed")
+            Logger.error(f"SKIPPED {name}: {error}")
+            self.tsl.failures.fail(name, 0, error)
+            self.tsl.failed_jobs.add(inner)
+            return None
+        return await self.tsl._process_pair(inner)
+
+    def plan_jobs(self) -> List[Tuple[str, Tuple]]:
+        """("neutron" | "tsl", job) pairs still to run (see the processors' plan_jobs)."""
+        Logger.info(f"Neutron batch: {self.neutron.input_file}")
+        neutron_jobs = self.neutron.plan_jobs() or []
+        tsl_jobs = []
+        if self.tsl is not None:
+            Logger.info(f"TSL batch: {self.tsl.input_file}")
+            tsl_jobs = self.tsl.plan_jobs() or []
+        return [("neutron", job) for job in neutron_jobs] + [("tsl", job) for job in tsl_jobs]
+
+    def execute(self, context=None, jobs: Optional[List[Tuple[str, Tuple]]] = None):
+        """
+        Run the planned jobs (default: plan_jobs()). `context` is entered
+        around the job pool as in job_scheduler.run_async_queue.
+        """
+        if jobs is None:
+            Logger.header("STARTING NEUTRON + TSL PROCESSING")
+            jobs = self.plan_jobs()
+        neutron_jobs = [job for kind, job in jobs if kind == "neutron"]
+        tsl_jobs = [job for kind, job in jobs if kind == "tsl"]
+
+        if jobs:
+            costs = [self._processor(kind).predicted[job] for kind, job in jobs]
+            depends = self._partner_dependencies(jobs)
+            ranks = job_scheduler.critical_path_costs(costs, depends)
+            order = job_scheduler.order_largest_first(list(range(len(jobs))), ranks)
+            position = {old: new for new, old in enumerate(order)}
+            ordered = [jobs[i] for i in order]
+            ordered_depends = {position[i]: [position[p] for p in prerequisites]
+                               for i, prerequisites in depends.items()}
+            demands = [self._processor(kind).memory[job] for kind, job in ordered]
+
+            effective_cpu = max(1, min(self.cpu_limit, len(jobs)))
+            Logger.info(f"{len(neutron_jobs)} neutron + {len(tsl_jobs)} TSL NJOY runs in one pool, "
+                        f"{len(depends)} waiting for their incident neutron partner.")
+            makespan = job_scheduler.simulate_makespan([costs[i] for i in order], effective_cpu)
+            Logger.info(f"Predicted makespan on {effective_cpu} CPUs: {cost_model.format_duration(makespan)}")
+            governor = None
+            if self.use_governor:
+                governor = resource_governor.ResourceGovernor(effective_cpu, ceiling=self.max_jobs)
+            try:
+                job_scheduler.run_async_queue(ordered, self._run_job, effective_cpu, context=context,
+                                              governor=governor, demands=demands, depends=ordered_depends)
+            except KeyboardInterrupt:
+                self.neutron.interrupted()
+                if self.tsl is not None:
+                    self.tsl.journal.clean_in_flight()
+                return
+            # The tape cache, placement and governor are shared: reported once
+            self.neutron.summarize(governor)
+            if self.tsl is not None:
+                Logger.info(self.tsl.io_report.summary(self.tsl.scratch_root, self.tsl.output_ace))
+                self.tsl.report_failures()
+
+        self.neutron.finish()
+        if self.tsl is not None:
+            self.tsl.finish()
+
+    @property
+    def failed(self) -> bool:
+        return bool(self.neutron.failures.failed or (self.tsl is not None and self.tsl.failures.failed))
+
+
+# --- Entry Point ---
+if __name__ == "__main__":
+    start_time = time.time()
+
+    parser = argparse.ArgumentParser(description="Run NJOY on a neutron and a TSL batch file in one job pool.")
+    parser.add_argument("neutron_batch", nargs="?", default=str(Config.NEUTRON_BATCH),
+                        help="Incident neutron batch file (Default: inputs/neutron_process_batch.i)")
+    parser.add_argument("tsl_batch", nargs="?", default=str(Config.TSL_BATCH),
+                        help="TSL batch file (Default: inputs/tsl_process_batch.i)")
+    parser.add_argument("--split-temperatures", action="store_true",
+                        help="Run each temperature as its own NJOY job and stitch the ACE tables")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Do not restore or store results in the artifact cache")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Keep up-to-date ACE files and only process changed batch lines")
+    parser.add_argument("--scratch-dir", default=None,
+                        help=f"Root for per-job NJOY scratch directories, e.g. /dev/shm (Default: {scratch_space.Config.SCRATCH_ROOT})")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue interrupted batches: skip jobs completed in the journals")
+    parser.add_argument("--no-governor", action="store_true",
+                        help="Run exactly the requested number of NJOY jobs at once (no memory-aware, self-tuning concurrency)")
+    parser.add_argument("--max-jobs", type=int, default=None,
+                        help="Upper bound for the self-tuned NJOY concurrency (Default: twice the CPU count)")
+    parser.add_argument("--job-timeout", type=float, default=None, metavar="SECONDS",
+                        help="Wall-clock limit of one NJOY run, 0 for none (Default: derived from its predicted time)")
+    parser.add_argument("--stall-timeout", type=float, default=3600.0, metavar="SECONDS",
+                        help="Kill NJOY when its log and tapes have not changed for this long, 0 to disable (Default: 3600)")
+    parser.add_argument("--retries", type=int, default=2,
+                        help="Retries of a failed or killed NJOY run, with exponential backoff (Default: 2)")
+    parser.add_argument("--pin", choices=cpu_placement.MODES, default=None,
+                        help="Pin each NJOY run to one core, or to the cores of one NUMA node")
+    parser.add_argument("--binary-ace", action="store_true",
+                        help="Write binary (type 2) ACE files instead of ASCII ones")
+    args = parser.parse_args()
+
+    neutron_batch = Path(args.neutron_batch).resolve()
+    tsl_batch = Path(args.tsl_batch).resolve()
+
+    njoy_cmd = run_neutron_processing.get_njoy_cmd()
+
+    def_n_path = Config.BASE_DIR / "data" / "incident_neutron_endf"
+    def_t_path = Config.BASE_DIR / "data" / "thermal_scattering_endf"
+
+    print("-" * 50)
+    nd_n = input(f"Enter Incident Neutron data path (Default: [Internal] {def_n_path.relative_to(Config.BASE_DIR)}): ").strip()
+    nd_t = input(f"Enter Thermal Scattering data path (Default: [Internal] {def_t_path.relative_to(Config.BASE_DIR)}): ").strip()
+
+    abs_n = Path(nd_n).resolve() if nd_n else def_n_path
+    abs_t = Path(nd_t).resolve() if nd_t else def_t_path
+    for label, path in (("Neutron", abs_n), ("Thermal", abs_t)):
+        if not path.exists():
+            Logger.error(f"{label} data not found: {path}")
+            Logger.error("Tip: Run Option 1 to download data.")
+            sys.exit(1)
+
+    os.environ["OPENMC_ENDF_DATA"] = str(abs_n)
+    os.environ["OPENMC_ENDF_DATA_Neutron"] = str(abs_n)
+    os.environ["OPENMC_ENDF_DATA_Thermal"] = str(abs_t)
+
+    cpu_limit = run_neutron_processing.get_cpu_count()
+
+    options = dict(
+        split_temperatures=args.split_temperatures,
+        use_cache=not args.no_cache,
+        incremental=args.incremental,
+        resume=args.resume,
+        governor=not args.no_governor,
+        max_jobs=args.max_jobs,
+        retry=job_scheduler.RetryPolicy(args.retries, job_timeout=args.job_timeout,
+                                        stall_timeout=args.stall_timeout),
+        placement=args.pin,
+        binary_ace=args.binary_ace,
+        scratch_dir=Path(args.scratch_dir) if args.scratch_dir else None,
+    )
+    processor = CombinedProcessor(
+        run_neutron_processing.NeutronProcessor(neutron_batch, njoy_cmd, cpu_limit, **options),
+        run_tsl_processing.TSLProcessor(tsl_batch, njoy_cmd, cpu_limit, **options),
+        cpu_limit, governor=not args.no_governor, max_jobs=args.max_jobs,
+    )
+    processor.execute()
+
+    elapsed = time.time() - start_time
+    print(f"\n{Fore.GREEN}Total Time: {cost_model.format_duration(elapsed)}")
+    if processor.failed:
+        sys.exit(1)
@@ -0,0 +1,371 @@
+import sys
+import time
+import shutil
+import asyncio
+import argparse
+from pathlib import Path
+from multiprocessing import cpu_count
+from typing import Dict, List, Optional, Tuple
+from colorama import Fore, Style, init
+
+# Ensure local modules can be imported when running as a script
+current_dir = Path(__file__).resolve().parent
+if str(current_dir) not in sys.path:
+    sys.path.append(str(current_dir))
+
+try:
+    import run_neutron_processing
+    import run_tsl_processing
+    import run_all_processing
+    import job_scheduler
+    import cost_model
+    import artifact_cache
+    import resource_governor
+    import scratch_space
+    import cpu_placement
+    import workspace
+except ImportError:
+    from gennjoy import run_neutron_processing
+    from gennjoy import run_tsl_processing
+    from gennjoy import run_all_processing
+    from gennjoy import job_scheduler
+    from gennjoy import cost_model
+    from gennjoy import artifact_cache
+    from gennjoy import resource_governor
+    from gennjoy import scratch_space
+    from gennjoy import cpu_placement
+    from gennjoy import workspace
+
+# Initialize colorama
+init(autoreset=True)
+
+
+# --- Configuration & Constants ---
+class Config:
+    BASE_DIR = Path(__file__).resolve().parent
+    INPUTS_DIR = BASE_DIR / "inputs"
+
+    NEUTRON_BATCH = INPUTS_DIR / "neutron_process_batch.i"
+
+
+# --- Logging Helper ---
+class Logger:
+    @staticmethod
+    def info(msg):
+        print(f"{Fore.GREEN}[INFO] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def debug(msg):
+        print(f"{Fore.CYAN}[DEBUG] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def warn(msg):
+        print(f"{Fore.YELLOW}[WARN] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def error(msg):
+        print(f"{Fore.RED}[ERROR] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def header(msg):
+        print(f"\n{Fore.MAGENTA}{'='*60}")
+        print(f"{Fore.BLUE}{Style.BRIGHT}{msg.center(60)}")
+        print(f"{Fore.MAGENTA}{'='*60}{Style.RESET_ALL}")
+
+
+# Job of one library: (library index, "neutron" | "tsl", processor job)
+LibraryJob = Tuple[int, str, Tuple]
+
+
+# --- Multi-library Processor ---
+class MultiLibraryProcessor:
+    """
+    Builds several library workspaces (workspace.Workspace) in one NJOY job pool.
+
+    Each library keeps its own ACE files, xsdir, journal and reports; the
+    artifact cache, tape cache, CPU placement and governor are shared. A job
+    whose inputs (ENDF contents, temperatures, NJOY settings) match a job of
+    an earlier library in the same run does not run NJOY: it waits for that
+    job and restores the result from the artifact cache, so evaluations
+    that did not change between releases are processed once. TSL jobs wait
+    for the neutron jobs of their partner evaluation, in any library.
+    """
+
+    def __init__(self, builds: List[run_all_processing.CombinedProcessor], cpu_limit: int = 1,
+                 governor: bool = True, max_jobs: Optional[int] = None):
+        self.builds = builds
+        self.cpu_limit = cpu_limit
+        self.use_governor = governor
+        self.max_jobs = max_jobs
+        # One artifact cache, tape cache and CPU placement for every library
+        first = builds[0].neutron
+        for processor in self._processors():
+            processor.cache = first.cache
+            processor.tape_cache = first.tape_cache
+            if first.placement is not None:
+                processor.placement = first.placement
+        # Copy job -> the jobs of another library that build the same inputs
+        self.copies: Dict[LibraryJob, List[LibraryJob]] = {}
+        # TSL job -> neutron jobs of its partner evaluation
+        self.partners: Dict[LibraryJob, List[LibraryJob]] = {}
+        self.shared = 0
+
+    def _processors(self):
+        for build in self.builds:
+            yield build.neutron
+            if build.tsl is not None:
+                yield build.tsl
+
+    def _processor(self, job: LibraryJob):
+        index, kind, _ = job
+        return self.builds[index]._processor(kind)
+
+    def _name(self, index: int) -> str:
+        return self.builds[index].neutron.workspace.name
+
+    def _table_name(self, job: LibraryJob) -> str:
+        _, kind, (inner, _) = job
+        line = inner if kind == "neutron" else inner[1]
+        return self._processor(job)._generator().gen_parametre_njoy(line)[1]
+
+    def _deduplicate(self, jobs: List[LibraryJob]) -> List[LibraryJob]:
+        """Replace the jobs of a table already built by an earlier library with one copy job."""
+        if self.builds[0].neutron.cache is None:
+            return jobs
+        producers: Dict[Tuple[str, str], List[LibraryJob]] = {}
+        owners: Dict[Tuple[str, str], int] = {}
+        result = []
+        for job in jobs:
+            index, kind, (inner, _) = job
+            processor = self._processor(job)
+            key = processor.job_keys.get(inner)
+            if key is None or (kind == "neutron" and inner in processor.extensions):
+                result.append(job)
+                continue
+            owner = owners.setdefault((kind, key), index)
+            if owner == index:
+                producers.setdefault((kind, key), []).append(job)
+                result.append(job)
+                continue
+            copy = (index, kind, (inner, None))
+            if copy not in self.copies:
+                self.copies[copy] = producers[(kind, key)]
+                result.append(copy)
+        return result
+
+    def _partner_dependencies(self, jobs: List[LibraryJob]) -> Dict[int, List[int]]:
+        """{TSL job index: indices of the neutron jobs, of any library, processing its incident neutron ENDF file}."""
+        digests: Dict[Path, str] = {}
+
+        def digest(gen, base_dir, env_var, element):
+            endf_file = gen.resolve_endf_file(base_dir, env_var, element) if element else None
+            if endf_file is None or not endf_file.is_file():
+                return None
+            if endf_file not in digests:
+                digests[endf_file] = artifact_cache.file_digest(endf_file)
+            return digests[endf_file]
+
+        producers: Dict[str, List[int]] = {}
+        for i, job in enumerate(jobs):
+            _, kind, (line, _) = job
+            if kind == "neutron":
+                gen = self._processor(job)._generator()
+                key = digest(gen, run_neutron_processing.Config.BASE_DIR, "OPENMC_ENDF_DATA",
+                             gen.gen_parametre_njoy(line)[0])
+                if key:
+                    producers.setdefault(key, []).append(i)
+
+        depends = {}
+        for i, job in enumerate(jobs):
+            _, kind, (pair, _) = job
+            if kind == "tsl":
+                gen = self._processor(job)._generator()
+                key = digest(gen, run_tsl_processing.Config.BASE_DIR, "OPENMC_ENDF_DATA_Neutron",
+                             gen.gen_parametre_njoy(pair[0])[0])
+                if key in producers:
+                    depends[i] = producers[key]
+                    self.partners[job] = [jobs[p] for p in producers[key]]
+        return depends
+
+    async def _restore_copy(self, job: LibraryJob) -> bool:
+        """Restore a copy job's table from the artifact cache, as built by its producer."""
+        _, _, (inner, _) = job
+        processor = self._processor(job)
+        key = processor.job_keys.get(inner)
+        # Copies, rescans and hashes the whole ACE file: keep it off the event loop
+        restored = await asyncio.get_running_loop().run_in_executor(
+            None, processor._restore_from_cache, processor._generator(), inner, key
+        )
+        if not restored:
+            return False
+        self.shared += 1
+        return True
+
+    async def _run_job(self, job: LibraryJob):
+        index, kind, inner = job
+        build = self.builds[index]
+        if job in self.copies:
+            if await self._restore_copy(job):
+                return None
+            producer = self.copies[job][0]
+            Logger.warn(f"{self._name(index)}: {self._table_name(job)} not built by "
+                        f"{self._name(producer[0])}; running NJOY for it.")
+
+        if kind == "neutron":
+            return await build.neutron._process_isotope(inner)
+
+        failed = [partner for partner in self.partners.get(job, ())
+                  if partner[2] in self._processor(partner).failed_jobs]
+        if failed:
+            error = job_scheduler.DependencyFailed(
+                f"incident neutron partner {self._table_name(failed[0])} ({self._name(failed[0][0])}) failed")
+            name = self._table_name(job)
+            Logger.error(f"SKIPPED {name} ({self._name(index)}): {error}")
+            build.tsl.failures.fail(name, 0, error)
+            build.tsl.failed_jobs.add(inner)
+            return None
+        return await build.tsl._process_pair(inner)
+
+    def plan_jobs(self) -> List[LibraryJob]:
+        """Jobs still to run in every library, copies of identical inputs included."""
+        jobs = []
+        for index, build in enumerate(self.builds):
+            Logger.header(f"LIBRARY {self._name(index)}")
+            jobs.extend((index, kind, job) for kind, job in build.plan_jobs())
+        return self._deduplicate(jobs)
+
+    def execute(self):
+        Logger.header(f"BUILDING {' + '.join(self._name(i) for i in range(len(self.builds)))}")
+        jobs = self.plan_jobs()
+
+        if jobs:
+            costs = [0.0 if job in self.copies else self._processor(job).predicted.get(job[2], 0.0) for job in jobs]
+            depends = self._partner_dependencies(jobs)
+            indices = {job: i for i, job in enumerate(jobs)}
+            for job, producers in self.copies.items():
+                depends.setdefault(indices[job], []).extend(indices[p] for p in producers)
+            ranks = job_scheduler.critical_path_costs(costs, depends)
+            order = job_scheduler.order_largest_first(list(range(len(jobs))), ranks)
+            position = {old: new for new, old in enumerate(order)}
+            ordered = [jobs[i] for i in order]
+            ordered_depends = {position[i]: [position[p] for p in prerequisites]
+                               for i, prerequisites in depends.items()}
+            demands = [0.0 if job in self.copies else self._processor(job).memory.get(job[2], 0.0)
+                       for job in ordered]
+
+            runs = len(jobs) - len(self.copies)
+            effective_cpu = max(1, min(self.cpu_limit, runs))
+            Logger.info(f"{runs} NJOY runs for {len(self.builds)} libraries in one pool, "
+                        f"{len(self.copies)} tables shared between libraries.")
+            makespan = job_scheduler.simulate_makespan([costs[i] for i in order], effective_cpu)
+            Logger.info(f"Predicted makespan on {effective_cpu} CPUs: {cost_model.format_duration(makespan)}")
+            governor = None
+            if self.use_governor:
+                governor = resource_governor.ResourceGovernor(effective_cpu, ceiling=self.max_jobs)
+            try:
+                job_scheduler.run_async_queue(ordered, self._run_job, effective_cpu,
+                                              governor=governor, demands=demands, depends=ordered_depends)
+            except KeyboardInterrupt:
+                self.builds[0].neutron.interrupted()
+                for processor in self._processors():
+                    processor.journal.clean_in_flight()
+                return
+            # The tape cache, placement and governor are shared: reported once
+            self.builds[0].neutron.summarize(governor)
+            for processor in self._processors():
+                if processor is not self.builds[0].neutron:
+                    processor.report_failures()
+            Logger.info(f"Shared between libraries: {self.shared} of {len(self.copies)} tables restored "
+                        f"from another library's NJOY run.")
+
+        for processor in self._processors():
+            processor.finish()
+
+    @property
+    def failed(self) -> bool:
+        return any(build.failed for build in self.builds)
+
+
+# --- Entry Point ---
+if __name__ == "__main__":
+    start_time = time.time()
+
+    parser = argparse.ArgumentParser(
+        description="Build several ENDF library releases side by side in one NJOY job pool.")
+    parser.add_argument("libraries", nargs="+",
+                        help="Releases (VIII.1, VIII.0, VII.1 or their option 1 numbers), or names of "
+                             "workspaces under data/libraries whose ENDF directories are filled by hand")
+    parser.add_argument("--neutron-batch", default=str(Config.NEUTRON_BATCH),
+                        help="Incident neutron batch file of every library, unless its workspace has its own "
+                             f"{workspace.Config.NEUTRON_BATCH} (Default: inputs/neutron_process_batch.i)")
+    parser.add_argument("--tsl-batch", default=None,
+                        help=f"Also process this TSL batch file (or the workspace's {workspace.Config.TSL_BATCH})")
+    parser.add_argument("--no-fetch", action="store_true",
+                        help="Do not download missing releases into their workspaces")
+    parser.add_argument("--njoy", default=shutil.which("njoy") or "njoy",
+                        help="NJOY command (Default: njoy from PATH)")
+    parser.add_argument("--cpus", type=int, default=cpu_count(),
+                        help="CPUs for NJOY, shared by all libraries (Default: all)")
+    parser.add_argument("--split-temperatures", action="store_true",
+                        help="Run each temperature as its own NJOY job and stitch the ACE tables")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Do not use the artifact cache (identical tables are then built once per library)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Keep up-to-date ACE files and only process changed batch lines")
+    parser.add_argument("--scratch-dir", default=None,
+                        help=f"Root for per-job NJOY scratch directories, e.g. /dev/shm (Default: {scratch_space.Config.SCRATCH_ROOT})")
+    parser.add_argument("--no-governor", action="store_true",
+                        help="Run exactly the requested number of NJOY jobs at once (no memory-aware, self-tuning concurrency)")
+    parser.add_argument("--max-jobs", type=int, default=None,
+                        help="Upper bound for the self-tuned NJOY concurrency (Default: twice the CPU count)")
+    parser.add_argument("--job-timeout", type=float, default=None, metavar="SECONDS",
+                        help="Wall-clock limit of one NJOY run, 0 for none (Default: derived from its predicted time)")
+    parser.add_argument("--stall-timeout", type=float, default=3600.0, metavar="SECONDS",
+                        help="Kill NJOY when its log and tapes have not changed for this long, 0 to disable (Default: 3600)")
+    parser.add_argument("--retries", type=int, default=2,
+                        help="Retries of a failed or killed NJOY run, with exponential backoff (Default: 2)")
+    parser.add_argument("--pin", choices=cpu_placement.MODES, default=None,
+                        help="Pin each NJOY run to one core, or to the cores of one NUMA node")
+    parser.add_argument("--binary-ace", action="store_true",
+                        help="Write binary (type 2) ACE files instead of ASCII ones")
+    args = parser.parse_args()
+
+    workspaces = []
+    for name in args.libraries:
+        ws = workspace.Workspace(name)
+        if ws.name in [w.name for w in workspaces]:
+            continue
+        if not args.no_fetch and not ws.fetch(thermal=args.tsl_batch is not None):
+            sys.exit(1)
+        workspaces.append(ws)
+
+    options = dict(
+        split_temperatures=args.split_temperatures,
+        use_cache=not args.no_cache,
+        incremental=args.incremental,
+        governor=not args.no_governor,
+        max_jobs=args.max_jobs,
+        retry=job_scheduler.RetryPolicy(args.retries, job_timeout=args.job_timeout,
+                                        stall_timeout=args.stall_timeout),
+        placement=args.pin,
+        binary_ace=args.binary_ace,
+        scratch_dir=Path(args.scratch_dir) if args.scratch_dir else None,
+    )
+    cpu_limit = max(1, args.cpus)
+    builds = []
+    for ws in workspaces:
+        neutron = run_neutron_processing.NeutronProcessor(
+            ws.batch("neutron", Path(args.neutron_batch).resolve()), args.njoy, cpu_limit, workspace=ws, **options)
+        tsl = None
+        if args.tsl_batch is not None:
+            tsl = run_tsl_processing.TSLProcessor(
+                ws.batch("tsl", Path(args.tsl_batch).resolve()), args.njoy, cpu_limit, workspace=ws, **options)
+        builds.append(run_all_processing.CombinedProcessor(neutron, tsl, cpu_limit))
+
+    processor = MultiLibraryProcessor(builds, cpu_limit, governor=not args.no_governor, max_jobs=args.max_jobs)
+    processor.execute()
+
+    elapsed = time.time() - start_time
+    print(f"\n{Fore.GREEN}Total Time: {cost_model.format_duration(elapsed)}")
+    if processor.failed:
+        sys.exit(1)
@@ -1,10 +1,14 @@
 import sys
 import shutil
+import tempfile
+import argparse
 import time
 import os
+import asyncio
+import threading
 from pathlib import Path
-from multiprocessing import Process, cpu_count, Lock
-from typing import List
+from multiprocessing import cpu_count
+from typing import Dict, List, Optional, Tuple
 from colorama import Fore, Style, init
 
 # [UPDATED] Ensure local modules can be imported when running as a script
@@ -14,9 +18,31 @@ if str(current_dir) not in sys.path:
 
 try:
     import njoy_execution_engine
+    import njoy_decks
+    import ace_index
+    import job_scheduler
+    import cost_model
+    import artifact_cache
+    import build_state
+    import scratch_space
+    import resource_governor
+    import distributed
+    import cpu_placement
+    import ace_storage
 except ImportError:
     # Fallback if running from parent directory
     from gennjoy import njoy_execution_engine
+    from gennjoy import njoy_decks
+    from gennjoy import ace_index
+    from gennjoy import job_scheduler
+    from gennjoy import cost_model
+    from gennjoy import artifact_cache
+    from gennjoy import build_state
+    from gennjoy import scratch_space
+    from gennjoy import resource_governor
+    from gennjoy import distributed
+    from gennjoy import cpu_placement
+    from gennjoy import ace_storage
 
 # Initialize colorama
 init(autoreset=True)
@@ -37,6 +63,15 @@ class Config:
     XSDIR_TEMPLATE = BASE_DIR / "xsdir_mcnp5"
     XSDIR_MASTER = OUTPUT_ACE / "xsdir"
 
+    # Staging area for single-temperature runs (--split-temperatures)
+    PARTS_DIR = OUTPUT_ACE / ".parts"
+
+    # OpenMC library built by Option 6 (updated by --add-temperatures)
+    HDF5_LIBRARY = OUTPUT_BASE / "hdf5_library"
+
+    # Retried and failed NJOY runs of the last batch (JSON)
+    FAILURE_REPORT = OUTPUT_BASE / "reports" / "neutron_failures.json"
+
 # --- Logging Helper ---
 class Logger:
     @staticmethod
@@ -63,26 +98,111 @@ class Logger:
 
 # --- Core Processor Class ---
 class NeutronProcessor:
-    def __init__(self, input_file: Path, njoy_cmd: str, cpu_limit: int):
+    def __init__(self, input_file: Path, njoy_cmd: str, cpu_limit: int,
+                 split_temperatures: bool = False, use_cache: bool = True, incremental: bool = False,
+                 resume: bool = False, scratch_dir: Optional[Path] = None, add_temperatures: bool = False,
+                 listen: Optional[str] = None, governor: bool = True, max_jobs: Optional[int] = None,
+                 retry: Optional[job_scheduler.RetryPolicy] = None, placement: Optional[str] = None,
+                 workspace=None, binary_ace: bool = False):
         self.input_file = input_file
         self.njoy_cmd = njoy_cmd
         self.cpu_limit = cpu_limit
-        self.lock = Lock()
+        # Memory-aware, self-tuning concurrency (cpu_limit is the starting point, max_jobs the ceiling)
+        self.use_governor = governor
+        self.max_jobs = max_jobs
+        self.split_temperatures = split_temperatures
+        # Adding temperatures works on an existing output, like --incremental
+        self.add_temperatures = add_temperatures
+        self.incremental = incremental or add_temperatures
+        self.resume = resume
+        self.scratch_dir = scratch_dir
+        self.scratch_root = scratch_space.scratch_root(scratch_dir)
+        # Pin NJOY runs to a core / NUMA node ("core" or "numa"), scratch on the node's '{numa}' root
+        self.placement = cpu_placement.CPUPlacement(placement) if placement else None
+        # acer output: binary (type 2) ACE files instead of ASCII ones
+        self.ace_type = njoy_decks.ACE_BINARY if binary_ace else njoy_decks.ACE_ASCII
+        self.io_report = scratch_space.IOReport()
+        # Codec ACE files are stored with in this deployment (GENNJOY_ACE_COMPRESSION), None: uncompressed
+        try:
+            self.compression = ace_storage.check_codec(ace_storage.Config.CODEC)
+        except ValueError as e:
+            Logger.error(str(e))
+            sys.exit(1)
+        self.storage_report = ace_storage.StorageReport(self.compression)
+        # Guards the master xsdir and the ACE merges of finished runs (held in executor threads)
+        self.lock = threading.Lock()
+        self.cost_model = cost_model.CostModel()
+        self.cache = artifact_cache.ArtifactCache() if use_cache else None
+        self.tape_cache = artifact_cache.TapeCache(self.cache) if use_cache else None
+        self.job_keys: Dict[str, Optional[str]] = {}
+        # Serve jobs to `gennjoy worker` agents instead of running NJOY here
+        try:
+            self.coordinator = distributed.Coordinator(*distributed.parse_address(listen)) if listen else None
+        except ValueError as e:
+            Logger.error(str(e))
+            sys.exit(1)
+        # --add-temperatures: batch line -> (journaled temperatures, temperatures to add)
+        self.extensions: Dict[str, Tuple[List[float], List[float]]] = {}
+        # Time limits and retries of NJOY runs; failures end up in self.failure_report
+        self.retry = retry or job_scheduler.RetryPolicy()
+        self.attempts: Dict[Tuple[str, Optional[int]], int] = {}
+        self.predicted: Dict[Tuple[str, Optional[int]], float] = {}
+        self.failures = job_scheduler.FailureReport("neutron", input_file)
+        self.failed_jobs = set()
+        self.memory: Dict[Tuple[str, Optional[int]], float] = {}
+        # Called with (name, ACE path) once a table is finished (gennjoy pipeline)
+        self.on_complete = None
         
+        # Output and ENDF locations: a library workspace (workspace.Workspace), or the Config paths
+        self.workspace = workspace
+        if workspace is not None:
+            self.output_ace = workspace.neutron_ace
+            self.xsdir_master = self.output_ace / "xsdir"
+            self.parts_dir = self.output_ace / ".parts"
+            self.failure_report = workspace.reports / "neutron_failures.json"
+            self.hdf5_library = workspace.hdf5_library
+        else:
+            self.output_ace = Config.OUTPUT_ACE
+            self.xsdir_master = Config.XSDIR_MASTER
+            self.parts_dir = Config.PARTS_DIR
+            self.failure_report = Config.FAILURE_REPORT
+            self.hdf5_library = Config.HDF5_LIBRARY
+
         if not self.input_file.exists():
             Logger.error(f"Input file not found at: {self.input_file}")
             sys.exit(1)
             
         self._setup_directories()
+        self.journal = build_state.BuildJournal(self.output_ace)
+
+    def _generator(self):
+        """ACEGenerator of this batch, reading ENDF files from the workspace if there is one."""
+        gen = njoy_execution_engine.ACEGenerator(str(self.input_file))
+        if self.workspace is not None:
+            gen.endf_dirs = self.workspace.endf_dirs()
+            gen.decks_dir = self.workspace.decks
+        gen.ace_type = self.ace_type
+        gen.compression = self.compression
+        gen.storage = self.storage_report
+        return gen
 
     def _setup_directories(self):
-        Logger.debug(f"Output Directory set to: {Config.OUTPUT_ACE}")
+        Logger.debug(f"Output Directory set to: {self.output_ace}")
+
+        if self.resume and self.output_ace.exists():
+            Logger.debug("Resume mode: keeping journaled ACE files and finished temperature slices.")
+            return
+
+        if self.incremental and self.xsdir_master.exists():
+            Logger.debug("Incremental mode: keeping existing ACE files and xsdir.")
+            shutil.rmtree(self.parts_dir, ignore_errors=True)
+            return
         
-        if Config.OUTPUT_ACE.exists():
+        if self.output_ace.exists():
             Logger.debug("Cleaning previous output directory...")
             try:
                 # Only clean files, preserve directory to avoid permission issues
-                for item in Config.OUTPUT_ACE.iterdir():
+                for item in self.output_ace.iterdir():
                     if item.is_dir():
                         shutil.rmtree(item)
                     else:
@@ -90,17 +210,22 @@ class NeutronProcessor:
             except OSError as e:
                 Logger.warn(f"Could not clean directory: {e}")
         
-        Config.OUTPUT_ACE.mkdir(parents=True, exist_ok=True)
+        self.output_ace.mkdir(parents=True, exist_ok=True)
         
         if Config.XSDIR_TEMPLATE.exists():
-            shutil.copy(Config.XSDIR_TEMPLATE, Config.XSDIR_MASTER)
+            shutil.copy(Config.XSDIR_TEMPLATE, self.xsdir_master)
             Logger.debug(f"Initialized xsdir from template.")
         else:
             Logger.warn(f"Template xsdir not found at {Config.XSDIR_TEMPLATE}. Creating empty file.")
-            Config.XSDIR_MASTER.touch()
+            self.xsdir_master.touch()
 
-    def _process_isotope(self, line_data: str):
-        gen = njoy_execution_engine.ACEGenerator(str(self.input_file))
+    async def _process_isotope(self, job: Tuple[str, Optional[int]]):
+        """Process one batch line, or a single temperature of it when temp_index is set."""
+        line_data, temp_index = job
+        gen = self._generator()
+        gen.tape_cache = self.tape_cache
+        gen.time_limit = self.retry.time_limit(self.predicted.get(job, 0.0), self.attempts.get(job, 0))
+        gen.stall_limit = self.retry.stall_timeout
         
         try:
             params = gen.gen_parametre_njoy(line_data)
@@ -116,62 +241,397 @@ class NeutronProcessor:
             Logger.error(f"Error parsing line: {line_data.strip()} | {e}")
             return
 
-        ace_ascii = name
-        input_njoy = f"{name}.njoy"
-        
         base_dir_str = str(Config.BASE_DIR)
-        output_abs_path = str(Config.OUTPUT_ACE)
 
-        Logger.info(f"Processing Isotope: {name} (Element: {element})")
+        if line_data in self.extensions:
+            # Only the missing temperatures, appended to the existing table by _append_temperatures
+            run_name = f"{name}_add"
+            run_temperatures = self.extensions[line_data][1]
+            run_output = self.parts_dir / name
+            Logger.info(f"Adding {', '.join(str(t) for t in run_temperatures)} K to {name} (Element: {element})")
+        elif temp_index is None:
+            run_name = name
+            run_temperatures = temperatures
+            run_output = self.output_ace
+            Logger.info(f"Processing Isotope: {name} (Element: {element})")
+        else:
+            # Independent single-temperature run, stitched together by _merge_parts
+            run_name = f"{name}_T{temp_index + 1:02}"
+            run_temperatures = [temperatures[temp_index]]
+            run_output = self.parts_dir / name
+            Logger.info(f"Processing Isotope: {name} at {run_temperatures[0]} K (Element: {element})")
 
+        work_dir = None
         try:
-            file_ace_path = gen.run_njoy(
-                base_dir_str,
-                element,
-                name,
-                temperatures,
-                ace_ascii,
-                input_njoy,
-                self.njoy_cmd,
-                output_abs_path
-            )
-            
-            Logger.debug(f"NJOY finished for {name}. Checking ACE file...")
-
-            if file_ace_path and Path(file_ace_path).exists():
-                num_lines = []
-                for i, _ in enumerate(temperatures, 1):
-                    suffix = f".{i:02}c"
-                    matches = gen.search_string_in_file(file_ace_path, suffix)
-                    if matches:
-                        num_lines.append(str(matches[0][0]))
-                    else:
-                        Logger.warn(f"Suffix {suffix} not found inside ACE file {ace_ascii}")
-
-                with self.lock:
-                    gen.gen_xsdir(
-                        name,
-                        num_lines,
+            if self.coordinator is not None:
+                # NJOY runs on a `gennjoy worker`; its scratch directory is remote
+                self.journal.start(name, run_name, "", self.job_keys.get(line_data))
+                file_ace_path, elapsed = await self._run_remote(gen, element, run_name, run_temperatures, run_output)
+            else:
+                slot = self.placement.acquire() if self.placement else None
+                try:
+                    work_dir = scratch_space.job_dir(run_name, self._scratch_root(slot))
+                    gen.cpu_affinity = slot.cpus if slot else None
+                    self.journal.start(name, run_name, work_dir, self.job_keys.get(line_data))
+                    start = time.time()
+                    file_ace_path = await gen.run_njoy_async(
                         base_dir_str,
-                        output_abs_path,
-                        temperatures
+                        element,
+                        run_name,
+                        run_temperatures,
+                        run_name,
+                        f"{run_name}.njoy",
+                        self.njoy_cmd,
+                        str(run_output),
+                        work_dir=work_dir,
                     )
-                Logger.info(f"SUCCESS: {name} processed and merged.")
-            else:
-                Logger.error(f"ACE file missing for {name} at {file_ace_path}")
+                    elapsed = time.time() - start
+                finally:
+                    if slot is not None:
+                        self.placement.release(slot)
+                self.io_report.add(*gen.io_stats)
+            
+            self.cost_model.record(
+                "neutron", run_name, self._job_features(gen, line_data, len(run_temperatures)),
+                elapsed, gen.peak_rss_mb
+            )
+            Logger.debug(f"NJOY finished for {run_name}. Checking ACE file...")
+
+            if line_data in self.extensions:
+                old_temperatures, new_temperatures = self.extensions[line_data]
+                # Rewriting the ACE file and the HDF5 file of a heavy nuclide can take minutes
+                loop = asyncio.get_running_loop()
+                file_ace_path, new_tables = await loop.run_in_executor(
+                    None, self._append_temperatures, gen, name, file_ace_path, len(old_temperatures)
+                )
+                await self._complete_table_async(gen, line_data, name, old_temperatures + new_temperatures, file_ace_path)
+                await loop.run_in_executor(None, self._update_hdf5, name, file_ace_path, new_tables)
+                return
+
+            if temp_index is not None:
+                file_ace_path = await asyncio.get_running_loop().run_in_executor(
+                    None, self._merge_parts, gen, name, temperatures
+                )
+                if file_ace_path is None:
+                    Logger.debug(f"{run_name} done, waiting for the other temperatures of {name}.")
+                    return
+
+            await self._complete_table_async(gen, line_data, name, temperatures, file_ace_path)
 
         except Exception as e:
-            Logger.error(f"FAILED to process {name}. Error: {e}")
             # Note: Temp folder cleanup is handled in engine, but we log here if something went wrong
+            self._discard_unused_scratch(work_dir)
+            self._retry_or_fail(job, run_name, e)
+
+    def _retry_or_fail(self, job, run_name: str, error: Exception):
+        """Queue a failed NJOY run again after a backoff (job_scheduler.RetryJob), or record it as failed."""
+        attempt = self.attempts.get(job, 0) + 1
+        self.attempts[job] = attempt
+        # Missing inputs (ENDF file, NJOY executable) fail the same way every time
+        delay = self.retry.delay(attempt) if isinstance(error, RuntimeError) else None
+        if delay is None:
+            Logger.error(f"FAILED to process {run_name}. Error: {error}")
+            self.failures.fail(run_name, attempt, error)
+            self.failed_jobs.add(job)
+            return
+        Logger.warn(f"{run_name} failed (attempt {attempt}), retrying in {delay:.0f} s. Error: {str(error).splitlines()[0]}")
+        self.failures.retry(run_name, attempt, error)
+        raise job_scheduler.RetryJob(delay)
+
+    async def _run_remote(self, gen, element: str, run_name: str, run_temperatures: List[float],
+                          run_output: Path) -> Tuple[str, float]:
+        """
+        Run one NJOY job on a worker of the coordinator. Its outputs land in
+        run_output as with a local run. Returns the ACE path and the NJOY wall time.
+        """
+        endf_file = gen.resolve_endf_file(Config.BASE_DIR, "OPENMC_ENDF_DATA", element)
+        if endf_file is None or not endf_file.exists():
+            raise FileNotFoundError(f"ENDF file not found: {endf_file}")
+        spec = {"name": run_name, "temperatures": run_temperatures, "ace": run_name, "input": f"{run_name}.njoy",
+                "time_limit": gen.time_limit, "stall_limit": gen.stall_limit, "ace_type": gen.ace_type,
+                "compression": gen.compression}
+        report = await self.coordinator.run(spec, endf_file, Path(run_output))
+        gen.peak_rss_mb = report.get("peak_rss_mb")
+        Logger.debug(f"{run_name} ran on worker {report.get('worker')}.")
+        return str(Path(run_output) / run_name), report.get("elapsed", 0.0)
+
+    def _scratch_root(self, slot) -> Path:
+        """Scratch root of a run, on the NUMA node it is pinned to when the root has a '{numa}' field."""
+        if slot is None:
+            return self.scratch_root
+        return scratch_space.scratch_root(self.scratch_dir, slot.node)
+
+    def _discard_unused_scratch(self, work_dir: Optional[Path]):
+        """Remove a job's scratch dir if NJOY never ran in it (failed runs may keep theirs)."""
+        if work_dir is not None and work_dir.is_dir() and not any(work_dir.iterdir()):
+            work_dir.rmdir()
 
-    def _worker(self, lines: List[str]):
+    def _complete_table(self, gen, line_data: str, name: str, temperatures: List[float],
+                        file_ace_path: Optional[str]) -> bool:
+        """Cache, register in xsdir and journal a finished ACE file. Returns False if it is missing."""
+        if file_ace_path and Path(file_ace_path).exists():
+            self._store_in_cache(line_data, name, file_ace_path)
+            xsdir_lines = self._merge_xsdir(gen, name, file_ace_path, temperatures)
+            self._record_build(line_data, name, temperatures, xsdir_lines)
+            Logger.info(f"SUCCESS: {name} processed and merged.")
+            return True
+        Logger.error(f"ACE file missing for {name} at {file_ace_path}")
+        return False
+
+    async def _complete_table_async(self, gen, line_data: str, name: str, temperatures: List[float],
+                                    file_ace_path: Optional[str]):
+        """_complete_table in an executor thread: it copies, rescans and hashes the whole ACE file."""
+        done = await asyncio.get_running_loop().run_in_executor(
+            None, self._complete_table, gen, line_data, name, temperatures, file_ace_path
+        )
+        # Listeners (the HDF5 converter) schedule their work on the event loop
+        if done and self.on_complete is not None:
+            self.on_complete(name, Path(file_ace_path))
+
+    def _job_key(self, gen, line_data: str, temperatures: Optional[List[float]] = None) -> Optional[str]:
+        """
+        Key of a batch line: ENDF contents, temperatures (default: the line's),
+        NJOY settings and version.
+        """
+        element, _, line_temperatures = gen.gen_parametre_njoy(line_data)
+        if temperatures is None:
+            temperatures = line_temperatures
+        endf_file = gen.resolve_endf_file(Config.BASE_DIR, "OPENMC_ENDF_DATA", element) if element else None
+        if endf_file is None or not endf_file.is_file():
+            return None
+        fields = {
+            "kind": "neutron",
+            "endf": artifact_cache.file_digest(endf_file),
+            "temperatures": temperatures,
+            "error": gen.NEUTRON_ERROR,
+            "njoy": artifact_cache.njoy_version(self.njoy_cmd),
+        }
+        # ASCII tables keep the keys they had before binary output existed
+        if self.ace_type != njoy_decks.ACE_ASCII:
+            fields["ace_type"] = self.ace_type
+        return artifact_cache.cache_key(fields)
+
+    def _restore_from_cache(self, gen, line_data: str, key: str) -> bool:
+        """Restore a line's ACE file and xsdir fragment from the cache and merge it."""
+        _, name, temperatures = gen.gen_parametre_njoy(line_data)
+        dst_ace = self.output_ace / name
+        if not self.cache.fetch(key, {"ace": dst_ace, "xsdir": self.output_ace / f"{name}.xsdir"}):
+            return False
+        # Cached tables may come from a deployment with another codec
+        ace_storage.recompress(dst_ace, self.compression, self.storage_report)
+        xsdir_lines = self._merge_xsdir(gen, name, str(dst_ace), temperatures)
+        self._record_build(line_data, name, temperatures, xsdir_lines)
+        Logger.info(f"CACHED: {name} restored from artifact cache.")
+        return True
+
+    def _record_build(self, line_data: str, name: str, temperatures: List[float], xsdir_lines: List[str]):
+        """Journal a finished table (used by --incremental and --resume)."""
+        self.journal.record(name, self.job_keys.get(line_data), temperatures, xsdir_lines)
+
+    def _remove_table(self, gen, name: str):
+        """Delete a table's ACE file, its master xsdir entries and its journal record."""
+        removed = gen.remove_xsdir_entries(self.xsdir_master, name)
+        ace_file = self.output_ace / name
+        if ace_file.exists():
+            ace_file.unlink()
+        self.journal.remove(name)
+        if removed:
+            Logger.debug(f"Removed {removed} stale xsdir entries for {name}.")
+
+    def _select_changed(self, gen, lines: List[str]) -> List[str]:
+        """
+        Incremental/resume mode: keep only lines whose inputs changed since the
+        last build (or, when resuming, whose ACE file fails its checksum), and
+        drop stale tables (changed, or no longer in the batch).
+        """
+        batch_names = set()
+        pending = []
         for line in lines:
-            self._process_isotope(line)
+            name = gen.gen_parametre_njoy(line)[1]
+            batch_names.add(name)
+            if line in self.extensions or self.journal.is_current(name, self.job_keys.get(line), verify=self.resume):
+                continue
+            self._remove_table(gen, name)
+            pending.append(line)
 
-    def execute(self):
-        Logger.header("STARTING NEUTRON DATA PROCESSING")
-        
-        gen = njoy_execution_engine.ACEGenerator(str(self.input_file))
+        for name in self.journal.names():
+            if name not in batch_names:
+                Logger.info(f"Removing {name}: no longer in the batch.")
+                self._remove_table(gen, name)
+
+        label = "Resume" if self.resume else "Incremental"
+        Logger.info(f"{label}: {len(lines) - len(pending) - len(self.extensions)} up to date, "
+                    f"{len(self.extensions)} to extend, {len(pending)} to rebuild.")
+        return pending
+
+    def _select_extensions(self, gen, lines: List[str]):
+        """
+        --add-temperatures: find batch lines whose journaled table was built from
+        the same ENDF file and settings at a subset of the line's temperatures.
+        Only the missing temperatures of those lines are run; every other
+        changed line is rebuilt as in --incremental.
+        """
+        self.extensions = {}
+        for line in lines:
+            _, name, temperatures = gen.gen_parametre_njoy(line)
+            entry = self.journal.get(name)
+            if not entry:
+                continue
+            old = entry.get("temperatures", [])
+            new = [t for t in temperatures if t not in old]
+            # Nothing to add, or temperatures were dropped: not an extension
+            if not new or len(old) + len(new) != len(temperatures):
+                continue
+            if not self.journal.is_current(name, self._job_key(gen, line, old), verify=self.resume):
+                continue
+            self.extensions[line] = (old, new)
+            # The extended table holds the old temperatures first, then the new ones
+            self.job_keys[line] = self._job_key(gen, line, old + new)
+
+    def _append_temperatures(self, gen, name: str, new_ace: str, num_old: int) -> Tuple[str, List[str]]:
+        """
+        Append the tables of an --add-temperatures run to the ACE file of `name`
+        as the next .NNc tables and drop its master xsdir entries, which
+        _complete_table then writes again for all temperatures. Returns the ACE
+        path and the names of the appended tables.
+        """
+        part_dir = self.parts_dir / name
+        dst_ace = self.output_ace / name
+        fragment = self.output_ace / f"{name}.xsdir"
+        with self.lock:
+            # xsdir fragment of the whole table: journaled lines, then the new ones
+            with open(fragment, "w") as f:
+                f.writelines(self.journal.get(name).get("xsdir", []))
+            new_tables = gen.append_temperature_tables(
+                dst_ace, new_ace, part_dir / f"{name}_add.xsdir", fragment, num_old + 1, "c"
+            )
+            gen.remove_xsdir_entries(self.xsdir_master, name)
+        shutil.rmtree(part_dir, ignore_errors=True)
+        return str(dst_ace), new_tables
+
+    def _update_hdf5(self, name: str, file_ace_path: str, tables: List[str]):
+        """Add appended temperature tables to the nuclide's HDF5 file, if the library has one."""
+        if not self.hdf5_library.is_dir():
+            return
+        try:
+            try:
+                import compile_openmc_library
+            except ImportError:
+                from gennjoy import compile_openmc_library
+        except (ImportError, SystemExit):
+            Logger.warn(f"OpenMC not available: rerun Option 6 to add the new temperatures of {name} to the HDF5 library.")
+            return
+        try:
+            h5_file = compile_openmc_library.add_temperatures(file_ace_path, tables, self.hdf5_library)
+        except Exception as e:
+            Logger.warn(f"Could not update the HDF5 library for {name}: {e}")
+            return
+        if h5_file is not None:
+            Logger.info(f"HDF5: added {', '.join(tables)} to {h5_file.name}.")
+
+    def _recover_interrupted(self, gen, lines: List[str]):
+        """
+        Resume mode: remove the scratch directories of runs that were in flight
+        when the previous batch stopped, and any finished temperature slices
+        that were produced from different inputs than the current batch line.
+        """
+        interrupted = self.journal.clean_in_flight()
+        if interrupted:
+            Logger.info(f"Journal: {len(interrupted)} NJOY runs of the previous batch did not complete.")
+
+        current = {gen.gen_parametre_njoy(line)[1]: self.job_keys.get(line) for line in lines}
+        started = {rec["name"]: rec.get("key") for rec in interrupted.values()}
+        if self.parts_dir.exists():
+            for part_dir in self.parts_dir.iterdir():
+                key = started.get(part_dir.name)
+                if key is None or key != current.get(part_dir.name):
+                    shutil.rmtree(part_dir, ignore_errors=True)
+
+    def _store_in_cache(self, line_data: str, name: str, file_ace_path: str):
+        key = self.job_keys.get(line_data)
+        if self.cache is None or key is None:
+            return
+        try:
+            self.cache.store(
+                key,
+                {"ace": Path(file_ace_path), "xsdir": self.output_ace / f"{name}.xsdir"},
+                meta={"kind": "neutron", "name": name},
+            )
+        except OSError as e:
+            Logger.warn(f"Could not cache {name}: {e}")
+
+    def _part_files(self, name: str, num_temperatures: int) -> List[Tuple[Path, Path]]:
+        """(ACE, xsdir) outputs of each single-temperature run of `name`."""
+        part_dir = self.parts_dir / name
+        return [
+            (part_dir / f"{name}_T{i:02}", part_dir / f"{name}_T{i:02}.xsdir")
+            for i in range(1, num_temperatures + 1)
+        ]
+
+    def _merge_parts(self, gen, name: str, temperatures: List[float]) -> Optional[str]:
+        """
+        Stitch the single-temperature runs of `name` into one ACE file once the
+        last of them has finished. Returns the ACE path, or None if runs are pending.
+        """
+        part_dir = self.parts_dir / name
+        parts = self._part_files(name, len(temperatures))
+
+        with self.lock:
+            # xsdir is moved after the ACE file, so it marks a finished run
+            if not all(ace.exists() and xsdir.exists() for ace, xsdir in parts):
+                return None
+            dst_ace = self.output_ace / name
+            gen.merge_temperature_parts(parts, dst_ace, self.output_ace / f"{name}.xsdir", "c")
+            shutil.rmtree(part_dir)
+
+        return str(dst_ace)
+
+    def _merge_xsdir(self, gen, name: str, file_ace_path: str, temperatures: List[float]) -> List[str]:
+        """
+        Locate each temperature's table in the ACE file and format its xsdir
+        entries. Returns them for the journal, from which write_xsdir builds
+        the master xsdir.
+        """
+        # One pass over the ACE file indexes every table (ace_index)
+        index = ace_index.tables_by_suffix(file_ace_path)
+        tables = []
+        for i, _ in enumerate(temperatures, 1):
+            suffix = f"{i:02}c"
+            if suffix not in index:
+                Logger.warn(f"Table .{suffix} not found inside ACE file {name}")
+            tables.append(index.get(suffix))
+
+        return gen.gen_xsdir(
+            name,
+            tables,
+            str(Config.BASE_DIR),
+            str(self.output_ace),
+            temperatures
+        )
+
+    def _run_temperature_count(self, line_data: str, temp_index: Optional[int]) -> Optional[int]:
+        """Temperatures in one NJOY run (None: all of the line's)."""
+        if temp_index is not None:
+            return 1
+        if line_data in self.extensions:
+            return len(self.extensions[line_data][1])
+        return None
+
+    def _job_features(self, gen, line_data: str, num_temperatures: Optional[int] = None) -> Dict[str, float]:
+        """Cost-model features of one batch line (ENDF size, resonances, temperatures)."""
+        element, _, temperatures = gen.gen_parametre_njoy(line_data)
+        endf_file = gen.resolve_endf_file(Config.BASE_DIR, "OPENMC_ENDF_DATA", element) if element else None
+        if num_temperatures is None:
+            num_temperatures = len(temperatures)
+        return cost_model.job_features([endf_file] if endf_file else [], num_temperatures)
+
+    def plan_jobs(self) -> Optional[List[Tuple[str, Optional[int]]]]:
+        """
+        Prepare the output and return the NJOY jobs still to run, with their
+        predicted time and memory in self.predicted / self.memory. None if the
+        batch file cannot be used.
+        """
+        gen = self._generator()
         
         Logger.debug(f"Reading input file: {self.input_file}")
         try:
@@ -179,37 +639,199 @@ class NeutronProcessor:
             lines = [line for _, line in matches]
         except Exception as e:
             Logger.error(f"Failed to read input file: {e}")
-            return
+            return None
         
         total_isotopes = len(lines)
         if total_isotopes == 0:
             Logger.error("No isotopes found in input file! Check if lines start with 'element'.")
-            return
+            return None
 
         Logger.info(f"Found {total_isotopes} isotopes to process.")
-        
-        procs = []
-        effective_cpu = min(self.cpu_limit, total_isotopes)
-        effective_cpu = max(1, effective_cpu)
-        
-        chunk_size = total_isotopes // effective_cpu + (1 if total_isotopes % effective_cpu else 0)
-        
-        for i in range(effective_cpu):
-            start = i * chunk_size
-            end = start + chunk_size
-            chunk = lines[start:end]
-            if not chunk: continue
-            
-            p = Process(target=self._worker, args=(chunk,))
-            procs.append(p)
-            p.start()
-        
-        for p in procs:
-            p.join()
+
+        # Input fingerprints, used by the artifact cache and the build journal
+        self.job_keys = {line: self._job_key(gen, line) for line in lines}
+
+        if self.resume:
+            self._recover_interrupted(gen, lines)
+
+        if self.add_temperatures:
+            self._select_extensions(gen, lines)
+
+        if self.incremental or self.resume:
+            lines = self._select_changed(gen, lines)
+            # Master xsdir = template + journaled entries, dropping anything half-written
+            self.write_xsdir()
+            self.journal.compact()
+
+        # Restore unchanged isotopes from the artifact cache; only misses run NJOY
+        if self.cache is not None:
+            pending = []
+            for line in lines:
+                key = self.job_keys.get(line)
+                if key and self._restore_from_cache(gen, line, key):
+                    continue
+                pending.append(line)
+            Logger.info(f"Artifact cache: {len(lines) - len(pending)} hits, {len(pending)} to process.")
+            lines = pending
+
+        # One job per line, or one per temperature when splitting
+        jobs = []
+        for line in lines:
+            _, name, temperatures = gen.gen_parametre_njoy(line)
+            num_temps = len(temperatures)
+            if self.split_temperatures and num_temps > 1:
+                # Slices finished before an interruption are kept by --resume
+                parts = self._part_files(name, num_temps)
+                pending = [i for i, (ace, xsdir) in enumerate(parts) if not (ace.exists() and xsdir.exists())]
+                if pending:
+                    jobs.extend((line, i) for i in pending)
+                else:
+                    file_ace_path = self._merge_parts(gen, name, temperatures)
+                    if self._complete_table(gen, line, name, temperatures, file_ace_path) and self.on_complete:
+                        self.on_complete(name, Path(file_ace_path))
+            else:
+                jobs.append((line, None))
+        # Tables extended by --add-temperatures: one NJOY run at the new temperatures
+        jobs.extend((line, None) for line in self.extensions)
+        if self.split_temperatures:
+            Logger.info(f"Temperature splitting enabled: {len(jobs)} NJOY runs.")
+
+        # Predicted NJOY wall time (ordering, time limits) and peak memory (governor admission)
+        predictions = [
+            self.cost_model.predict("neutron", self._job_features(gen, line, self._run_temperature_count(line, i)))
+            for line, i in jobs
+        ]
+        self.predicted = {job: seconds for job, (seconds, _) in zip(jobs, predictions)}
+        self.memory = {job: memory for job, (_, memory) in zip(jobs, predictions)}
+        return jobs
+
+    def summarize(self, governor=None):
+        """End-of-batch reports; writes self.failure_report."""
+        if self.coordinator is None:
+            Logger.info(self.io_report.summary(self.scratch_root, self.output_ace))
+            if self.tape_cache is not None:
+                Logger.info(self.tape_cache.summary())
+            if self.placement is not None:
+                Logger.info(self.placement.summary())
+        if self.compression is not None:
+            Logger.info(self.storage_report.summary())
+        if governor is not None:
+            Logger.info(governor.summary())
+        self.report_failures()
+
+    def report_failures(self):
+        report = self.failures.write(self.failure_report)
+        if self.failures.failed:
+            Logger.error(f"{len(self.failures.failed)} NJOY run(s) failed: "
+                         f"{', '.join(f['run'] for f in self.failures.failed)}. See {report}")
+
+    def write_xsdir(self):
+        """Write the master xsdir: template, then every journaled table's entries sorted by ZAID."""
+        with self.lock:
+            duplicates = self.journal.write_xsdir(Config.XSDIR_TEMPLATE, self.xsdir_master)
+        if duplicates:
+            Logger.warn(f"ZAIDs provided by several tables (the last one is kept): "
+                        f"{', '.join(sorted(set(duplicates))[:10])}{' ...' if len(set(duplicates)) > 10 else ''}")
+
+    def interrupted(self):
+        self.journal.clean_in_flight()
+        self.write_xsdir()
+        Logger.warn("Interrupted: running NJOY jobs were stopped and their scratch directories removed.")
+        Logger.warn("Run again with --resume to continue with the unfinished jobs.")
+
+    def finish(self):
+        self.write_xsdir()
+        if self.cache is not None:
+            if self.cache.shared is not None:
+                Logger.info(self.cache.summary())
+            freed = self.cache.evict()
+            if freed:
+                Logger.debug(f"Artifact cache: evicted {freed / 1e9:.2f} GB (LRU).")
             
         Logger.header("PROCESSING FINISHED")
-        print(f"Check output at: {Config.OUTPUT_ACE}")
-        print(f"Check xsdir at:  {Config.XSDIR_MASTER}")
+        print(f"Check output at: {self.output_ace}")
+        print(f"Check xsdir at:  {self.xsdir_master}")
+
+    def execute(self):
+        Logger.header("STARTING NEUTRON DATA PROCESSING")
+
+        jobs = self.plan_jobs()
+        if jobs is None:
+            return
+
+        if jobs:
+            # Largest jobs first (predicted NJOY wall time), started in that order as
+            # NJOY slots free up, so heavy actinides never queue behind each other.
+            costs = [self.predicted[job] for job in jobs]
+            ordered = job_scheduler.order_largest_first(jobs, costs)
+            demands = [self.memory[job] for job in ordered]
+            effective_cpu = max(1, min(self.cpu_limit, len(jobs)))
+            makespan = job_scheduler.simulate_makespan(sorted(costs, reverse=True), effective_cpu)
+            Logger.info(f"Predicted makespan on {effective_cpu} CPUs: {cost_model.format_duration(makespan)}")
+            # With workers, every job is queued at once; the coordinator hands them
+            # out, in order, as worker slots free up
+            limit = len(jobs) if self.coordinator is not None else effective_cpu
+            governor = None
+            if self.use_governor and self.coordinator is None:
+                governor = resource_governor.ResourceGovernor(effective_cpu, ceiling=self.max_jobs)
+            try:
+                job_scheduler.run_async_queue(ordered, self._process_isotope, limit, context=self.coordinator,
+                                              governor=governor, demands=demands)
+            except KeyboardInterrupt:
+                self.interrupted()
+                return
+            self.summarize(governor)
+
+        self.finish()
+
+# --- Placement Benchmark ---
+def benchmark_placement(input_file: Path, njoy_cmd: str, cpu_limit: int, mode: str,
+                        scratch_dir: Optional[Path] = None) -> Dict[str, float]:
+    """
+    Run every line of a batch through NJOY unpinned, then pinned per `mode`,
+    with a fixed concurrency and no caches, and compare the throughput. The
+    ACE files go to throwaway directories. Returns {mode: wall seconds}.
+    """
+    Logger.header("PLACEMENT BENCHMARK")
+    gen = njoy_execution_engine.ACEGenerator(str(input_file))
+    lines = [line for _, line in gen.search_string_in_file(gen.filename, "element")]
+    if not lines:
+        Logger.error("No isotopes found in input file! Check if lines start with 'element'.")
+        return {}
+
+    results = {}
+    for label in ("unpinned", mode):
+        placement = cpu_placement.CPUPlacement(mode) if label == mode else None
+        out_dir = Path(tempfile.mkdtemp(prefix="gennjoy-bench-", dir=scratch_space.scratch_root(scratch_dir)))
+
+        async def run_line(line_data):
+            run_gen = njoy_execution_engine.ACEGenerator(str(input_file))
+            element, name, temperatures = run_gen.gen_parametre_njoy(line_data)
+            slot = placement.acquire() if placement else None
+            try:
+                root = scratch_space.scratch_root(scratch_dir, slot.node if slot else 0)
+                run_gen.cpu_affinity = slot.cpus if slot else None
+                await run_gen.run_njoy_async(
+                    str(Config.BASE_DIR), element, name, temperatures, name, f"{name}.njoy",
+                    njoy_cmd, str(out_dir), work_dir=scratch_space.job_dir(name, root),
+                )
+            finally:
+                if slot is not None:
+                    placement.release(slot)
+
+        Logger.info(f"Running {len(lines)} NJOY jobs {label} on {cpu_limit} CPUs...")
+        start = time.time()
+        try:
+            job_scheduler.run_async_queue(lines, run_line, cpu_limit)
+        finally:
+            shutil.rmtree(out_dir, ignore_errors=True)
+        results[label] = time.time() - start
+
+    base = results["unpinned"]
+    for label, seconds in results.items():
+        print(f"  {label:<9} {seconds:9.1f} s  {3600 * len(lines) / max(seconds, 1e-9):8.1f} jobs/h  "
+              f"x{base / max(seconds, 1e-9):.2f}")
+    return results
 
 # --- Helpers ---
 def get_njoy_cmd():
@@ -240,11 +862,43 @@ def get_cpu_count():
 if __name__ == "__main__":
     start_time = time.time()
     
-    if len(sys.argv) < 2:
-        Logger.error("Usage: python run_neutron_processing.py <input_file>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Run NJOY on an incident neutron batch file.")
+    parser.add_argument("input_file", help="Batch file (e.g. inputs/neutron_process_batch.i)")
+    parser.add_argument("--split-temperatures", action="store_true",
+                        help="Run each temperature as its own NJOY job and stitch the ACE tables")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Do not restore or store results in the artifact cache")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Keep up-to-date ACE files and only process changed batch lines")
+    parser.add_argument("--scratch-dir", default=None,
+                        help=f"Root for per-job NJOY scratch directories, e.g. /dev/shm (Default: {scratch_space.Config.SCRATCH_ROOT})")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted batch: skip jobs completed in the journal")
+    parser.add_argument("--no-governor", action="store_true",
+                        help="Run exactly the requested number of NJOY jobs at once (no memory-aware, self-tuning concurrency)")
+    parser.add_argument("--max-jobs", type=int, default=None,
+                        help="Upper bound for the self-tuned NJOY concurrency (Default: twice the CPU count)")
+    parser.add_argument("--add-temperatures", action="store_true",
+                        help="Only run NJOY for temperatures missing from existing tables and append them")
+    parser.add_argument("--listen", default=None, metavar="HOST:PORT",
+                        help="Serve the jobs to `gennjoy worker` agents instead of running NJOY on this machine "
+                             "(a HOST other than 127.0.0.1 needs GENNJOY_CLUSTER_TOKEN)")
+    parser.add_argument("--job-timeout", type=float, default=None, metavar="SECONDS",
+                        help=f"Wall-clock limit of one NJOY run, 0 for none (Default: {job_scheduler.RetryPolicy.TIMEOUT_FACTOR:g}x "
+                             f"its predicted time, at least {job_scheduler.RetryPolicy.MIN_TIMEOUT:g} s)")
+    parser.add_argument("--stall-timeout", type=float, default=3600.0, metavar="SECONDS",
+                        help="Kill NJOY when its log and tapes have not changed for this long, 0 to disable (Default: 3600)")
+    parser.add_argument("--retries", type=int, default=2,
+                        help="Retries of a failed or killed NJOY run, with exponential backoff (Default: 2)")
+    parser.add_argument("--pin", choices=cpu_placement.MODES, default=None,
+                        help="Pin each NJOY run to one core, or to the cores of one NUMA node")
+    parser.add_argument("--binary-ace", action="store_true",
+                        help="Write binary (type 2) ACE files instead of ASCII ones")
+    parser.add_argument("--benchmark-placement", action="store_true",
+                        help="Only compare unpinned and pinned (--pin, default numa) throughput on this batch")
+    args = parser.parse_args()
         
-    input_file_path = Path(sys.argv[1]).resolve()
+    input_file_path = Path(args.input_file).resolve()
     
     njoy_cmd = get_njoy_cmd()
     
@@ -276,9 +930,29 @@ if __name__ == "__main__":
     Logger.debug(f"OPENMC_ENDF_DATA set to: {os.environ['OPENMC_ENDF_DATA']}")
 
     cpu_limit = get_cpu_count()
+
+    if args.benchmark_placement:
+        benchmark_placement(input_file_path, njoy_cmd, cpu_limit, args.pin or "numa",
+                            Path(args.scratch_dir) if args.scratch_dir else None)
+        sys.exit(0)
     
-    processor = NeutronProcessor(input_file_path, njoy_cmd, cpu_limit)
+    processor = NeutronProcessor(input_file_path, njoy_cmd, cpu_limit,
+                                 split_temperatures=args.split_temperatures,
+                                 use_cache=not args.no_cache,
+                                 incremental=args.incremental,
+                                 resume=args.resume,
+                                 governor=not args.no_governor,
+                                 max_jobs=args.max_jobs,
+                                 add_temperatures=args.add_temperatures,
+                                 listen=args.listen,
+                                 placement=args.pin,
+                                 binary_ace=args.binary_ace,
+                                 retry=job_scheduler.RetryPolicy(args.retries, job_timeout=args.job_timeout,
+                                                                 stall_timeout=args.stall_timeout),
+                                 scratch_dir=Path(args.scratch_dir) if args.scratch_dir else None)
     processor.execute()
     
     elapsed = time.time() - start_time
-    print(f"\n{Fore.GREEN}Total Time: {time.strftime('%Hh:%Mm:%Ss', time.gmtime(elapsed))}")
\ No newline at end of file
+    print(f"\n{Fore.GREEN}Total Time: {time.strftime('%Hh:%Mm:%Ss', time.gmtime(elapsed))}")
+    if processor.failures.failed:
+        sys.exit(1)
\ No newline at end of file
@@ -1,11 +1,14 @@
 import sys
 import shutil
+import argparse
 import time
 import json
 import os
+import asyncio
+import threading
 from pathlib import Path
-from multiprocessing import Process, cpu_count, Lock
-from typing import List, Tuple, Dict
+from multiprocessing import cpu_count
+from typing import List, Optional, Tuple, Dict
 from colorama import Fore, Style, init
 
 # [UPDATED] Ensure local modules can be imported when running as a script
@@ -15,9 +18,29 @@ if str(current_dir) not in sys.path:
 
 try:
     import njoy_execution_engine
+    import njoy_decks
+    import ace_index
+    import job_scheduler
+    import cost_model
+    import artifact_cache
+    import build_state
+    import scratch_space
+    import resource_governor
+    import cpu_placement
+    import ace_storage
 except ImportError:
     # Fallback if running from parent directory
     from gennjoy import njoy_execution_engine
+    from gennjoy import njoy_decks
+    from gennjoy import ace_index
+    from gennjoy import job_scheduler
+    from gennjoy import cost_model
+    from gennjoy import artifact_cache
+    from gennjoy import build_state
+    from gennjoy import scratch_space
+    from gennjoy import resource_governor
+    from gennjoy import cpu_placement
+    from gennjoy import ace_storage
 
 # Initialize colorama
 init(autoreset=True)
@@ -39,6 +62,12 @@ class Config:
     XSDIR_MASTER = OUTPUT_ACE / "xsdir"
     TEMP_DICT_FILE = BASE_DIR / "temperature_index.json"
 
+    # Staging area for single-temperature runs (--split-temperatures)
+    PARTS_DIR = OUTPUT_ACE / ".parts"
+
+    # Retried and failed NJOY runs of the last batch (JSON)
+    FAILURE_REPORT = OUTPUT_BASE / "reports" / "tsl_failures.json"
+
 # --- Logging Helper ---
 class Logger:
     @staticmethod
@@ -65,18 +94,71 @@ class Logger:
 
 # --- Core Processor Class ---
 class TSLProcessor:
-    def __init__(self, input_file: Path, njoy_cmd: str, cpu_limit: int):
+    def __init__(self, input_file: Path, njoy_cmd: str, cpu_limit: int,
+                 split_temperatures: bool = False, use_cache: bool = True, incremental: bool = False,
+                 resume: bool = False, scratch_dir: Optional[Path] = None,
+                 governor: bool = True, max_jobs: Optional[int] = None,
+                 retry: Optional[job_scheduler.RetryPolicy] = None, placement: Optional[str] = None,
+                 workspace=None, binary_ace: bool = False):
         self.input_file = input_file
         self.njoy_cmd = njoy_cmd
         self.cpu_limit = cpu_limit
-        self.lock = Lock()
+        # Memory-aware, self-tuning concurrency (cpu_limit is the starting point, max_jobs the ceiling)
+        self.use_governor = governor
+        self.max_jobs = max_jobs
+        self.split_temperatures = split_temperatures
+        self.incremental = incremental
+        self.resume = resume
+        self.scratch_dir = scratch_dir
+        self.scratch_root = scratch_space.scratch_root(scratch_dir)
+        # Pin NJOY runs to a core / NUMA node ("core" or "numa"), scratch on the node's '{numa}' root
+        self.placement = cpu_placement.CPUPlacement(placement) if placement else None
+        # acer output: binary (type 2) ACE files instead of ASCII ones
+        self.ace_type = njoy_decks.ACE_BINARY if binary_ace else njoy_decks.ACE_ASCII
+        self.io_report = scratch_space.IOReport()
+        # Codec ACE files are stored with in this deployment (GENNJOY_ACE_COMPRESSION), None: uncompressed
+        try:
+            self.compression = ace_storage.check_codec(ace_storage.Config.CODEC)
+        except ValueError as e:
+            Logger.error(str(e))
+            sys.exit(1)
+        self.storage_report = ace_storage.StorageReport(self.compression)
+        # Guards the master xsdir and the ACE merges of finished runs (held in executor threads)
+        self.lock = threading.Lock()
+        self.cost_model = cost_model.CostModel()
+        self.cache = artifact_cache.ArtifactCache() if use_cache else None
+        self.tape_cache = artifact_cache.TapeCache(self.cache) if use_cache else None
+        self.job_keys: Dict[Tuple[str, str], Optional[str]] = {}
         self.temp_dict = self._load_temp_dict()
+        # Time limits and retries of NJOY runs; failures end up in self.failure_report
+        self.retry = retry or job_scheduler.RetryPolicy()
+        self.attempts: Dict[Tuple[Tuple[str, str], Optional[int]], int] = {}
+        self.predicted: Dict[Tuple[Tuple[str, str], Optional[int]], float] = {}
+        self.failures = job_scheduler.FailureReport("tsl", input_file)
+        self.failed_jobs = set()
+        self.memory: Dict[Tuple[Tuple[str, str], Optional[int]], float] = {}
+        # Called with (name, ACE path) once a table is finished (gennjoy pipeline)
+        self.on_complete = None
         
+        # Output and ENDF locations: a library workspace (workspace.Workspace), or the Config paths
+        self.workspace = workspace
+        if workspace is not None:
+            self.output_ace = workspace.tsl_ace
+            self.xsdir_master = self.output_ace / "xsdir"
+            self.parts_dir = self.output_ace / ".parts"
+            self.failure_report = workspace.reports / "tsl_failures.json"
+        else:
+            self.output_ace = Config.OUTPUT_ACE
+            self.xsdir_master = Config.XSDIR_MASTER
+            self.parts_dir = Config.PARTS_DIR
+            self.failure_report = Config.FAILURE_REPORT
+
         if not self.input_file.exists():
             Logger.error(f"Input file not found at: {self.input_file}")
             sys.exit(1)
             
         self._setup_directories()
+        self.journal = build_state.BuildJournal(self.output_ace)
 
     def _load_temp_dict(self) -> Dict:
         """Load the temperature dictionary safely."""
@@ -91,15 +173,35 @@ class TSLProcessor:
             Logger.error(f"Failed to load JSON dictionary: {e}")
             sys.exit(1)
 
+    def _generator(self):
+        """ACEGenerator of this batch, reading ENDF files from the workspace if there is one."""
+        gen = njoy_execution_engine.ACEGenerator(str(self.input_file))
+        if self.workspace is not None:
+            gen.endf_dirs = self.workspace.endf_dirs()
+            gen.decks_dir = self.workspace.decks
+        gen.ace_type = self.ace_type
+        gen.compression = self.compression
+        gen.storage = self.storage_report
+        return gen
+
     def _setup_directories(self):
         """Prepare output directories and initialize xsdir."""
-        Logger.debug(f"Output Directory set to: {Config.OUTPUT_ACE}")
+        Logger.debug(f"Output Directory set to: {self.output_ace}")
+
+        if self.resume and self.output_ace.exists():
+            Logger.debug("Resume mode: keeping journaled ACE files and finished temperature slices.")
+            return
+
+        if self.incremental and self.xsdir_master.exists():
+            Logger.debug("Incremental mode: keeping existing ACE files and xsdir.")
+            shutil.rmtree(self.parts_dir, ignore_errors=True)
+            return
         
-        if Config.OUTPUT_ACE.exists():
+        if self.output_ace.exists():
             Logger.debug("Cleaning previous TSL output directory...")
             try:
                  # Only clean files, preserve directory
-                for item in Config.OUTPUT_ACE.iterdir():
+                for item in self.output_ace.iterdir():
                     if item.is_dir():
                         shutil.rmtree(item)
                     else:
@@ -107,14 +209,14 @@ class TSLProcessor:
             except OSError as e:
                 Logger.warn(f"Could not clean directory: {e}")
         
-        Config.OUTPUT_ACE.mkdir(parents=True, exist_ok=True)
+        self.output_ace.mkdir(parents=True, exist_ok=True)
         
         if Config.XSDIR_TEMPLATE.exists():
-            shutil.copy(Config.XSDIR_TEMPLATE, Config.XSDIR_MASTER)
+            shutil.copy(Config.XSDIR_TEMPLATE, self.xsdir_master)
             Logger.debug(f"Initialized xsdir from template.")
         else:
             Logger.warn(f"Template xsdir not found. Creating empty file.")
-            Config.XSDIR_MASTER.touch()
+            self.xsdir_master.touch()
 
     def _validate_temperatures(self, element_t: str, requested_temps: List[float]) -> List[float]:
         """Check if requested temperatures exist in the dictionary."""
@@ -140,10 +242,15 @@ class TSLProcessor:
         
         return valid_temps if valid_temps else requested_temps # Fallback to requested if filtering fails completely
 
-    def _process_pair(self, pair: Tuple[str, str]):
-        """Process a single (Neutron Line, Thermal Line) pair."""
+    async def _process_pair(self, job: Tuple[Tuple[str, str], Optional[int]]):
+        """Process a single (Neutron Line, Thermal Line) pair, or one temperature of it."""
+        pair, temp_index = job
         line_n, line_t = pair
-        gen = njoy_execution_engine.ACEGenerator(str(self.input_file))
+        gen = self._generator()
+        gen.tape_cache = self.tape_cache
+        gen.time_limit = self.retry.time_limit(self.predicted.get(job, 0.0), self.attempts.get(job, 0))
+        gen.stall_limit = self.retry.stall_timeout
+        work_dir = None
         
         try:
             # Parse Parameters
@@ -166,65 +273,290 @@ class TSLProcessor:
                 Logger.error(f"No valid temperatures found for {element_t}. Skipping.")
                 return
 
-            ace_ascii = name
-            input_njoy = f"{name}.njoy"
-            
             base_dir_str = str(Config.BASE_DIR)
-            output_abs_path = str(Config.OUTPUT_ACE)
 
-            Logger.info(f"Processing TSL: {name} (N:{element_n} + T:{element_t})")
+            if temp_index is None:
+                run_name = name
+                run_temps = valid_temps
+                run_output = self.output_ace
+                Logger.info(f"Processing TSL: {name} (N:{element_n} + T:{element_t})")
+            else:
+                # Independent single-temperature run, stitched together by _merge_parts
+                run_name = f"{name}_T{temp_index + 1:02}"
+                run_temps = [valid_temps[temp_index]]
+                run_output = self.parts_dir / name
+                Logger.info(f"Processing TSL: {name} at {run_temps[0]} K (N:{element_n} + T:{element_t})")
 
             # 1. Run NJOY TSL
-            file_ace_path = gen.run_njoy_tsl(
-                base_dir_str,
-                element_n,
-                element_t,
-                name,
-                valid_temps,
-                ace_ascii,
-                input_njoy,
-                self.njoy_cmd,
-                output_abs_path
-            )
+            slot = self.placement.acquire() if self.placement else None
+            try:
+                work_dir = scratch_space.job_dir(run_name, self._scratch_root(slot))
+                gen.cpu_affinity = slot.cpus if slot else None
+                self.journal.start(name, run_name, work_dir, self.job_keys.get(pair))
+                start = time.time()
+                file_ace_path = await gen.run_njoy_tsl_async(
+                    base_dir_str,
+                    element_n,
+                    element_t,
+                    run_name,
+                    run_temps,
+                    run_name,
+                    f"{run_name}.njoy",
+                    self.njoy_cmd,
+                    str(run_output),
+                    work_dir=work_dir,
+                )
+            finally:
+                if slot is not None:
+                    self.placement.release(slot)
+            self.io_report.add(*gen.io_stats)
             
+            self.cost_model.record(
+                "tsl", run_name, self._job_features(gen, pair, len(run_temps)),
+                time.time() - start, gen.peak_rss_mb
+            )
+
+            if temp_index is not None:
+                file_ace_path = await asyncio.get_running_loop().run_in_executor(
+                    None, self._merge_parts, gen, name, valid_temps
+                )
+                if file_ace_path is None:
+                    Logger.debug(f"{run_name} done, waiting for the other temperatures of {name}.")
+                    return
+
             # 2. Check and Merge XSDIR
-            if file_ace_path and Path(file_ace_path).exists():
-                # Find line numbers in ACE file
-                num_lines = []
-                for i, _ in enumerate(valid_temps, 1):
-                    suffix = f".{i:02}t" # TSL suffix is usually .0xt
-                    matches = gen.search_string_in_file(file_ace_path, suffix)
-                    if matches:
-                        num_lines.append(str(matches[0][0]))
-                    else:
-                        Logger.warn(f"Suffix {suffix} not found inside ACE file {ace_ascii}")
-
-                # Merge XSDIR (Locked)
-                with self.lock:
-                    gen.gen_xsdir(
-                        name,
-                        num_lines,
-                        base_dir_str,
-                        output_abs_path,
-                        valid_temps
-                    )
-                Logger.info(f"SUCCESS: {name} processed and merged.")
-            else:
-                Logger.error(f"ACE file missing for {name}")
+            await self._complete_table_async(gen, pair, name, valid_temps, file_ace_path)
 
         except Exception as e:
-            Logger.error(f"FAILED to process {name if 'name' in locals() else 'Unknown'}. Error: {e}")
-            
-    def _worker(self, pairs: List[Tuple[str, str]]):
-        """Worker function."""
+            self._discard_unused_scratch(work_dir)
+            run_label = locals().get("run_name") or (name if 'name' in locals() else 'Unknown')
+            self._retry_or_fail(job, run_label, e)
+
+    def _retry_or_fail(self, job, run_name: str, error: Exception):
+        """Queue a failed NJOY run again after a backoff (job_scheduler.RetryJob), or record it as failed."""
+        attempt = self.attempts.get(job, 0) + 1
+        self.attempts[job] = attempt
+        # Missing inputs (ENDF files, NJOY executable) fail the same way every time
+        delay = self.retry.delay(attempt) if isinstance(error, RuntimeError) else None
+        if delay is None:
+            Logger.error(f"FAILED to process {run_name}. Error: {error}")
+            self.failures.fail(run_name, attempt, error)
+            self.failed_jobs.add(job)
+            return
+        Logger.warn(f"{run_name} failed (attempt {attempt}), retrying in {delay:.0f} s. Error: {str(error).splitlines()[0]}")
+        self.failures.retry(run_name, attempt, error)
+        raise job_scheduler.RetryJob(delay)
+
+    def _scratch_root(self, slot) -> Path:
+        """Scratch root of a run, on the NUMA node it is pinned to when the root has a '{numa}' field."""
+        if slot is None:
+            return self.scratch_root
+        return scratch_space.scratch_root(self.scratch_dir, slot.node)
+
+    def _discard_unused_scratch(self, work_dir: Optional[Path]):
+        """Remove a job's scratch dir if NJOY never ran in it (failed runs may keep theirs)."""
+        if work_dir is not None and work_dir.is_dir() and not any(work_dir.iterdir()):
+            work_dir.rmdir()
+
+    def _complete_table(self, gen, pair: Tuple[str, str], name: str, temperatures: List[float],
+                        file_ace_path: Optional[str]) -> bool:
+        """Cache, register in xsdir and journal a finished ACE file. Returns False if it is missing."""
+        if file_ace_path and Path(file_ace_path).exists():
+            self._store_in_cache(pair, name, file_ace_path)
+            xsdir_lines = self._merge_xsdir(gen, name, file_ace_path, temperatures)
+            self._record_build(pair, name, temperatures, xsdir_lines)
+            Logger.info(f"SUCCESS: {name} processed and merged.")
+            return True
+        Logger.error(f"ACE file missing for {name}")
+        return False
+
+    async def _complete_table_async(self, gen, pair: Tuple[str, str], name: str, temperatures: List[float],
+                                    file_ace_path: Optional[str]):
+        """_complete_table in an executor thread: it copies, rescans and hashes the whole ACE file."""
+        done = await asyncio.get_running_loop().run_in_executor(
+            None, self._complete_table, gen, pair, name, temperatures, file_ace_path
+        )
+        # Listeners (the HDF5 converter) schedule their work on the event loop
+        if done and self.on_complete is not None:
+            self.on_complete(name, Path(file_ace_path))
+
+    def _job_key(self, gen, pair: Tuple[str, str]) -> Optional[str]:
+        """Key of a pair: both ENDF contents, temperatures, NJOY settings and version."""
+        element_n = gen.gen_parametre_njoy(pair[0])[0]
+        element_t, _, raw_temps = gen.gen_parametre_njoy(pair[1])
+        if not element_n or not element_t:
+            return None
+        endf_file_n = gen.resolve_endf_file(Config.BASE_DIR, "OPENMC_ENDF_DATA_Neutron", element_n)
+        endf_file_t = gen.resolve_endf_file(Config.BASE_DIR, "OPENMC_ENDF_DATA_Thermal", element_t)
+        if not (endf_file_n and endf_file_n.is_file() and endf_file_t and endf_file_t.is_file()):
+            return None
+        fields = {
+            "kind": "tsl",
+            "endf_n": artifact_cache.file_digest(endf_file_n),
+            "endf_t": artifact_cache.file_digest(endf_file_t),
+            "temperatures": self._validate_temperatures(element_t, raw_temps),
+            "error": gen.TSL_ERROR,
+            "iwt": gen.TSL_IWT,
+            "njoy": artifact_cache.njoy_version(self.njoy_cmd),
+        }
+        # ASCII tables keep the keys they had before binary output existed
+        if self.ace_type != njoy_decks.ACE_ASCII:
+            fields["ace_type"] = self.ace_type
+        return artifact_cache.cache_key(fields)
+
+    def _restore_from_cache(self, gen, pair: Tuple[str, str], key: str) -> bool:
+        """Restore a pair's ACE file and xsdir fragment from the cache and merge it."""
+        element_t, name, raw_temps = gen.gen_parametre_njoy(pair[1])
+        dst_ace = self.output_ace / name
+        if not self.cache.fetch(key, {"ace": dst_ace, "xsdir": self.output_ace / f"{name}.xsdir"}):
+            return False
+        # Cached tables may come from a deployment with another codec
+        ace_storage.recompress(dst_ace, self.compression, self.storage_report)
+        valid_temps = self._validate_temperatures(element_t, raw_temps)
+        xsdir_lines = self._merge_xsdir(gen, name, str(dst_ace), valid_temps)
+        self._record_build(pair, name, valid_temps, xsdir_lines)
+        Logger.info(f"CACHED: {name} restored from artifact cache.")
+        return True
+
+    def _record_build(self, pair: Tuple[str, str], name: str, temperatures: List[float], xsdir_lines: List[str]):
+        """Journal a finished table (used by --incremental and --resume)."""
+        self.journal.record(name, self.job_keys.get(pair), temperatures, xsdir_lines)
+
+    def _remove_table(self, gen, name: str):
+        """Delete a table's ACE file, its master xsdir entries and its journal record."""
+        removed = gen.remove_xsdir_entries(self.xsdir_master, name)
+        ace_file = self.output_ace / name
+        if ace_file.exists():
+            ace_file.unlink()
+        self.journal.remove(name)
+        if removed:
+            Logger.debug(f"Removed {removed} stale xsdir entries for {name}.")
+
+    def _select_changed(self, gen, pairs: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """
+        Incremental/resume mode: keep only pairs whose inputs changed since the
+        last build (or, when resuming, whose ACE file fails its checksum), and
+        drop stale tables (changed, or no longer in the batch).
+        """
+        batch_names = set()
+        pending = []
         for pair in pairs:
-            self._process_pair(pair)
+            name = gen.gen_parametre_njoy(pair[1])[1]
+            batch_names.add(name)
+            if self.journal.is_current(name, self.job_keys.get(pair), verify=self.resume):
+                continue
+            self._remove_table(gen, name)
+            pending.append(pair)
 
-    def execute(self):
-        """Main execution engine."""
-        Logger.header("STARTING THERMAL SCATTERING PROCESSING")
-        
-        gen = njoy_execution_engine.ACEGenerator(str(self.input_file))
+        for name in self.journal.names():
+            if name not in batch_names:
+                Logger.info(f"Removing {name}: no longer in the batch.")
+                self._remove_table(gen, name)
+
+        label = "Resume" if self.resume else "Incremental"
+        Logger.info(f"{label}: {len(pairs) - len(pending)} up to date, {len(pending)} to rebuild.")
+        return pending
+
+    def _recover_interrupted(self, gen, pairs: List[Tuple[str, str]]):
+        """
+        Resume mode: remove the scratch directories of runs that were in flight
+        when the previous batch stopped, and any finished temperature slices
+        that were produced from different inputs than the current pair.
+        """
+        interrupted = self.journal.clean_in_flight()
+        if interrupted:
+            Logger.info(f"Journal: {len(interrupted)} NJOY runs of the previous batch did not complete.")
+
+        current = {gen.gen_parametre_njoy(pair[1])[1]: self.job_keys.get(pair) for pair in pairs}
+        started = {rec["name"]: rec.get("key") for rec in interrupted.values()}
+        if self.parts_dir.exists():
+            for part_dir in self.parts_dir.iterdir():
+                key = started.get(part_dir.name)
+                if key is None or key != current.get(part_dir.name):
+                    shutil.rmtree(part_dir, ignore_errors=True)
+
+    def _store_in_cache(self, pair: Tuple[str, str], name: str, file_ace_path: str):
+        key = self.job_keys.get(pair)
+        if self.cache is None or key is None:
+            return
+        try:
+            self.cache.store(
+                key,
+                {"ace": Path(file_ace_path), "xsdir": self.output_ace / f"{name}.xsdir"},
+                meta={"kind": "tsl", "name": name},
+            )
+        except OSError as e:
+            Logger.warn(f"Could not cache {name}: {e}")
+
+    def _part_files(self, name: str, num_temperatures: int) -> List[Tuple[Path, Path]]:
+        """(ACE, xsdir) outputs of each single-temperature run of `name`."""
+        part_dir = self.parts_dir / name
+        return [
+            (part_dir / f"{name}_T{i:02}", part_dir / f"{name}_T{i:02}.xsdir")
+            for i in range(1, num_temperatures + 1)
+        ]
+
+    def _merge_parts(self, gen, name: str, temperatures: List[float]) -> Optional[str]:
+        """
+        Stitch the single-temperature runs of `name` into one ACE file once the
+        last of them has finished. Returns the ACE path, or None if runs are pending.
+        """
+        part_dir = self.parts_dir / name
+        parts = self._part_files(name, len(temperatures))
+
+        with self.lock:
+            # xsdir is moved after the ACE file, so it marks a finished run
+            if not all(ace.exists() and xsdir.exists() for ace, xsdir in parts):
+                return None
+            dst_ace = self.output_ace / name
+            gen.merge_temperature_parts(parts, dst_ace, self.output_ace / f"{name}.xsdir", "t")
+            shutil.rmtree(part_dir)
+
+        return str(dst_ace)
+
+    def _merge_xsdir(self, gen, name: str, file_ace_path: str, temperatures: List[float]) -> List[str]:
+        """
+        Locate each temperature's table in the ACE file and format its xsdir
+        entries. Returns them for the journal, from which write_xsdir builds
+        the master xsdir.
+        """
+        # One pass over the ACE file indexes every table (ace_index)
+        index = ace_index.tables_by_suffix(file_ace_path)
+        tables = []
+        for i, _ in enumerate(temperatures, 1):
+            suffix = f"{i:02}t"
+            if suffix not in index:
+                Logger.warn(f"Table .{suffix} not found inside ACE file {name}")
+            tables.append(index.get(suffix))
+
+        return gen.gen_xsdir(
+            name,
+            tables,
+            str(Config.BASE_DIR),
+            str(self.output_ace),
+            temperatures
+        )
+            
+    def _job_features(self, gen, pair: Tuple[str, str], num_temperatures: Optional[int] = None) -> Dict[str, float]:
+        """Cost-model features of one pair (neutron + thermal ENDF, resonances of the partner)."""
+        element_n = gen.gen_parametre_njoy(pair[0])[0]
+        element_t, _, temperatures = gen.gen_parametre_njoy(pair[1])
+        endf_files = []
+        if element_n:
+            endf_files.append(gen.resolve_endf_file(Config.BASE_DIR, "OPENMC_ENDF_DATA_Neutron", element_n))
+        if element_t:
+            endf_files.append(gen.resolve_endf_file(Config.BASE_DIR, "OPENMC_ENDF_DATA_Thermal", element_t))
+        if num_temperatures is None:
+            num_temperatures = len(temperatures)
+        return cost_model.job_features([f for f in endf_files if f], num_temperatures)
+
+    def plan_jobs(self) -> Optional[List[Tuple[Tuple[str, str], Optional[int]]]]:
+        """
+        Prepare the output and return the NJOY jobs still to run, with their
+        predicted time and memory in self.predicted / self.memory. None if the
+        batch file cannot be used.
+        """
+        gen = self._generator()
         
         # Read lines
         Logger.debug(f"Reading input file: {self.input_file}")
@@ -243,37 +575,142 @@ class TSLProcessor:
             
         except Exception as e:
             Logger.error(f"Failed to read input file: {e}")
-            return
+            return None
         
         total_jobs = len(pairs)
         if total_jobs == 0:
             Logger.error("No valid element_n/element_t pairs found.")
-            return
+            return None
 
         Logger.info(f"Found {total_jobs} TSL jobs to process.")
+
+        # Input fingerprints, used by the artifact cache and the build journal
+        self.job_keys = {pair: self._job_key(gen, pair) for pair in pairs}
+
+        if self.resume:
+            self._recover_interrupted(gen, pairs)
+
+        if self.incremental or self.resume:
+            pairs = self._select_changed(gen, pairs)
+            # Master xsdir = template + journaled entries, dropping anything half-written
+            self.write_xsdir()
+            self.journal.compact()
+
+        # Restore unchanged materials from the artifact cache; only misses run NJOY
+        if self.cache is not None:
+            pending = []
+            for pair in pairs:
+                key = self.job_keys.get(pair)
+                if key and self._restore_from_cache(gen, pair, key):
+                    continue
+                pending.append(pair)
+            Logger.info(f"Artifact cache: {len(pairs) - len(pending)} hits, {len(pending)} to process.")
+            pairs = pending
         
-        # Distribute Work
-        procs = []
-        effective_cpu = max(1, min(self.cpu_limit, total_jobs))
-        
-        chunk_size = total_jobs // effective_cpu + (1 if total_jobs % effective_cpu else 0)
-        
-        for i in range(effective_cpu):
-            start = i * chunk_size
-            end = start + chunk_size
-            chunk = pairs[start:end]
-            if not chunk: continue
-            
-            p = Process(target=self._worker, args=(chunk,))
-            procs.append(p)
-            p.start()
-        
-        for p in procs:
-            p.join()
+        # One job per pair, or one per (validated) temperature when splitting
+        jobs = []
+        for pair in pairs:
+            element_t, name, raw_temps = gen.gen_parametre_njoy(pair[1])
+            valid_temps = self._validate_temperatures(element_t, raw_temps) if element_t else []
+            num_temps = len(valid_temps)
+            if self.split_temperatures and num_temps > 1:
+                # Slices finished before an interruption are kept by --resume
+                parts = self._part_files(name, num_temps)
+                pending = [i for i, (ace, xsdir) in enumerate(parts) if not (ace.exists() and xsdir.exists())]
+                if pending:
+                    jobs.extend((pair, i) for i in pending)
+                else:
+                    file_ace_path = self._merge_parts(gen, name, valid_temps)
+                    if self._complete_table(gen, pair, name, valid_temps, file_ace_path) and self.on_complete:
+                        self.on_complete(name, Path(file_ace_path))
+            else:
+                jobs.append((pair, None))
+        if self.split_temperatures:
+            Logger.info(f"Temperature splitting enabled: {len(jobs)} NJOY runs.")
+
+        # Predicted NJOY wall time (ordering, time limits) and peak memory (governor admission)
+        predictions = [
+            self.cost_model.predict("tsl", self._job_features(gen, pair, 1 if i is not None else None))
+            for pair, i in jobs
+        ]
+        self.predicted = {job: seconds for job, (seconds, _) in zip(jobs, predictions)}
+        self.memory = {job: memory for job, (_, memory) in zip(jobs, predictions)}
+        return jobs
+
+    def summarize(self, governor=None):
+        """End-of-batch reports; writes self.failure_report."""
+        Logger.info(self.io_report.summary(self.scratch_root, self.output_ace))
+        if self.tape_cache is not None:
+            Logger.info(self.tape_cache.summary())
+        if self.placement is not None:
+            Logger.info(self.placement.summary())
+        if self.compression is not None:
+            Logger.info(self.storage_report.summary())
+        if governor is not None:
+            Logger.info(governor.summary())
+        self.report_failures()
+
+    def report_failures(self):
+        report = self.failures.write(self.failure_report)
+        if self.failures.failed:
+            Logger.error(f"{len(self.failures.failed)} NJOY run(s) failed: "
+                         f"{', '.join(f['run'] for f in self.failures.failed)}. See {report}")
+
+    def write_xsdir(self):
+        """Write the master xsdir: template, then every journaled table's entries sorted by ZAID."""
+        with self.lock:
+            duplicates = self.journal.write_xsdir(Config.XSDIR_TEMPLATE, self.xsdir_master)
+        if duplicates:
+            Logger.warn(f"ZAIDs provided by several tables (the last one is kept): "
+                        f"{', '.join(sorted(set(duplicates))[:10])}{' ...' if len(set(duplicates)) > 10 else ''}")
+
+    def interrupted(self):
+        self.journal.clean_in_flight()
+        self.write_xsdir()
+        Logger.warn("Interrupted: running NJOY jobs were stopped and their scratch directories removed.")
+        Logger.warn("Run again with --resume to continue with the unfinished jobs.")
+
+    def finish(self):
+        self.write_xsdir()
+        if self.cache is not None:
+            if self.cache.shared is not None:
+                Logger.info(self.cache.summary())
+            freed = self.cache.evict()
+            if freed:
+                Logger.debug(f"Artifact cache: evicted {freed / 1e9:.2f} GB (LRU).")
             
         Logger.header("PROCESSING FINISHED")
-        print(f"Check output at: {Config.OUTPUT_ACE}")
-        print(f"Check xsdir at:  {Config.XSDIR_MASTER}")
+        print(f"Check output at: {self.output_ace}")
+        print(f"Check xsdir at:  {self.xsdir_master}")
+
+    def execute(self):
+        """Main execution engine."""
+        Logger.header("STARTING THERMAL SCATTERING PROCESSING")
+
+        jobs = self.plan_jobs()
+        if jobs is None:
+            return
+
+        if jobs:
+            # Distribute Work (largest first, started as NJOY slots free up)
+            costs = [self.predicted[job] for job in jobs]
+            ordered = job_scheduler.order_largest_first(jobs, costs)
+            demands = [self.memory[job] for job in ordered]
+            effective_cpu = max(1, min(self.cpu_limit, len(jobs)))
+            makespan = job_scheduler.simulate_makespan(sorted(costs, reverse=True), effective_cpu)
+            Logger.info(f"Predicted makespan on {effective_cpu} CPUs: {cost_model.format_duration(makespan)}")
+            governor = None
+            if self.use_governor:
+                governor = resource_governor.ResourceGovernor(effective_cpu, ceiling=self.max_jobs)
+            try:
+                job_scheduler.run_async_queue(ordered, self._process_pair, effective_cpu,
+                                              governor=governor, demands=demands)
+            except KeyboardInterrupt:
+                self.interrupted()
+                return
+            self.summarize(governor)
+
+        self.finish()
 
 # --- Helpers ---
 def get_njoy_cmd():
@@ -301,11 +738,36 @@ def get_cpu_count():
 if __name__ == "__main__":
     start_time = time.time()
     
-    if len(sys.argv) < 2:
-        Logger.error("Usage: python run_tsl_processing.py <input_file>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Run NJOY on a thermal scattering batch file.")
+    parser.add_argument("input_file", help="Batch file (e.g. inputs/tsl_process_batch.i)")
+    parser.add_argument("--split-temperatures", action="store_true",
+                        help="Run each temperature as its own NJOY job and stitch the ACE tables")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Do not restore or store results in the artifact cache")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Keep up-to-date ACE files and only process changed batch entries")
+    parser.add_argument("--scratch-dir", default=None,
+                        help=f"Root for per-job NJOY scratch directories, e.g. /dev/shm (Default: {scratch_space.Config.SCRATCH_ROOT})")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted batch: skip jobs completed in the journal")
+    parser.add_argument("--no-governor", action="store_true",
+                        help="Run exactly the requested number of NJOY jobs at once (no memory-aware, self-tuning concurrency)")
+    parser.add_argument("--max-jobs", type=int, default=None,
+                        help="Upper bound for the self-tuned NJOY concurrency (Default: twice the CPU count)")
+    parser.add_argument("--job-timeout", type=float, default=None, metavar="SECONDS",
+                        help=f"Wall-clock limit of one NJOY run, 0 for none (Default: {job_scheduler.RetryPolicy.TIMEOUT_FACTOR:g}x "
+                             f"its predicted time, at least {job_scheduler.RetryPolicy.MIN_TIMEOUT:g} s)")
+    parser.add_argument("--stall-timeout", type=float, default=3600.0, metavar="SECONDS",
+                        help="Kill NJOY when its log and tapes have not changed for this long, 0 to disable (Default: 3600)")
+    parser.add_argument("--retries", type=int, default=2,
+                        help="Retries of a failed or killed NJOY run, with exponential backoff (Default: 2)")
+    parser.add_argument("--pin", choices=cpu_placement.MODES, default=None,
+                        help="Pin each NJOY run to one core, or to the cores of one NUMA node")
+    parser.add_argument("--binary-ace", action="store_true",
+                        help="Write binary (type 2) ACE files instead of ASCII ones")
+    args = parser.parse_args()
         
-    input_file_path = Path(sys.argv[1]).resolve()
+    input_file_path = Path(args.input_file).resolve()
     
     njoy_cmd = get_njoy_cmd()
     
@@ -345,8 +807,21 @@ if __name__ == "__main__":
 
     cpu_limit = get_cpu_count()
     
-    processor = TSLProcessor(input_file_path, njoy_cmd, cpu_limit)
+    processor = TSLProcessor(input_file_path, njoy_cmd, cpu_limit,
+                             split_temperatures=args.split_temperatures,
+                             use_cache=not args.no_cache,
+                             incremental=args.incremental,
+                             resume=args.resume,
+                             governor=not args.no_governor,
+                             max_jobs=args.max_jobs,
+                             placement=args.pin,
+                             binary_ace=args.binary_ace,
+                             retry=job_scheduler.RetryPolicy(args.retries, job_timeout=args.job_timeout,
+                                                             stall_timeout=args.stall_timeout),
+                             scratch_dir=Path(args.scratch_dir) if args.scratch_dir else None)
     processor.execute()
     
     elapsed = time.time() - start_time
-    print(f"\n{Fore.GREEN}Total Time: {time.strftime('%Hh:%Mm:%Ss', time.gmtime(elapsed))}")
\ No newline at end of file
+    print(f"\n{Fore.GREEN}Total Time: {time.strftime('%Hh:%Mm:%Ss', time.gmtime(elapsed))}")
+    if processor.failures.failed:
+        sys.exit(1)
\ No newline at end of file
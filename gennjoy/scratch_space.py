@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+
+class Config:
+    # Root for per-job NJOY scratch directories (tapes, PENDF, ACE before publishing).
+    # Point it at tmpfs (/dev/shm) or node-local NVMe on clusters with a shared home.
+    SCRATCH_ROOT = Path(os.environ.get("GENNJOY_SCRATCH_DIR", tempfile.gettempdir()))
+
+
+def scratch_root(root: Optional[Path] = None, numa_node: int = 0) -> Path:
+    """Scratch root; '{numa}' in it is replaced by the NUMA node (e.g. /scratch/numa{numa} per socket)."""
+    root = Path(str(root if root else Config.SCRATCH_ROOT).replace("{numa}", str(numa_node)))
+    root.mkdir(parents=True, exist_ok=True)
+    return root
+
+
+def job_dir(name: str, root: Optional[Path] = None) -> Path:
+    """Create a fresh, uniquely named scratch directory for one NJOY run."""
+    return Path(tempfile.mkdtemp(prefix=f"gennjoy-{name}-", dir=scratch_root(root)))
+
+
+def same_filesystem(a: Path, b: Path) -> bool:
+    try:
+        return os.stat(a).st_dev == os.stat(b).st_dev
+    except OSError:
+        return False
+
+
+def publish(src: Path, dst: Path) -> int:
+    """
+    Move a finished file into place. A rename when both paths are on the same
+    filesystem; otherwise a kernel-side copy to a hidden file next to dst that
+    is then renamed, so readers never see a partial file. Returns bytes copied.
+    """
+    src, dst = Path(src), Path(dst)
+    try:
+        os.replace(src, dst)
+        return 0
+    except OSError:
+        pass
+
+    tmp = dst.with_name(f".{dst.name}.partial")
+    shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+    size = dst.stat().st_size
+    src.unlink()
+    return size
+
+
+class IOReport:
+    """Tape traffic of a batch and the time it would have cost on the output filesystem."""
+
+    def __init__(self):
+        self.tape_bytes = 0
+        self.copied_bytes = 0
+        self.publish_seconds = 0.0
+
+    def add(self, tape_bytes: int, copied_bytes: int, publish_seconds: float):
+        self.tape_bytes += tape_bytes
+        self.copied_bytes += copied_bytes
+        self.publish_seconds += publish_seconds
+
+    def summary(self, scratch: Path, output_dir: Path) -> str:
+        gb = self.tape_bytes / 1e9
+        if same_filesystem(scratch, output_dir):
+            return f"Scratch {scratch}: {gb:.2f} GB of NJOY tapes (same filesystem as the output)."
+
+        if not self.copied_bytes or self.publish_seconds <= 0:
+            return f"Scratch {scratch}: {gb:.2f} GB of NJOY tapes, nothing copied out."
+
+        # Copying out is a sequential write to the output filesystem: its rate prices
+        # the tapes there, while their writes to scratch are taken as free.
+        output_mbs = self.copied_bytes / 1e6 / self.publish_seconds
+        saved = self.tape_bytes / 1e6 / output_mbs - self.publish_seconds
+        verdict = f"estimated I/O time saved up to {saved:.1f} s" if saved > 0 else "no I/O time saved"
+        return (
+            f"Scratch {scratch} vs output ({output_mbs:.0f} MB/s copying out): "
+            f"{gb:.2f} GB of NJOY tapes, {self.copied_bytes / 1e9:.2f} GB copied out in "
+            f"{self.publish_seconds:.1f} s, {verdict}."
+        )
@@ -0,0 +1,531 @@
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import shutil
+import asyncio
+import argparse
+import itertools
+import threading
+from http import HTTPStatus
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+from multiprocessing import cpu_count
+from colorama import Fore, Style, init
+
+# Ensure local modules can be imported when running as a script
+current_dir = Path(__file__).resolve().parent
+if str(current_dir) not in sys.path:
+    sys.path.append(str(current_dir))
+
+try:
+    import run_neutron_processing
+    import run_tsl_processing
+    import generate_neutron_input
+    import njoy_execution_engine
+    import job_scheduler
+    import cpu_placement
+    import scratch_space
+    import ace_storage
+except ImportError:
+    from gennjoy import run_neutron_processing
+    from gennjoy import run_tsl_processing
+    from gennjoy import generate_neutron_input
+    from gennjoy import njoy_execution_engine
+    from gennjoy import job_scheduler
+    from gennjoy import cpu_placement
+    from gennjoy import scratch_space
+    from gennjoy import ace_storage
+
+# Initialize colorama
+init(autoreset=True)
+
+
+# --- Configuration ---
+class Config:
+    BASE_DIR = Path(__file__).resolve().parent
+    DEFAULT_HOST = "127.0.0.1"
+    DEFAULT_PORT = 7434
+
+    # One-line batch file per request (the processors read their jobs from a batch file),
+    # and a directory per finished request with its own copy of the ACE file and xsdir lines
+    REQUESTS_DIR = BASE_DIR / "data" / "service_requests"
+
+    MAX_BODY = 1 << 20
+    # File names inside one directory: no separators, and not "." or ".."
+    NAME_PATTERN = re.compile(r"^(?!\.+$)[A-Za-z0-9_.+-]+$")
+    # In-flight states; a request identical to one of these is not queued again
+    ACTIVE = ("queued", "running")
+
+
+# --- Logging Helper ---
+class Logger:
+    @staticmethod
+    def info(msg):
+        print(f"{Fore.GREEN}[INFO] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def debug(msg):
+        print(f"{Fore.CYAN}[DEBUG] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def warn(msg):
+        print(f"{Fore.YELLOW}[WARN] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def error(msg):
+        print(f"{Fore.RED}[ERROR] {msg}{Style.RESET_ALL}")
+
+
+class RequestError(Exception):
+    """A request the service rejects, with its HTTP status."""
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+# --- Jobs ---
+class ServiceJob:
+    """One submitted isotope or TSL material and its processor."""
+
+    def __init__(self, kind: str, name: str, endf: str, temperatures: List[float], priority: int,
+                 neutron_endf: Optional[str] = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.name = name
+        self.endf = endf
+        self.neutron_endf = neutron_endf
+        self.temperatures = temperatures
+        self.priority = priority
+        self.state = "queued"
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.cached = False
+        self.error = None
+        self.key = None
+        self.processor = None
+        self.batch_line = None
+        # NJOY jobs of the processor still to run (None: not planned yet)
+        self.pending: Optional[List[Tuple]] = None
+
+    def batch_text(self) -> str:
+        temps_str = " ".join(str(t) for t in self.temperatures)
+        if self.kind == "neutron":
+            return f"element_n = {self.endf} name = {self.name} temperatures = {temps_str}\n"
+        return (f"element_n = {self.neutron_endf}\n"
+                f"element_t = {self.endf} name = {self.name} temperatures = {temps_str}\n")
+
+    def output_dir(self) -> Path:
+        if self.kind == "neutron":
+            return run_neutron_processing.Config.OUTPUT_ACE
+        return run_tsl_processing.Config.OUTPUT_ACE
+
+    def table(self) -> Tuple[str, str]:
+        """The output table the job writes: requests for the same one run one at a time."""
+        return self.kind, self.name
+
+    def artifacts_dir(self) -> Path:
+        return Config.REQUESTS_DIR / self.id
+
+    def to_dict(self) -> Dict:
+        status = {
+            "id": self.id, "kind": self.kind, "name": self.name, "endf": self.endf,
+            "temperatures": self.temperatures, "priority": self.priority, "state": self.state,
+            "submitted": self.submitted, "started": self.started, "finished": self.finished,
+            "cached": self.cached, "error": self.error,
+        }
+        if self.kind == "tsl":
+            status["neutron_endf"] = self.neutron_endf
+        if self.state == "done":
+            status["artifacts"] = {"ace": f"/jobs/{self.id}/ace", "xsdir": f"/jobs/{self.id}/xsdir"}
+        return status
+
+
+# --- Service ---
+class ProcessingService:
+    """
+    Long-running NJOY service behind a small JSON HTTP API.
+
+    A fixed pool of `slots` worker tasks takes jobs from a priority queue
+    (highest priority first, then submission order), so interactive requests
+    overtake queued bulk rebuilds; a running NJOY job is never preempted.
+    Each request is planned like a one-line batch file: an up-to-date table
+    is answered from the build journal, a known one from the artifact cache,
+    and only the rest runs NJOY. Identical requests (same artifact cache key)
+    that are still queued or running share one job; requests for the same
+    table with other inputs wait until the job holding it has finished.
+    """
+
+    def __init__(self, njoy_cmd: str, slots: int, options: Optional[dict] = None):
+        self.njoy_cmd = njoy_cmd
+        self.slots = max(1, slots)
+        self.options = options or {}
+        self.jobs: Dict[str, ServiceJob] = {}
+        self.in_flight: Dict[str, ServiceJob] = {}
+        # Job that started on a table and has not finished, and the jobs waiting for it
+        self.owners: Dict[Tuple[str, str], ServiceJob] = {}
+        self.held: Dict[Tuple[str, str], List[ServiceJob]] = {}
+        self.queue: Optional[asyncio.PriorityQueue] = None
+        self.sequence = itertools.count()
+        self.started = time.time()
+        # Shared by every request's processor: warm tape cache, CPU placement, xsdir lock
+        self.lock = threading.Lock()
+        self.tape_cache = None
+        self.placement = None
+        self.running = 0
+
+    # -- Jobs --
+    def _processor(self, job: ServiceJob, batch_file: Path):
+        # incremental=True keeps the tables of earlier requests in the output directory
+        if job.kind == "neutron":
+            processor = run_neutron_processing.NeutronProcessor(batch_file, self.njoy_cmd, self.slots,
+                                                                incremental=True, **self.options)
+        else:
+            processor = run_tsl_processing.TSLProcessor(batch_file, self.njoy_cmd, self.slots,
+                                                        incremental=True, **self.options)
+        # ...but planning is per request (_plan): incremental planning would drop
+        # every table missing from the one-line batch
+        processor.incremental = False
+        if self.tape_cache is None:
+            self.tape_cache, self.placement = processor.tape_cache, processor.placement
+        processor.tape_cache = self.tape_cache
+        processor.placement = self.placement
+        processor.lock = self.lock
+        return processor
+
+    async def submit(self, request: Dict) -> Tuple[ServiceJob, bool]:
+        """Queue a request (see README for the fields). Returns the job and whether it was a duplicate."""
+        job = self._parse(request)
+        Config.REQUESTS_DIR.mkdir(parents=True, exist_ok=True)
+        batch_file = Config.REQUESTS_DIR / f"{job.id}.i"
+        batch_file.write_text(job.batch_text())
+        job.processor = self._processor(job, batch_file)
+        gen = njoy_execution_engine.ACEGenerator(str(batch_file))
+        lines = batch_file.read_text().splitlines(keepends=True)
+        job.batch_line = lines[0] if job.kind == "neutron" else (lines[0], lines[1])
+        # The key hashes the ENDF file(s) and may run NJOY for its version: keep it off the event loop
+        job.key = await asyncio.get_running_loop().run_in_executor(None, job.processor._job_key, gen, job.batch_line)
+        if job.key is None:
+            batch_file.unlink()
+            raise RequestError(404, f"ENDF file not found: {job.endf if job.kind == 'neutron' else job.endf + ' / ' + job.neutron_endf}")
+
+        existing = self.in_flight.get(job.key)
+        if existing is not None and existing.state in Config.ACTIVE:
+            batch_file.unlink()
+            if job.priority > existing.priority and existing.state == "queued":
+                # The stale queue entry is skipped by the workers
+                existing.priority = job.priority
+                self._enqueue(existing)
+            return existing, True
+
+        self.jobs[job.id] = job
+        self.in_flight[job.key] = job
+        self._enqueue(job)
+        Logger.info(f"Queued {job.kind} {job.name} ({job.id}, priority {job.priority}).")
+        return job, False
+
+    def _parse(self, request: Dict) -> ServiceJob:
+        if not isinstance(request, dict):
+            raise RequestError(400, "Expected a JSON object.")
+        kind = request.get("kind", "neutron")
+        if kind not in ("neutron", "tsl"):
+            raise RequestError(400, "kind must be 'neutron' or 'tsl'.")
+        endf = request.get("endf")
+        neutron_endf = request.get("neutron_endf") if kind == "tsl" else None
+        for field, value in (("endf", endf), ("neutron_endf", neutron_endf if kind == "tsl" else "-")):
+            if not isinstance(value, str) or not Config.NAME_PATTERN.match(value):
+                raise RequestError(400, f"{field} must be an ENDF file name of the data directory.")
+        name = request.get("name") or (generate_neutron_input.get_short_name(endf) if kind == "neutron" else None)
+        if not isinstance(name, str) or not Config.NAME_PATTERN.match(name):
+            raise RequestError(400, "name must be a table name (letters, digits, '_', '.', '+', '-').")
+        temperatures = request.get("temperatures", generate_neutron_input.Config.DEFAULT_TEMPS_LIST)
+        try:
+            temperatures = [float(t) for t in temperatures]
+            priority = int(request.get("priority", 0))
+        except (TypeError, ValueError):
+            raise RequestError(400, "temperatures must be a list of numbers and priority an integer.")
+        if not temperatures:
+            raise RequestError(400, "temperatures must not be empty.")
+        return ServiceJob(kind, name, endf, temperatures, priority, neutron_endf)
+
+    def cancel(self, job: ServiceJob) -> bool:
+        """Cancel a queued job (running NJOY jobs finish)."""
+        if job.state != "queued":
+            return False
+        self._finish(job, "cancelled")
+        return True
+
+    def _enqueue(self, job: ServiceJob):
+        self.queue.put_nowait((-job.priority, next(self.sequence), job))
+
+    def _finish(self, job: ServiceJob, state: str, error: Optional[str] = None):
+        job.state = state
+        job.error = error
+        job.finished = time.time()
+        if self.in_flight.get(job.key) is job:
+            del self.in_flight[job.key]
+        if self.owners.get(job.table()) is job:
+            del self.owners[job.table()]
+            for waiting in self.held.pop(job.table(), []):
+                if waiting.state == "queued":
+                    self._enqueue(waiting)
+        batch_file = Path(job.processor.input_file)
+        if batch_file.exists():
+            batch_file.unlink()
+
+    def _plan(self, job: ServiceJob) -> Optional[List[Tuple]]:
+        """NJOY jobs still needed for a request ([] if its table is up to date or was restored)."""
+        processor = job.processor
+        if processor.journal.is_current(job.name, job.key):
+            return []
+        # A table of the same name built from other inputs is replaced
+        if processor.journal.get(job.name):
+            processor._remove_table(njoy_execution_engine.ACEGenerator(str(processor.input_file)), job.name)
+        return processor.plan_jobs()
+
+    async def _run(self, job: ServiceJob):
+        processor = job.processor
+        if job.pending is None:
+            # Planning hashes ENDF files and may copy from the cache: keep it off the event loop
+            pending = await asyncio.get_running_loop().run_in_executor(None, self._plan, job)
+            if pending is None:
+                self._finish(job, "failed", "Invalid request batch line.")
+                return
+            job.cached = not pending
+            job.pending = list(pending)
+        handler = processor._process_isotope if job.kind == "neutron" else processor._process_pair
+        while job.pending:
+            inner = job.pending[0]
+            await handler(inner)
+            job.pending.pop(0)
+            if inner in processor.failed_jobs:
+                failure = processor.failures.failed[-1] if processor.failures.failed else {}
+                self._finish(job, "failed", failure.get("error", "NJOY run failed"))
+                return
+
+        if (job.output_dir() / job.name).exists():
+            # The master xsdir waits for the shared lock, held by other jobs' merges in executor threads
+            await asyncio.get_running_loop().run_in_executor(None, self._publish, job)
+            self._finish(job, "done")
+            Logger.info(f"Done: {job.name} ({job.id}{', cached' if job.cached else ''}).")
+        else:
+            self._finish(job, "failed", f"ACE file missing for {job.name}")
+
+    def _publish(self, job: ServiceJob):
+        """
+        Rewrite the master xsdir and copy the job's ACE file (decompressed) and
+        xsdir lines to its own directory, since a later request for the table
+        replaces it in the output directory.
+        """
+        processor = job.processor
+        # Requests journal into a shared output directory: reload it so the
+        # master xsdir also lists the tables of the other requests
+        processor.journal.load()
+        processor.write_xsdir()
+
+        directory = job.artifacts_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        ace_file = job.output_dir() / job.name
+        if ace_storage.file_codec(ace_file):
+            ace_storage.plain_file(ace_file, directory)
+        else:
+            shutil.copyfile(ace_file, directory / job.name)
+        entry = processor.journal.get(job.name) or {}
+        (directory / "xsdir").write_text("".join(entry.get("xsdir", [])))
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            _, _, job = await self.queue.get()
+            if job.state != "queued":
+                continue
+            owner = self.owners.setdefault(job.table(), job)
+            if owner is not job:
+                # Another job is building the table: its _finish queues this one again
+                held = self.held.setdefault(job.table(), [])
+                if job not in held:
+                    held.append(job)
+                continue
+            job.state = "running"
+            job.started = job.started or time.time()
+            self.running += 1
+            try:
+                await self._run(job)
+            except job_scheduler.RetryJob as retry:
+                # Back in the queue after the backoff, without holding a slot meanwhile
+                job.state = "queued"
+                loop.call_later(retry.delay, self._enqueue, job)
+            except Exception as e:
+                Logger.error(f"Job {job.id} ({job.name}) failed: {e}")
+                self._finish(job, "failed", str(e).splitlines()[0] if str(e) else type(e).__name__)
+            finally:
+                self.running -= 1
+
+    def status(self) -> Dict:
+        states = {}
+        for job in self.jobs.values():
+            states[job.state] = states.get(job.state, 0) + 1
+        return {
+            "slots": self.slots, "running": self.running, "jobs": states,
+            "uptime": time.time() - self.started, "njoy": self.njoy_cmd,
+        }
+
+    # -- HTTP --
+    async def _route(self, method: str, path: str, body: bytes):
+        """(status, JSON payload or file path) of one request."""
+        parts = [p for p in path.split("/") if p]
+        if parts == ["status"] and method == "GET":
+            return 200, self.status()
+        if parts == ["jobs"]:
+            if method == "GET":
+                return 200, {"jobs": [job.to_dict() for job in self.jobs.values()]}
+            if method == "POST":
+                try:
+                    request = json.loads(body or b"{}")
+                except ValueError:
+                    raise RequestError(400, "Body is not valid JSON.")
+                job, duplicate = await self.submit(request)
+                return 202, dict(job.to_dict(), duplicate=duplicate)
+        if len(parts) in (2, 3) and parts[0] == "jobs":
+            job = self.jobs.get(parts[1])
+            if job is None:
+                raise RequestError(404, f"No job {parts[1]}")
+            if len(parts) == 2 and method == "GET":
+                return 200, job.to_dict()
+            if len(parts) == 2 and method == "DELETE":
+                if not self.cancel(job):
+                    raise RequestError(409, f"Job {job.id} is {job.state}")
+                return 200, job.to_dict()
+            if len(parts) == 3 and method == "GET" and parts[2] in ("ace", "xsdir"):
+                if job.state != "done":
+                    raise RequestError(409, f"Job {job.id} is {job.state}")
+                # The job's own copy: the output directory may hold a later request's table
+                if parts[2] == "ace":
+                    return 200, job.artifacts_dir() / job.name
+                return 200, (job.artifacts_dir() / "xsdir").read_bytes()
+        raise RequestError(404 if method in ("GET", "POST", "DELETE") else 405, f"No route for {method} {path}")
+
+    async def _serve(self, reader, writer):
+        request_line = ""
+        try:
+            try:
+                request_line = (await reader.readline()).decode("latin-1")
+                method, target, _ = request_line.split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                if length > Config.MAX_BODY:
+                    raise RequestError(413, "Request body too large.")
+                body = await reader.readexactly(length) if length else b""
+                status, payload = await self._route(method.upper(), urlsplit(target).path, body)
+            except RequestError as e:
+                status, payload = e.status, {"error": str(e)}
+            except (ValueError, asyncio.IncompleteReadError):
+                status, payload = 400, {"error": "Malformed HTTP request."}
+            except ConnectionError:
+                raise
+            except Exception as e:
+                Logger.error(f"{request_line.strip()}: {type(e).__name__}: {e}")
+                status, payload = 500, {"error": f"Internal error: {type(e).__name__}"}
+            await self._respond(writer, status, payload)
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer, status: int, payload):
+        if isinstance(payload, Path):
+            content_type, size = "application/octet-stream", payload.stat().st_size
+        elif isinstance(payload, bytes):
+            content_type, size = "text/plain", len(payload)
+        else:
+            payload = (json.dumps(payload, indent=1) + "\n").encode()
+            content_type, size = "application/json", len(payload)
+        writer.write((f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                      f"Content-Type: {content_type}\r\nContent-Length: {size}\r\n"
+                      f"Connection: close\r\n\r\n").encode("latin-1"))
+        if isinstance(payload, Path):
+            with open(payload, "rb") as f:
+                while True:
+                    chunk = f.read(1 << 20)
+                    if not chunk:
+                        break
+                    writer.write(chunk)
+                    await writer.drain()
+        else:
+            writer.write(payload)
+        await writer.drain()
+
+    async def serve(self, host: str, port: int):
+        self.queue = asyncio.PriorityQueue()
+        workers = [asyncio.ensure_future(self._worker()) for _ in range(self.slots)]
+        server = await asyncio.start_server(self._serve, host, port)
+        Logger.info(f"Serving on http://{host}:{port} with {self.slots} NJOY slots (Ctrl-C to stop).")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+
+# --- Entry Point ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve NJOY processing requests over a JSON HTTP API.")
+    parser.add_argument("--host", default=Config.DEFAULT_HOST,
+                        help=f"Address to listen on (Default: {Config.DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=Config.DEFAULT_PORT,
+                        help=f"Port to listen on (Default: {Config.DEFAULT_PORT})")
+    parser.add_argument("--slots", type=int, default=cpu_count(),
+                        help="Concurrent NJOY jobs (Default: all CPUs)")
+    parser.add_argument("--njoy", default=None,
+                        help="NJOY command (Default: njoy from PATH)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Do not restore or store results in the artifact cache")
+    parser.add_argument("--scratch-dir", default=None,
+                        help=f"Root for per-job NJOY scratch directories, e.g. /dev/shm (Default: {scratch_space.Config.SCRATCH_ROOT})")
+    parser.add_argument("--job-timeout", type=float, default=None, metavar="SECONDS",
+                        help="Wall-clock limit of one NJOY run, 0 for none (Default: derived from its predicted time)")
+    parser.add_argument("--stall-timeout", type=float, default=3600.0, metavar="SECONDS",
+                        help="Kill NJOY when its log and tapes have not changed for this long, 0 to disable (Default: 3600)")
+    parser.add_argument("--retries", type=int, default=2,
+                        help="Retries of a failed or killed NJOY run, with exponential backoff (Default: 2)")
+    parser.add_argument("--pin", choices=cpu_placement.MODES, default=None,
+                        help="Pin each NJOY run to one core, or to the cores of one NUMA node")
+    parser.add_argument("--binary-ace", action="store_true",
+                        help="Write binary (type 2) ACE files instead of ASCII ones")
+    args = parser.parse_args()
+
+    # Same data layout as the interactive options
+    default_data = Config.BASE_DIR / "data"
+    os.environ.setdefault("OPENMC_ENDF_DATA", str(default_data / "incident_neutron_endf"))
+    os.environ.setdefault("OPENMC_ENDF_DATA_Neutron", os.environ["OPENMC_ENDF_DATA"])
+    os.environ.setdefault("OPENMC_ENDF_DATA_Thermal", str(default_data / "thermal_scattering_endf"))
+
+    service = ProcessingService(
+        args.njoy or shutil.which("njoy") or "njoy",
+        args.slots,
+        options=dict(
+            use_cache=not args.no_cache,
+            retry=job_scheduler.RetryPolicy(args.retries, job_timeout=args.job_timeout,
+                                            stall_timeout=args.stall_timeout),
+            placement=args.pin,
+            binary_ace=args.binary_ace,
+            scratch_dir=Path(args.scratch_dir) if args.scratch_dir else None,
+        ),
+    )
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        Logger.warn("Service stopped: running NJOY jobs were stopped and their scratch directories removed.")
@@ -0,0 +1,187 @@
+import sys
+import time
+import argparse
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
+from colorama import Fore, Style, init
+
+# Ensure local modules can be imported when running as a script
+current_dir = Path(__file__).resolve().parent
+if str(current_dir) not in sys.path:
+    sys.path.append(str(current_dir))
+
+try:
+    import pipeline
+    import njoy_execution_engine
+    import cost_model
+except ImportError:
+    from gennjoy import pipeline
+    from gennjoy import njoy_execution_engine
+    from gennjoy import cost_model
+
+# Initialize colorama
+init(autoreset=True)
+
+
+# --- Configuration ---
+class Config:
+    POLL_INTERVAL = 2.0
+    # A change is processed once nothing changed for this long (copies in progress settle)
+    DEBOUNCE = 10.0
+
+
+# --- Logging Helper ---
+class Logger:
+    @staticmethod
+    def info(msg):
+        print(f"{Fore.GREEN}[INFO] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def debug(msg):
+        print(f"{Fore.CYAN}[DEBUG] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def warn(msg):
+        print(f"{Fore.YELLOW}[WARN] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def error(msg):
+        print(f"{Fore.RED}[ERROR] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def header(msg):
+        print(f"\n{Fore.MAGENTA}{'='*60}")
+        print(f"{Fore.BLUE}{Style.BRIGHT}{msg.center(60)}")
+        print(f"{Fore.MAGENTA}{'='*60}{Style.RESET_ALL}")
+
+
+# --- Watcher ---
+class Watcher:
+    """
+    Polls the ENDF directories and batch files, and brings the library up to
+    date through the pipeline once a burst of changes has settled.
+
+    The pipeline runs incrementally: NJOY only reruns tables whose ENDF
+    contents (or batch line) changed, a TSL material is rerun when either of
+    its evaluations changed (its cache key covers its incident neutron
+    partner), and only changed ACE files are converted to HDF5 again.
+    """
+
+    def __init__(self, pipe: pipeline.Pipeline, interval: float = Config.POLL_INTERVAL,
+                 debounce: float = Config.DEBOUNCE):
+        self.pipe = pipe
+        self.interval = interval
+        self.debounce = debounce
+        self.cycles = 0
+
+    def _watched(self) -> List[Path]:
+        paths = [self.pipe.neutron_batch]
+        directories = [pipeline.Config.NEUTRON_ENDF]
+        if self.pipe.tsl_batch is not None:
+            paths.append(self.pipe.tsl_batch)
+            directories.append(pipeline.Config.THERMAL_ENDF)
+        for directory in directories:
+            if directory.is_dir():
+                paths.extend(f for f in directory.iterdir() if f.is_file() and not f.name.startswith("."))
+        return paths
+
+    def snapshot(self) -> Dict[Path, Tuple[int, int]]:
+        """{path: (mtime, size)} of the watched files that exist."""
+        state = {}
+        for path in self._watched():
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            state[path] = (st.st_mtime_ns, st.st_size)
+        return state
+
+    @staticmethod
+    def changes(before: Dict, after: Dict) -> Set[Path]:
+        return {p for p in before.keys() | after.keys() if before.get(p) != after.get(p)}
+
+    def affected(self, changed: Set[Path]) -> List[str]:
+        """Batch entries that use a changed ENDF file (reported before the rebuild)."""
+        names = {p.name for p in changed}
+        entries = []
+        batch = self.pipe.neutron_batch
+        if batch.exists():
+            gen = njoy_execution_engine.ACEGenerator(str(batch))
+            for _, line in gen.search_string_in_file(str(batch), "element"):
+                element, name, _ = gen.gen_parametre_njoy(line)
+                if element in names:
+                    entries.append(name)
+        tsl_batch = self.pipe.tsl_batch
+        if tsl_batch is not None and tsl_batch.exists():
+            gen = njoy_execution_engine.ACEGenerator(str(tsl_batch))
+            lines_n = [line for _, line in gen.search_string_in_file(str(tsl_batch), "element_n")]
+            lines_t = [line for _, line in gen.search_string_in_file(str(tsl_batch), "element_t")]
+            for line_n, line_t in zip(lines_n, lines_t):
+                element_n = gen.gen_parametre_njoy(line_n)[0]
+                element_t, name, _ = gen.gen_parametre_njoy(line_t)
+                if element_t in names:
+                    entries.append(f"{name} (TSL)")
+                elif element_n in names:
+                    entries.append(f"{name} (TSL, partner {element_n} changed)")
+        return entries
+
+    def rebuild(self):
+        self.cycles += 1
+        start = time.time()
+        try:
+            self.pipe.run()
+        except Exception as e:
+            # A broken evaluation must not stop the watcher
+            Logger.error(f"Rebuild failed: {e}")
+            return
+        status = "with failures" if self.pipe.failed else "up to date"
+        Logger.info(f"Library {status} after {cost_model.format_duration(time.time() - start)}.")
+
+    def run(self):
+        before = self.snapshot()
+        Logger.header("WATCH MODE")
+        Logger.info(f"Watching {len(before)} files (poll {self.interval:g} s, debounce {self.debounce:g} s). Ctrl-C to stop.")
+        self.rebuild()
+
+        pending: Set[Path] = set()
+        last_change = 0.0
+        while True:
+            time.sleep(self.interval)
+            after = self.snapshot()
+            changed = self.changes(before, after)
+            before = after
+            if changed:
+                if not pending:
+                    Logger.info(f"Change detected ({', '.join(sorted(p.name for p in changed)[:5])}"
+                                f"{', ...' if len(changed) > 5 else ''}), waiting for it to settle...")
+                pending |= changed
+                last_change = time.time()
+                continue
+            if pending and time.time() - last_change >= self.debounce:
+                batch_changed = {self.pipe.neutron_batch, self.pipe.tsl_batch} & pending
+                entries = self.affected(pending)
+                Logger.header("CHANGES DETECTED")
+                if batch_changed:
+                    Logger.info(f"Batch file changed: {', '.join(p.name for p in batch_changed)}")
+                if entries:
+                    Logger.info(f"Affected: {', '.join(entries)}")
+                pending = set()
+                self.rebuild()
+
+
+# --- Entry Point ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Watch the ENDF directories and batch files and rebuild only what changed.")
+    pipeline.add_arguments(parser)
+    parser.add_argument("--interval", type=float, default=Config.POLL_INTERVAL,
+                        help=f"Seconds between two scans (Default: {Config.POLL_INTERVAL:g})")
+    parser.add_argument("--debounce", type=float, default=Config.DEBOUNCE,
+                        help=f"Seconds without changes before a rebuild starts (Default: {Config.DEBOUNCE:g})")
+    args = parser.parse_args()
+
+    watcher = Watcher(pipeline.from_arguments(args), args.interval, args.debounce)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        Logger.info(f"Watch stopped after {watcher.cycles} rebuilds.")
@@ -0,0 +1,132 @@
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+from colorama import Fore, Style, init
+
+# Ensure local modules can be imported when running as a script
+current_dir = Path(__file__).resolve().parent
+if str(current_dir) not in sys.path:
+    sys.path.append(str(current_dir))
+
+try:
+    import fetch_endf_library
+except ImportError:
+    from gennjoy import fetch_endf_library
+
+# Initialize colorama
+init(autoreset=True)
+
+
+# --- Configuration ---
+class Config:
+    BASE_DIR = Path(__file__).resolve().parent
+    # One directory per library release: data/libraries/<name>/
+    LIBRARIES_DIR = BASE_DIR / "data" / "libraries"
+
+    # Batch files inside a workspace that override the shared ones
+    NEUTRON_BATCH = "neutron_process_batch.i"
+    TSL_BATCH = "tsl_process_batch.i"
+
+
+# --- Logging Helper ---
+class Logger:
+    @staticmethod
+    def info(msg):
+        print(f"{Fore.GREEN}[INFO] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def debug(msg):
+        print(f"{Fore.CYAN}[DEBUG] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def warn(msg):
+        print(f"{Fore.YELLOW}[WARN] {msg}{Style.RESET_ALL}")
+
+    @staticmethod
+    def error(msg):
+        print(f"{Fore.RED}[ERROR] {msg}{Style.RESET_ALL}")
+
+
+def release_key(name: str) -> Optional[str]:
+    """Key of fetch_endf_library.Config.LIBRARIES for a release name ("VIII.0", "B-VIII.0", "2")."""
+    if name in fetch_endf_library.Config.LIBRARIES:
+        return name
+    release = name.upper().replace("ENDF/", "").replace("B-", "")
+    for key, library in fetch_endf_library.Config.LIBRARIES.items():
+        if library.get("release") == release:
+            return key
+    return None
+
+
+# --- Workspace ---
+class Workspace:
+    """
+    The data directories of one library release, side by side with the
+    others under data/libraries/<name>: its ENDF evaluations, ACE files,
+    xsdir, HDF5 library, NJOY input decks and reports. Processors given a
+    workspace read and write only there, so releases can be built at the
+    same time (see run_multi_library.py).
+    """
+
+    def __init__(self, name: str, root: Optional[Path] = None):
+        key = release_key(name)
+        # "2" and "B-VIII.0" share the workspace of "VIII.0"
+        self.name = fetch_endf_library.Config.LIBRARIES[key]["release"] if key else name
+        self.release = key
+        self.root = Path(root) if root else Config.LIBRARIES_DIR / self.name
+        self.neutron_endf = self.root / fetch_endf_library.Config.NEUTRON_DIR_NAME
+        self.thermal_endf = self.root / fetch_endf_library.Config.THERMAL_DIR_NAME
+        self.neutron_ace = self.root / "incident_neutron_ace"
+        self.tsl_ace = self.root / "thermal_scattering_ace"
+        self.hdf5_library = self.root / "hdf5_library"
+        self.decks = self.root / "njoy_input_decks"
+        self.reports = self.root / "reports"
+
+    def __repr__(self):
+        return f"Workspace({self.name!r}, {str(self.root)!r})"
+
+    def endf_dirs(self) -> Dict[str, Path]:
+        """ENDF directories by the data-path variables the NJOY engine reads."""
+        return {
+            "OPENMC_ENDF_DATA": self.neutron_endf,
+            "OPENMC_ENDF_DATA_Neutron": self.neutron_endf,
+            "OPENMC_ENDF_DATA_Thermal": self.thermal_endf,
+        }
+
+    def batch(self, kind: str, default: Path) -> Path:
+        """The workspace's own batch file of `kind` ("neutron" or "tsl") if it has one, else `default`."""
+        own = self.root / (Config.NEUTRON_BATCH if kind == "neutron" else Config.TSL_BATCH)
+        return own if own.exists() else default
+
+    @staticmethod
+    def _populated(directory: Path) -> bool:
+        return directory.is_dir() and any(directory.iterdir())
+
+    def fetch(self, thermal: bool = True) -> bool:
+        """Download the release's evaluations into the workspace unless they are already there."""
+        targets = [(self.neutron_endf, "n_url")]
+        if thermal:
+            targets.append((self.thermal_endf, "t_url"))
+        for directory, url_key in targets:
+            if self._populated(directory):
+                Logger.info(f"{self.name}: {directory.name} up to date.")
+                continue
+            if self.release is None:
+                Logger.error(f"{self.name}: {directory} is empty and '{self.name}' is not a known release "
+                             f"({', '.join(l['release'] for l in fetch_endf_library.Config.LIBRARIES.values())}).")
+                return False
+            self.root.mkdir(parents=True, exist_ok=True)
+            url = fetch_endf_library.Config.LIBRARIES[self.release][url_key]
+            archive = fetch_endf_library.download_file(url, self.root)
+            fetch_endf_library.extract_and_organize(archive, directory.name, self.root)
+            if not self._populated(directory):
+                Logger.error(f"{self.name}: fetching {directory.name} failed.")
+                return False
+        return True
+
+
+def list_workspaces() -> List[Workspace]:
+    """Workspaces present under data/libraries."""
+    if not Config.LIBRARIES_DIR.is_dir():
+        return []
+    return [Workspace(d.name) for d in sorted(Config.LIBRARIES_DIR.iterdir()) if d.is_dir()]
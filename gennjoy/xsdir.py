@@ -0,0 +1,239 @@
+import os
+import re
+import argparse
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from colorama import Fore, Style, init
+
+# Initialize colorama
+init(autoreset=True)
+
+# A directory entry starts with a ZAID: 1001.01c, lwtr.01t, 92235.80c
+ZAID_PATTERN = re.compile(r"^\S+\.\d+[a-z]$")
+AWR_PER_LINE = 4
+# Right-aligned widths of the directory line fields (ZAID ... ptable)
+COLUMN_WIDTHS = (11, 11, 6, 3, 2, 8, 8, 2, 2, 10, 8)
+
+
+def _column(value, width: int) -> str:
+    # A value as wide as its column (a long file name) keeps a separating space
+    text = str(value)
+    return text.rjust(width) if len(text) < width else " " + text
+
+
+class XsdirEntry(NamedTuple):
+    """One directory line of an xsdir (MCNP format, fields kept as written)."""
+    zaid: str
+    awr: str
+    filename: str
+    access: str = "0"
+    filetype: int = 1
+    address: int = 1
+    length: int = 0
+    record_length: int = 0
+    entries: int = 0
+    temperature: str = "0.0"
+    ptable: bool = False
+
+    @classmethod
+    def parse(cls, text: str) -> "XsdirEntry":
+        """Entry of one (continuation-joined) directory line."""
+        fields = text.replace("+", " ").split()
+        if len(fields) < 7 or not ZAID_PATTERN.match(fields[0]):
+            raise ValueError(f"Not an xsdir entry: {text.strip()}")
+        optional = fields[7:] + [None] * 3
+        return cls(
+            fields[0], fields[1], fields[2], fields[3], int(fields[4]), int(fields[5]), int(fields[6]),
+            int(optional[0] or 0), int(optional[1] or 0), optional[2] or "0.0",
+            "ptable" in fields[10:],
+        )
+
+    def format(self) -> str:
+        """Directory line in the column layout GenNJOY has always written."""
+        values = (self.zaid, self.awr, self.filename, self.access, self.filetype, self.address,
+                  self.length, self.record_length, self.entries, self.temperature, "ptable" if self.ptable else "")
+        return "".join(_column(value, width) for value, width in zip(values, COLUMN_WIDTHS)) + "\n"
+
+
+def zaid_order(zaid: str) -> Tuple:
+    """Sort key: numeric ZAIDs by ZA, then named (thermal) tables, each by suffix."""
+    base, _, suffix = zaid.partition(".")
+    return (0, int(base), "", suffix) if base.isdigit() else (1, 0, base, suffix)
+
+
+class Xsdir:
+    """
+    An xsdir in memory: optional datapath, the atomic weight ratios and a
+    ZAID index of directory entries. Entries are written sorted by ZAID and
+    the file is replaced atomically, so the result does not depend on the
+    order in which tables were added.
+    """
+
+    def __init__(self, directory: Optional[Path] = None):
+        self.directory = Path(directory) if directory else None  # Where file names are relative to
+        self.datapath: Optional[str] = None
+        self.awr: Dict[str, str] = {}
+        self.entries: Dict[str, XsdirEntry] = {}
+
+    @classmethod
+    def read(cls, path) -> "Xsdir":
+        """Parse an xsdir; a file without a 'directory' line (e.g. xsdir_mcnp5) may mix both sections."""
+        path = Path(path)
+        xsdir = cls(path.parent)
+        section = "awr"
+        pending = ""
+        with open(path, "r", errors="ignore") as f:
+            for line in f:
+                stripped = line.strip()
+                if not stripped:
+                    continue
+                lower = stripped.lower()
+                if lower.startswith("datapath"):
+                    xsdir.datapath = stripped.split("=", 1)[-1].strip()
+                    continue
+                if lower.startswith("atomic weight ratios"):
+                    section = "awr"
+                    continue
+                if lower == "directory":
+                    section = "directory"
+                    continue
+                if pending or ZAID_PATTERN.match(stripped.split()[0]):
+                    # Directory lines may be continued with a trailing '+'
+                    pending += " " + stripped
+                    if stripped.endswith("+"):
+                        continue
+                    xsdir.add(XsdirEntry.parse(pending))
+                    pending = ""
+                elif section == "awr":
+                    fields = stripped.split()
+                    for zaid, ratio in zip(fields[0::2], fields[1::2]):
+                        xsdir.awr.setdefault(zaid, ratio)
+        return xsdir
+
+    def add(self, entry: XsdirEntry) -> Optional[XsdirEntry]:
+        """Index an entry (the last one added for a ZAID wins). Returns the entry it replaced."""
+        replaced = self.entries.get(entry.zaid)
+        self.entries[entry.zaid] = entry
+        return replaced
+
+    def add_lines(self, lines: Iterable[str]) -> List[str]:
+        """Add formatted directory lines. Returns the ZAIDs that were already present."""
+        duplicates = []
+        for line in lines:
+            if line.strip() and self.add(XsdirEntry.parse(line)) is not None:
+                duplicates.append(line.split()[0])
+        return duplicates
+
+    def remove_file(self, filename: str) -> int:
+        """Drop the entries that point at ACE file `filename`. Returns the number removed."""
+        stale = [zaid for zaid, entry in self.entries.items() if entry.filename == filename]
+        for zaid in stale:
+            del self.entries[zaid]
+        return len(stale)
+
+    def merge(self, other: "Xsdir", replace: bool = True) -> List[str]:
+        """
+        Add the ratios and entries of another xsdir. File names are rebased
+        onto this xsdir's directory when both know theirs. On a ZAID present
+        in both, `replace` decides which entry is kept. Returns those ZAIDs.
+        """
+        for zaid, ratio in other.awr.items():
+            self.awr.setdefault(zaid, ratio)
+        conflicts = []
+        for zaid, entry in other.entries.items():
+            if self.directory and other.directory and not os.path.isabs(entry.filename) \
+                    and self.directory.resolve() != other.directory.resolve():
+                entry = entry._replace(filename=os.path.relpath(other.directory / entry.filename, self.directory))
+            if zaid in self.entries:
+                conflicts.append(zaid)
+                if not replace:
+                    continue
+            self.entries[zaid] = entry
+        return conflicts
+
+    def lines(self) -> List[str]:
+        out = []
+        if self.datapath:
+            out.append(f"datapath={self.datapath}\n")
+        out.append("atomic weight ratios\n")
+        pairs = list(self.awr.items())
+        for i in range(0, len(pairs), AWR_PER_LINE):
+            out.append("".join(f"{zaid:>7}  {ratio:<11}" for zaid, ratio in pairs[i:i + AWR_PER_LINE]).rstrip() + "\n")
+        out.append("directory\n")
+        out.extend(self.entries[zaid].format() for zaid in sorted(self.entries, key=zaid_order))
+        return out
+
+    def write(self, path):
+        """Write the xsdir atomically (temporary file, fsync, rename)."""
+        path = Path(path)
+        tmp = path.with_name(f".{path.name}.tmp")
+        with open(tmp, "w") as f:
+            f.writelines(self.lines())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+
+def write_master(template: Path, fragments: Iterable[Iterable[str]], master: Path) -> List[str]:
+    """
+    Reduce per-table xsdir fragments (formatted directory lines) into one
+    master xsdir: the template's ratios, then every entry once, sorted by
+    ZAID. Returns the ZAIDs that appeared more than once (the last one is kept).
+    """
+    xsdir = Xsdir.read(template) if Path(template).exists() else Xsdir()
+    xsdir.directory = Path(master).parent
+    seen = set()
+    duplicates = []
+    for fragment in fragments:
+        for line in fragment:
+            if not line.strip():
+                continue
+            entry = XsdirEntry.parse(line)
+            if entry.zaid in seen:
+                duplicates.append(entry.zaid)
+            seen.add(entry.zaid)
+            xsdir.add(entry)
+    xsdir.write(master)
+    return duplicates
+
+
+def merge_files(output: Path, inputs: List[Path], replace: bool = False) -> List[str]:
+    """Merge xsdir files (e.g. neutron, thermal, an external MCNP library) into `output`."""
+    merged = Xsdir(Path(output).parent)
+    conflicts = []
+    for path in inputs:
+        conflicts.extend(merged.merge(Xsdir.read(path), replace=replace))
+    merged.write(output)
+    return conflicts
+
+
+# --- Entry Point ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge or inspect MCNP xsdir files.")
+    sub = parser.add_subparsers(dest="action", required=True)
+    merge_parser = sub.add_parser("merge", help="Combine xsdir files into one (file names rebased)")
+    merge_parser.add_argument("output", help="xsdir to write")
+    merge_parser.add_argument("inputs", nargs="+", help="xsdir files, in order of precedence")
+    merge_parser.add_argument("--last-wins", action="store_true",
+                              help="On a ZAID found in several inputs, keep the last one (Default: the first)")
+    show_parser = sub.add_parser("show", help="Summarize an xsdir")
+    show_parser.add_argument("xsdir")
+    args = parser.parse_args()
+
+    if args.action == "merge":
+        conflicts = merge_files(Path(args.output), [Path(p) for p in args.inputs], replace=args.last_wins)
+        merged = Xsdir.read(args.output)
+        print(f"{Fore.GREEN}[INFO] {args.output}: {len(merged.entries)} tables, "
+              f"{len(merged.awr)} atomic weight ratios.{Style.RESET_ALL}")
+        if conflicts:
+            kept = "last" if args.last_wins else "first"
+            print(f"{Fore.YELLOW}[WARN] {len(conflicts)} ZAIDs in several inputs (kept the {kept}): "
+                  f"{', '.join(sorted(set(conflicts), key=zaid_order)[:10])}{' ...' if len(conflicts) > 10 else ''}{Style.RESET_ALL}")
+    else:
+        xsdir = Xsdir.read(args.xsdir)
+        files = sorted({entry.filename for entry in xsdir.entries.values()})
+        print(f"{Fore.GREEN}[INFO] {args.xsdir}: {len(xsdir.entries)} tables in {len(files)} files, "
+              f"{len(xsdir.awr)} atomic weight ratios.{Style.RESET_ALL}")
+        for zaid in sorted(xsdir.entries, key=zaid_order):
+            entry = xsdir.entries[zaid]
+            print(f"  {zaid:<12} {entry.filename:<20} address {entry.address:<9} length {entry.length}")